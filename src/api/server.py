@@ -0,0 +1,144 @@
+import argparse
+import asyncio
+import json
+import os
+from contextlib import asynccontextmanager
+from typing import AsyncIterator
+import logging
+
+from fastapi import FastAPI, HTTPException
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from pydantic import BaseModel, Field
+
+from src.chat.conversation import ConversationEngine, SessionState
+from src.chat.memory import get_memory_store
+from src.chat.resources import get_resources
+from src.chat.sessions import SessionConflictError, get_session_store
+from src.db.async_database import async_engine, init_db_async
+from src.utils.tracing import get_collector
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Parámetros de entorno
+API_HOST = os.getenv("API_HOST", "0.0.0.0")
+API_PORT = int(os.getenv("API_PORT", "8000"))
+API_WORKERS = int(os.getenv("API_WORKERS", "1"))
+API_MAX_MESSAGE_CHARS = int(os.getenv("API_MAX_MESSAGE_CHARS", "2000"))
+
+
+class MessageRequest(BaseModel):
+    message: str = Field(min_length=1, max_length=API_MAX_MESSAGE_CHARS)
+
+
+class MessageResponse(BaseModel):
+    response: str
+    session: dict
+
+
+_engine: ConversationEngine | None = None
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Cada worker precalienta sus recursos RAG; el estado de las sesiones vive en el almacén compartido."""
+    global _engine
+    await init_db_async()
+    resources = await asyncio.to_thread(lambda: get_resources().start())
+    _engine = ConversationEngine(resources)
+    yield
+    resources.stop()
+    await async_engine.dispose()
+
+
+app = FastAPI(title="Asistente Virtual del Supermercado", lifespan=lifespan)
+
+
+async def load_session(session_id: str) -> SessionState:
+    state = await asyncio.to_thread(get_session_store().load, session_id)
+    if state is None:
+        raise HTTPException(status_code=404, detail=f"Sesión no encontrada: {session_id}")
+    return state
+
+
+async def save_session(state: SessionState) -> None:
+    try:
+        await asyncio.to_thread(get_session_store().save, state)
+    except SessionConflictError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
+
+def sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+@app.get("/health")
+async def health() -> dict:
+    return {"status": "ok", "index_version": _engine.resources.index.version if _engine else None}
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics() -> PlainTextResponse:
+    return PlainTextResponse(get_collector().render(), media_type="text/plain; version=0.0.4")
+
+
+@app.post("/sessions", status_code=201)
+async def create_session() -> dict:
+    state = SessionState()
+    await save_session(state)
+    return state.to_dict()
+
+
+@app.get("/sessions/{session_id}")
+async def get_session(session_id: str) -> dict:
+    return (await load_session(session_id)).to_dict()
+
+
+@app.delete("/sessions/{session_id}", status_code=204)
+async def delete_session(session_id: str) -> None:
+    if not await asyncio.to_thread(get_session_store().delete, session_id):
+        raise HTTPException(status_code=404, detail=f"Sesión no encontrada: {session_id}")
+    await asyncio.to_thread(get_memory_store().clear, session_id)
+
+
+@app.post("/sessions/{session_id}/messages", response_model=MessageResponse)
+async def send_message(session_id: str, request: MessageRequest) -> MessageResponse:
+    state = await load_session(session_id)
+    response = await _engine.arespond(state, request.message)
+    await save_session(state)
+    return MessageResponse(response=response, session=state.to_dict())
+
+
+@app.post("/sessions/{session_id}/messages/stream")
+async def stream_message(session_id: str, request: MessageRequest) -> StreamingResponse:
+    """
+    Respuesta por Server-Sent Events: un evento `delta` por fragmento y `done` con el estado
+    de la sesión ya guardado (o `error` si otra petición modificó la sesión mientras tanto).
+    """
+    state = await load_session(session_id)
+
+    async def events() -> AsyncIterator[str]:
+        async for chunk in _engine.astream(state, request.message):
+            if chunk:
+                yield sse("delta", {"text": chunk})
+        try:
+            await asyncio.to_thread(get_session_store().save, state)
+        except SessionConflictError as e:
+            yield sse("error", {"status": 409, "detail": str(e)})
+            return
+        yield sse("done", state.to_dict())
+
+    return StreamingResponse(events(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="API HTTP del asistente (ASGI, respuestas por SSE)")
+    parser.add_argument("--host", default=API_HOST)
+    parser.add_argument("--port", type=int, default=API_PORT)
+    parser.add_argument("--workers", type=int, default=API_WORKERS, help="Procesos worker de uvicorn")
+    args = parser.parse_args()
+
+    uvicorn.run("src.api.server:app", host=args.host, port=args.port, workers=args.workers)
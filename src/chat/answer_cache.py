@@ -0,0 +1,151 @@
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Callable, Optional, Sequence
+import logging
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class CacheEntry:
+    embedding: Optional[np.ndarray]
+    answer: str
+    created_at: float
+
+
+class SemanticAnswerCache:
+    """
+    Caché de respuestas del RAG indexada por pregunta normalizada + embedding.
+
+    - Coincidencia exacta de la pregunta normalizada: no requiere embedding.
+    - Coincidencia semántica: similitud coseno >= `threshold` contra las entradas vigentes.
+    - Expulsión LRU (máximo `max_size` entradas) y por TTL (`ttl_seconds`).
+    - Se vacía cuando cambia la versión (vectorstore + prompt + modelo).
+    """
+
+    def __init__(self, threshold: float = 0.95, max_size: int = 1000, ttl_seconds: float = 3600):
+        self.threshold = threshold
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[str, CacheEntry]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._version: Optional[str] = None
+        # Matriz de embeddings normalizados, se reconstruye solo si cambian las entradas
+        self._matrix: Optional[np.ndarray] = None
+        self._matrix_keys: list[str] = []
+        self.hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def ensure_version(self, version: str) -> None:
+        """Invalida toda la caché si la versión del índice/prompt cambió."""
+        with self._lock:
+            if self._version != version:
+                if self._version is not None:
+                    logger.info(f"Caché de respuestas invalidada ({self._version} -> {version})")
+                self._entries.clear()
+                self._matrix = None
+                self._version = version
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._matrix = None
+
+    def _expired(self, entry: CacheEntry, now: float) -> bool:
+        return now - entry.created_at > self.ttl_seconds
+
+    def _purge_expired(self, now: float) -> None:
+        expired = [k for k, e in self._entries.items() if self._expired(e, now)]
+        for k in expired:
+            del self._entries[k]
+            self.evictions += 1
+        if expired:
+            self._matrix = None
+
+    def _similarity_matrix(self) -> Optional[np.ndarray]:
+        if self._matrix is None:
+            self._matrix_keys = [k for k, e in self._entries.items() if e.embedding is not None]
+            if self._matrix_keys:
+                self._matrix = np.stack([self._entries[k].embedding for k in self._matrix_keys])
+        return self._matrix
+
+    def lookup(
+        self, key: str, embed: Optional[Callable[[], Sequence[float]]] = None
+    ) -> tuple[Optional[str], Optional[np.ndarray]]:
+        """
+        Busca una respuesta para la pregunta normalizada `key`.
+        Devuelve (respuesta, embedding); el embedding solo se calcula si no hubo coincidencia exacta
+        y se devuelve para reutilizarlo en la recuperación. Sin `embed` solo se busca la coincidencia exacta.
+        """
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and not self._expired(entry, now):
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry.answer, entry.embedding
+            if embed is None:
+                self.misses += 1
+                return None, None
+
+        embedding = _normalize(np.asarray(embed(), dtype=np.float32))
+
+        with self._lock:
+            self._purge_expired(now)
+            matrix = self._similarity_matrix()
+            if matrix is not None:
+                scores = matrix @ embedding
+                best = int(np.argmax(scores))
+                if scores[best] >= self.threshold:
+                    best_key = self._matrix_keys[best]
+                    self._entries.move_to_end(best_key)
+                    self.hits += 1
+                    self.semantic_hits += 1
+                    return self._entries[best_key].answer, embedding
+            self.misses += 1
+        return None, embedding
+
+    def put(self, key: str, embedding: Optional[Sequence[float]], answer: str, version: Optional[str] = None) -> None:
+        """
+        Guarda una respuesta; sin embedding la entrada solo sirve coincidencias exactas.
+        `version` es la que se leyó al buscar: si el índice se recargó mientras se generaba la
+        respuesta, esta se calculó con el índice anterior y se descarta.
+        """
+        with self._lock:
+            if version is not None and version != self._version:
+                logger.debug(f"Respuesta de la versión {version} descartada (caché en {self._version})")
+                return
+            self._entries[key] = CacheEntry(
+                embedding=_normalize(np.asarray(embedding, dtype=np.float32)) if embedding is not None else None,
+                answer=answer,
+                created_at=time.time()
+            )
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+            self._matrix = None
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "hits": self.hits,
+                "semantic_hits": self.semantic_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / total if total else 0.0,
+                "version": self._version
+            }
+
+
+def _normalize(vec: np.ndarray) -> np.ndarray:
+    norm = np.linalg.norm(vec)
+    return vec / norm if norm else vec
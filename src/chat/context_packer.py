@@ -0,0 +1,120 @@
+import os
+from dataclasses import dataclass, field
+from typing import Optional, Sequence
+import logging
+
+import numpy as np
+from langchain.docstore.document import Document
+from langchain_core.embeddings import Embeddings
+
+from src.embeddings.backends import HashingEmbeddings
+from src.utils.tokens import count_tokens
+
+logger = logging.getLogger(__name__)
+
+# Parámetros de entorno
+CONTEXT_PACKER_ENABLED = os.getenv("CONTEXT_PACKER_ENABLED", "true").lower() == "true"
+CONTEXT_MAX_TOKENS = int(os.getenv("CONTEXT_MAX_TOKENS", "1200"))
+CONTEXT_DEDUP_THRESHOLD = float(os.getenv("CONTEXT_DEDUP_THRESHOLD", "0.92"))
+
+SHORT_LINE_CHARS = 60
+
+
+@dataclass
+class ContextBlock:
+    """Hits hermanos (misma fuente y sección) fusionados bajo un encabezado."""
+    source: str
+    section: str
+    lines: list[str] = field(default_factory=list)
+    hits: int = 0
+
+    @property
+    def text(self) -> str:
+        body = "\n".join(self.lines)
+        # El encabezado se paga una vez por grupo; un hit suelto solo lo lleva si es un fragmento
+        # corto que sin su sección pierde el sentido (p. ej. "lunes: 7:00 a.m. - 10:00 p.m.")
+        if self.section and (self.hits > 1 or len(body) < SHORT_LINE_CHARS):
+            return f"{self.section}:\n{body}"
+        return body
+
+
+class ContextPacker:
+    """
+    Arma el contexto del prompt a partir de los documentos recuperados (en orden de relevancia):
+
+    1. Agrupa los hits por `source`/`section` y fusiona los hermanos en un bloque con encabezado
+       (p. ej. los días de una misma sucursal), sin repetir líneas idénticas.
+    2. Descarta bloques casi duplicados: similitud coseno (vectorizada) >= `dedup_threshold`
+       con un bloque más relevante, usando embeddings locales sin red.
+    3. Llena el presupuesto `max_tokens` en orden de relevancia, cortando por líneas el último bloque.
+    """
+
+    def __init__(
+        self,
+        max_tokens: int = CONTEXT_MAX_TOKENS,
+        dedup_threshold: float = CONTEXT_DEDUP_THRESHOLD,
+        embeddings: Optional[Embeddings] = None
+    ):
+        self.max_tokens = max_tokens
+        self.dedup_threshold = dedup_threshold
+        self.embeddings = embeddings or HashingEmbeddings()
+
+    def _group(self, docs: Sequence[Document]) -> list[ContextBlock]:
+        blocks: dict[tuple[str, str], ContextBlock] = {}
+        for doc in docs:
+            source = doc.metadata.get("source", "")
+            section = doc.metadata.get("section", "")
+            block = blocks.setdefault((source, section), ContextBlock(source, section))
+            block.hits += 1
+            for line in doc.page_content.strip().splitlines():
+                if line and line not in block.lines:
+                    block.lines.append(line)
+        # dict conserva el orden de inserción: el bloque hereda la posición de su hit más relevante
+        return list(blocks.values())
+
+    def _dedup(self, blocks: list[ContextBlock]) -> list[ContextBlock]:
+        if len(blocks) < 2:
+            return blocks
+        vectors = np.asarray(self.embeddings.embed_documents([b.text for b in blocks]), dtype=np.float32)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        vectors = vectors / np.where(norms == 0, 1, norms)
+        sims = vectors @ vectors.T
+        # Un bloque se descarta si se parece demasiado a uno anterior (más relevante) que se conservó
+        keep = np.ones(len(blocks), dtype=bool)
+        for j in range(1, len(blocks)):
+            if (sims[j, :j][keep[:j]] >= self.dedup_threshold).any():
+                keep[j] = False
+        return [b for b, k in zip(blocks, keep) if k]
+
+    def _fill(self, blocks: list[ContextBlock]) -> list[str]:
+        parts: list[str] = []
+        budget = self.max_tokens
+        for block in blocks:
+            cost = count_tokens(block.text)
+            if cost <= budget:
+                parts.append(block.text)
+                budget -= cost
+                continue
+            # Se incluyen las líneas que quepan del bloque y se detiene el llenado
+            partial = ContextBlock(block.source, block.section, hits=block.hits)
+            for line in block.lines:
+                partial.lines.append(line)
+                if count_tokens(partial.text) > budget:
+                    partial.lines.pop()
+                    break
+            if partial.lines:
+                parts.append(partial.text)
+            break
+        return parts
+
+    def pack(self, docs: Sequence[Document]) -> str:
+        # Referencia: lo que costaba unir los documentos tal cual
+        raw_tokens = count_tokens("\n\n".join(d.page_content for d in docs)) if docs else 0
+        blocks = self._dedup(self._group(docs))
+        context = "\n\n".join(self._fill(blocks))
+        packed_tokens = count_tokens(context) if context else 0
+        logger.info(
+            f"Contexto: {len(docs)} docs -> {len(blocks)} bloques, {packed_tokens} tokens "
+            f"({raw_tokens - packed_tokens} ahorrados de {raw_tokens})"
+        )
+        return context
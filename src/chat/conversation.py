@@ -0,0 +1,272 @@
+import uuid
+from dataclasses import asdict, dataclass, field, fields
+from pathlib import Path
+from typing import AsyncIterator, Generator, Iterator, Union
+import logging
+
+from langchain.prompts import PromptTemplate
+from sqlalchemy.exc import IntegrityError
+
+from src.chat.intent_router import INTENT_ROUTER_ENABLED
+from src.db.database import create_cliente, lookup_cliente, session_scope
+from src.db.validations import validate_email, validate_identificacion, validate_nombre, validate_telefono
+from src.utils.tracing import span, start_trace
+
+logger = logging.getLogger(__name__)
+
+# Estados del flujo: registro (nuevo) o validación (frecuente) y luego preguntas
+USER_STATES = ("initial", "frequent_id", "new_id", "new_name", "new_phone", "new_email", "qa")
+ERROR_MESSAGE = "Lo siento, hubo un problema al procesar tu pregunta. Por favor, intenta de nuevo."
+
+
+def load_registration_prompt() -> PromptTemplate:
+    prompt_file = Path("src/prompts/v1_asistente_retail.txt")
+    if not prompt_file.exists():
+        raise FileNotFoundError(f"Prompt no encontrado: {prompt_file}")
+    template = prompt_file.read_text(encoding="utf-8")
+    return PromptTemplate(
+        input_variables=["input"],
+        template=template + "\n\n**Input del cliente:** {input}\n**Respuesta:**"
+    )
+
+
+@dataclass
+class SessionState:
+    """
+    Estado completo de una conversación, sin referencias a la interfaz: se serializa con
+    `to_dict` y cualquier proceso puede continuar la conversación con `from_dict`.
+    `history` es lo que se muestra al usuario; la memoria del RAG se guarda aparte por session_id.
+    """
+    session_id: str = field(default_factory=lambda: str(uuid.uuid4()))
+    user_state: str = "initial"
+    user_data: dict[str, str] = field(default_factory=dict)
+    history: list[dict[str, str]] = field(default_factory=list)
+    version: int = 0
+
+    def to_dict(self) -> dict:
+        return asdict(self)
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "SessionState":
+        state = cls(**{f.name: data[f.name] for f in fields(cls) if f.name in data})
+        if state.user_state not in USER_STATES:
+            raise ValueError(f"Estado de conversación desconocido: {state.user_state}")
+        return state
+
+
+# Efectos de base de datos que pide el flujo de registro; los ejecuta el motor (síncrono o asíncrono)
+@dataclass(frozen=True)
+class LookupCliente:
+    identificacion: str
+    # El "no encontrado" cacheado es local al worker: al validar un cliente frecuente se consulta la base
+    trust_cached_miss: bool = True
+
+
+@dataclass(frozen=True)
+class RegisterCliente:
+    identificacion: str
+    nombre: str
+    telefono: str
+    email: str
+
+
+Effect = Union[LookupCliente, RegisterCliente]
+
+
+def registration_step(state: SessionState, text: str) -> Generator[Effect, object, str]:
+    """
+    Un paso del flujo de registro/validación. No hace I/O: cede los efectos de base de datos
+    (la búsqueda devuelve el cliente o None; el registro, True si se guardó) y retorna la respuesta.
+    """
+    if state.user_state == "initial":
+        if "frecuente" in text.lower():
+            state.user_state = "frequent_id"
+            return "¡Bienvenido de nuevo! Por favor, ingresa tu número de identificación."
+        if "nuevo" in text.lower():
+            state.user_state = "new_id"
+            return "¡Hola! Bienvenido al Supermercado 😊. Para empezar, por favor ingresa tu número de identificación (solo números, entre 4 y 11 dígitos)."
+        return "Hola, ¿eres un cliente frecuente o es tu primera vez con nosotros? Por favor, dime si eres 'frecuente' o 'nuevo'."
+
+    if state.user_state == "frequent_id":
+        is_valid, error = validate_identificacion(text)
+        if not is_valid:
+            return error + " Intenta de nuevo."
+        cliente = yield LookupCliente(text, trust_cached_miss=False)
+        if not cliente:
+            return "No encontramos esa identificación. Verifica el número o regístrate como nuevo. Intenta de nuevo."
+        state.user_data["identificacion"] = text
+        state.user_state = "qa"
+        return f"¡Bienvenido de nuevo, {cliente.nombre}! ¿En qué puedo ayudarte hoy?"
+
+    if state.user_state == "new_id":
+        is_valid, error = validate_identificacion(text)
+        if not is_valid:
+            return error + " Intenta de nuevo."
+        if (yield LookupCliente(text)):
+            return "Esta identificación ya está registrada. Usa otra o inicia como cliente frecuente. Intenta de nuevo."
+        state.user_data["identificacion"] = text
+        state.user_state = "new_name"
+        return "Gracias por tu identificación. Ahora, por favor ingresa tu nombre completo (solo letras, sin números ni caracteres especiales)."
+
+    if state.user_state == "new_name":
+        is_valid, error = validate_nombre(text)
+        if not is_valid:
+            return error + " Intenta de nuevo."
+        state.user_data["nombre"] = text
+        state.user_state = "new_phone"
+        return "Gracias por tu nombre. Ahora, por favor ingresa tu número de teléfono (10 dígitos, empezando con 6 o 3)."
+
+    if state.user_state == "new_phone":
+        is_valid, error = validate_telefono(text)
+        if not is_valid:
+            return error + " Intenta de nuevo."
+        state.user_data["telefono"] = text
+        state.user_state = "new_email"
+        return "Gracias por tu teléfono. Por último, por favor ingresa tu correo electrónico (debe incluir '@' y un dominio)."
+
+    if state.user_state == "new_email":
+        is_valid, error = validate_email(text)
+        if not is_valid:
+            return error + " Intenta de nuevo."
+        state.user_data["email"] = text
+        registered = yield RegisterCliente(
+            identificacion=state.user_data["identificacion"],
+            nombre=state.user_data["nombre"],
+            telefono=state.user_data["telefono"],
+            email=state.user_data["email"]
+        )
+        if not registered:
+            # Otra sesión registró la misma identificación mientras tanto
+            state.user_state = "new_id"
+            return "Esta identificación ya está registrada. Ingresa otra identificación o inicia como cliente frecuente."
+        state.user_state = "qa"
+        return "¡Muchas gracias! 🎉 Tus datos han sido registrados con éxito. ¿En qué puedo ayudarte ahora?"
+
+    raise ValueError(f"El estado {state.user_state} no pertenece al flujo de registro")
+
+
+class ConversationEngine:
+    """
+    Motor de conversación independiente de la interfaz: recibe un `SessionState` y un mensaje,
+    actualiza el estado y emite la respuesta en fragmentos (solo las respuestas del RAG tienen varios).
+    `stream` usa la base síncrona (Streamlit, scripts); `astream`, la asíncrona (API ASGI).
+    """
+
+    def __init__(self, resources=None, router_enabled: bool = INTENT_ROUTER_ENABLED):
+        if resources is None:
+            from src.chat.resources import get_resources
+            resources = get_resources()
+        self.resources = resources
+        self.router_enabled = router_enabled
+        self.registration_prompt = resources.prompt("registration", load_registration_prompt)
+
+    # Ejecución de los efectos del registro
+    def _execute(self, effect: Effect) -> object:
+        if isinstance(effect, LookupCliente):
+            with span("db_lookup"):
+                return lookup_cliente(effect.identificacion, trust_cached_miss=effect.trust_cached_miss)
+        try:
+            # La sesión se toma del pool solo para la escritura
+            with span("db_write"), session_scope() as db:
+                create_cliente(db=db, **asdict(effect))
+            return True
+        except IntegrityError:
+            return False
+
+    async def _aexecute(self, effect: Effect) -> object:
+        # Importación diferida: la interfaz síncrona no necesita aiosqlite
+        from src.db.async_database import acreate_cliente, alookup_cliente, async_session_scope
+
+        if isinstance(effect, LookupCliente):
+            with span("db_lookup"):
+                return await alookup_cliente(effect.identificacion, trust_cached_miss=effect.trust_cached_miss)
+        try:
+            with span("db_write"):
+                async with async_session_scope() as db:
+                    await acreate_cliente(db=db, **asdict(effect))
+            return True
+        except IntegrityError:
+            return False
+
+    def _register(self, state: SessionState, text: str) -> str:
+        step = registration_step(state, text)
+        try:
+            effect = next(step)
+            while True:
+                effect = step.send(self._execute(effect))
+        except StopIteration as done:
+            return done.value
+
+    async def _aregister(self, state: SessionState, text: str) -> str:
+        step = registration_step(state, text)
+        try:
+            effect = next(step)
+            while True:
+                effect = step.send(await self._aexecute(effect))
+        except StopIteration as done:
+            return done.value
+
+    # Respuestas del estado qa: router de intenciones + pipeline RAG
+    def _answer(self, state: SessionState, text: str) -> Iterator[str]:
+        config = {"configurable": {"session_id": state.session_id}}
+        try:
+            if self.router_enabled:
+                yield from self.resources.router.stream(text, config=config)
+                return
+            for chunk in self.resources.rag_chain.stream({"question": text}, config=config):
+                yield chunk.get("answer", "")
+        except Exception as e:
+            logger.error(f"Error en RAG chain: {e}")
+            yield ERROR_MESSAGE
+
+    async def _aanswer(self, state: SessionState, text: str) -> AsyncIterator[str]:
+        config = {"configurable": {"session_id": state.session_id}}
+        try:
+            if self.router_enabled:
+                async for chunk in self.resources.router.astream(text, config=config):
+                    yield chunk
+                return
+            async for chunk in self.resources.rag_chain.astream({"question": text}, config=config):
+                yield chunk.get("answer", "")
+        except Exception as e:
+            logger.error(f"Error en RAG chain: {e}")
+            yield ERROR_MESSAGE
+
+    def stream(self, state: SessionState, text: str) -> Iterator[str]:
+        """Atiende un mensaje; el estado queda actualizado cuando se consume toda la respuesta."""
+        state.history.append({"role": "user", "content": text})
+        parts: list[str] = []
+        # Traza del mensaje: etapas, tokens y aciertos de caché (muestreada con TRACE_SAMPLE_RATE)
+        with start_trace(state.user_state):
+            try:
+                if state.user_state == "qa":
+                    for chunk in self._answer(state, text):
+                        parts.append(chunk)
+                        yield chunk
+                else:
+                    parts.append(self._register(state, text))
+                    yield parts[-1]
+            finally:
+                state.history.append({"role": "assistant", "content": "".join(parts)})
+
+    async def astream(self, state: SessionState, text: str) -> AsyncIterator[str]:
+        """Versión asíncrona de `stream`."""
+        state.history.append({"role": "user", "content": text})
+        parts: list[str] = []
+        with start_trace(state.user_state):
+            try:
+                if state.user_state == "qa":
+                    async for chunk in self._aanswer(state, text):
+                        parts.append(chunk)
+                        yield chunk
+                else:
+                    parts.append(await self._aregister(state, text))
+                    yield parts[-1]
+            finally:
+                state.history.append({"role": "assistant", "content": "".join(parts)})
+
+    def respond(self, state: SessionState, text: str) -> str:
+        return "".join(self.stream(state, text))
+
+    async def arespond(self, state: SessionState, text: str) -> str:
+        return "".join([chunk async for chunk in self.astream(state, text)])
@@ -0,0 +1,86 @@
+import json
+from pathlib import Path
+from typing import Optional, Sequence
+import logging
+
+import numpy as np
+
+from src.utils.text import normalize_text
+
+logger = logging.getLogger(__name__)
+
+FAQ_ANSWERS_FILE = "faq_answers.json"
+FAQ_EMBEDDINGS_FILE = "faq_embeddings.npy"
+
+
+def _tokens(text: str) -> frozenset[str]:
+    return frozenset(t for t in normalize_text(text).split() if len(t) > 2)
+
+
+class FAQAnswerTable:
+    """
+    Tabla precalculada de respuestas aprobadas de preguntas frecuentes.
+
+    Se genera al construir el índice (`run_embed_and_index`) y permite responder sin LLM:
+    1. Pregunta normalizada idéntica (búsqueda en diccionario).
+    2. Casi idéntica por solapamiento de palabras (Jaccard >= `lexical_threshold`).
+    3. Similar por embedding (coseno >= `embedding_threshold`), reutilizando el embedding de la pregunta.
+    """
+
+    def __init__(
+        self,
+        entries: list[dict],
+        embeddings: Optional[np.ndarray] = None,
+        lexical_threshold: float = 0.8,
+        embedding_threshold: float = 0.92
+    ):
+        self.entries = entries
+        self.lexical_threshold = lexical_threshold
+        self.embedding_threshold = embedding_threshold
+        self._by_question = {normalize_text(e["pregunta"]): e for e in entries}
+        self._token_sets = [_tokens(e["pregunta"]) for e in entries]
+        self._matrix = None
+        if embeddings is not None and len(embeddings):
+            norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+            self._matrix = (embeddings / np.where(norms == 0, 1, norms)).astype(np.float32)
+
+    @classmethod
+    def load(cls, folder: str | Path, **kwargs) -> Optional["FAQAnswerTable"]:
+        """Carga la tabla desde la carpeta del vectorstore; None si el índice no la incluye."""
+        folder = Path(folder)
+        answers_file = folder / FAQ_ANSWERS_FILE
+        if not answers_file.exists():
+            logger.info(f"No hay tabla de FAQs en {folder}, se usará solo el RAG")
+            return None
+        entries = json.loads(answers_file.read_text(encoding="utf-8"))
+        emb_file = folder / FAQ_EMBEDDINGS_FILE
+        embeddings = np.load(emb_file) if emb_file.exists() else None
+        logger.info(f"Tabla de FAQs cargada: {len(entries)} respuestas")
+        return cls(entries, embeddings, **kwargs)
+
+    def match_text(self, question: str) -> Optional[dict]:
+        """Coincidencia exacta o casi exacta sin calcular embeddings."""
+        entry = self._by_question.get(normalize_text(question))
+        if entry is not None:
+            return entry
+        tokens = _tokens(question)
+        if not tokens:
+            return None
+        best, best_score = None, 0.0
+        for entry, faq_tokens in zip(self.entries, self._token_sets):
+            score = len(tokens & faq_tokens) / len(tokens | faq_tokens)
+            if score > best_score:
+                best, best_score = entry, score
+        return best if best_score >= self.lexical_threshold else None
+
+    def match_embedding(self, embedding: Sequence[float]) -> Optional[dict]:
+        """Coincidencia semántica contra los embeddings precalculados de las preguntas."""
+        if self._matrix is None:
+            return None
+        query = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(query)
+        if not norm:
+            return None
+        scores = self._matrix @ (query / norm)
+        best = int(np.argmax(scores))
+        return self.entries[best] if scores[best] >= self.embedding_threshold else None
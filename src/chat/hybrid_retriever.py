@@ -0,0 +1,151 @@
+import os
+import time
+from typing import Optional, Sequence
+import logging
+
+from langchain.docstore.document import Document
+from langchain_community.vectorstores import FAISS
+
+from src.embeddings.lexical_index import BM25Index
+from src.utils.tracing import span
+
+logger = logging.getLogger(__name__)
+
+# Parámetros de entorno
+RETRIEVAL_MODE = os.getenv("RETRIEVAL_MODE", "hybrid")  # vector | lexical | hybrid
+HYBRID_ALPHA = float(os.getenv("HYBRID_ALPHA", "0.5"))  # peso del puntaje vectorial en la fusión
+LEXICAL_ONLY_THRESHOLD = float(os.getenv("LEXICAL_ONLY_THRESHOLD", "0.8"))
+HYBRID_CANDIDATES = int(os.getenv("HYBRID_CANDIDATES", "20"))
+
+
+def _min_max(scores: dict[str, float]) -> dict[str, float]:
+    if not scores:
+        return {}
+    lo, hi = min(scores.values()), max(scores.values())
+    if hi == lo:
+        return {k: 1.0 for k in scores}
+    return {k: (v - lo) / (hi - lo) for k, v in scores.items()}
+
+
+class HybridRetriever:
+    """
+    Recuperación híbrida BM25 + FAISS.
+
+    - `vector`: solo búsqueda densa.
+    - `lexical`: solo BM25, sin llamar a la API de embeddings.
+    - `hybrid`: fusiona ambos puntajes normalizados (min-max) con peso `alpha` para el vectorial.
+      Si la confianza léxica supera `lexical_only_threshold`, responde solo con BM25.
+
+    Con chunks padre/hijo (`parents`) se buscan los hijos y se devuelve cada padre una sola vez.
+    """
+
+    def __init__(
+        self,
+        vectorstore: FAISS,
+        lexical: Optional[BM25Index],
+        k: int = 5,
+        parents: Optional[dict[str, dict]] = None,
+        mode: str = RETRIEVAL_MODE,
+        alpha: float = HYBRID_ALPHA,
+        lexical_only_threshold: float = LEXICAL_ONLY_THRESHOLD,
+        candidates: int = HYBRID_CANDIDATES
+    ):
+        if mode not in ("vector", "lexical", "hybrid"):
+            raise ValueError(f"RETRIEVAL_MODE inválido: {mode}")
+        if lexical is None and mode != "vector":
+            logger.warning("No hay índice léxico, la recuperación será solo vectorial")
+            mode = "vector"
+        self.vectorstore = vectorstore
+        self.lexical = lexical
+        self.k = k
+        self.mode = mode
+        self.alpha = alpha
+        self.lexical_only_threshold = lexical_only_threshold
+        self.candidates = max(candidates, k)
+        self.parents = parents or {}
+
+    def lexical_confident(self, question: str) -> bool:
+        """True si BM25 basta para responder (no hace falta calcular el embedding)."""
+        if self.mode == "lexical":
+            return True
+        if self.mode == "vector":
+            return False
+        _, confidence = self.lexical.search(question, k=1)
+        return confidence >= self.lexical_only_threshold
+
+    def _lexical_docs(self, hits) -> list[Document]:
+        return [
+            Document(
+                page_content=doc["text"],
+                metadata={
+                    "id": doc["id"], "source": doc["source"], "section": doc["section"], "score": score,
+                    **({"parent_id": doc["parent_id"]} if doc.get("parent_id") else {})
+                }
+            )
+            for doc, score in hits
+        ]
+
+    def _to_parents(self, docs: list[Document]) -> list[Document]:
+        out: list[Document] = []
+        seen: set[str] = set()
+        for doc in docs:
+            parent = self.parents.get(doc.metadata.get("parent_id"))
+            if parent is None:
+                out.append(doc)
+                continue
+            if parent["id"] in seen:
+                continue
+            seen.add(parent["id"])
+            out.append(Document(
+                page_content=parent["text"],
+                metadata={"id": parent["id"], "source": parent["source"], "section": parent["section"],
+                          "child_id": doc.metadata.get("id")}
+            ))
+        return out
+
+    def _vector_hits(self, question: str, embedding: Optional[Sequence[float]], k: int):
+        if embedding is None:
+            with span("embed"):
+                embedding = self.vectorstore.embeddings.embed_query(question)
+        with span("vector_search"):
+            return self.vectorstore.similarity_search_with_score_by_vector(list(embedding), k=k)
+
+    def retrieve(self, question: str, embedding: Optional[Sequence[float]] = None) -> list[Document]:
+        t0 = time.perf_counter()
+        used = self.mode
+        if self.mode == "vector":
+            docs = [doc for doc, _ in self._vector_hits(question, embedding, self.k)]
+        else:
+            with span("lexical_search"):
+                hits, confidence = self.lexical.search(question, k=self.candidates)
+            if self.mode == "lexical" or (embedding is None and confidence >= self.lexical_only_threshold):
+                used = "lexical"
+                docs = self._lexical_docs(hits[:self.k])
+            else:
+                docs = self._fuse(hits, self._vector_hits(question, embedding, self.candidates))
+        if self.parents:
+            docs = self._to_parents(docs)
+        logger.debug(f"Recuperación {used}: {len(docs)} docs en {(time.perf_counter() - t0) * 1000:.1f} ms")
+        return docs
+
+    def _fuse(self, lexical_hits, vector_hits) -> list[Document]:
+        docs: dict[str, Document] = {}
+        lexical_scores: dict[str, float] = {}
+        vector_scores: dict[str, float] = {}
+        for doc in self._lexical_docs(lexical_hits):
+            docs[doc.metadata["id"]] = doc
+            lexical_scores[doc.metadata["id"]] = doc.metadata["score"]
+        for doc, distance in vector_hits:
+            doc_id = doc.metadata.get("id", doc.page_content)
+            docs.setdefault(doc_id, doc)
+            # FAISS devuelve distancia L2: menor es mejor
+            vector_scores[doc_id] = -float(distance)
+        lexical_norm = _min_max(lexical_scores)
+        vector_norm = _min_max(vector_scores)
+        fused = {
+            doc_id: self.alpha * vector_norm.get(doc_id, 0.0) + (1 - self.alpha) * lexical_norm.get(doc_id, 0.0)
+            for doc_id in docs
+        }
+        ranked = sorted(fused, key=fused.get, reverse=True)[:self.k]
+        return [docs[doc_id] for doc_id in ranked]
+
@@ -0,0 +1,232 @@
+import asyncio
+import json
+import os
+import random
+import re
+import threading
+import time
+from collections import defaultdict, deque
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import AsyncIterator, Callable, Iterator, Optional
+import logging
+
+import numpy as np
+
+from src.chat.memory import record_turn
+from src.embeddings.backends import HashingEmbeddings
+from src.utils.text import normalize_text
+from src.utils.tracing import set_path, span
+
+logger = logging.getLogger(__name__)
+
+# Parámetros de entorno
+INTENT_ROUTER_ENABLED = os.getenv("INTENT_ROUTER_ENABLED", "true").lower() == "true"
+INTENT_ROUTES_PATH = Path(os.getenv("INTENT_ROUTES_PATH", "src/chat/intent_routes.json"))
+INTENT_METRICS_PATH = Path(os.getenv("INTENT_METRICS_PATH", "data/metrics/intent_router_metrics.json"))
+INTENT_METRICS_FLUSH_EVERY = int(os.getenv("INTENT_METRICS_FLUSH_EVERY", "50"))
+
+HANDLERS = ("smalltalk", "schedule", "faq", "rag")
+
+
+@dataclass
+class Route:
+    name: str
+    handler: str
+    patterns: list[re.Pattern] = field(default_factory=list)
+    examples: list[str] = field(default_factory=list)
+    responses: list[str] = field(default_factory=list)
+
+
+@dataclass(frozen=True)
+class RouteDecision:
+    """Ruta elegida para un mensaje; `answer` es None solo para la ruta RAG."""
+    route: str
+    handler: str
+    method: str  # regex | classifier | default
+    answer: Optional[str] = None
+
+
+def load_routes(path: Path = INTENT_ROUTES_PATH) -> tuple[list[Route], dict]:
+    """Lee la tabla de rutas (JSON) y compila sus expresiones regulares."""
+    config = json.loads(Path(path).read_text(encoding="utf-8"))
+    routes = []
+    for r in config["routes"]:
+        if r["handler"] not in HANDLERS:
+            raise ValueError(f"Handler desconocido en {path}: {r['handler']} (usa {', '.join(HANDLERS)})")
+        routes.append(Route(
+            name=r["name"],
+            handler=r["handler"],
+            patterns=[re.compile(p) for p in r.get("patterns", [])],
+            examples=r.get("examples", []),
+            responses=r.get("responses", [])
+        ))
+    return routes, config
+
+
+class RouterMetrics:
+    """Conteo y latencias por ruta; se exportan a JSON cada `flush_every` mensajes."""
+
+    def __init__(self, path: Path = INTENT_METRICS_PATH, flush_every: int = INTENT_METRICS_FLUSH_EVERY,
+                 window: int = 1000):
+        self.path = Path(path)
+        self.flush_every = flush_every
+        self._lock = threading.Lock()
+        self._counts: dict[str, int] = defaultdict(int)
+        self._methods: dict[str, int] = defaultdict(int)
+        self._latencies: dict[str, deque] = defaultdict(lambda: deque(maxlen=window))
+        self._total = 0
+
+    def record(self, decision: RouteDecision, seconds: float) -> None:
+        with self._lock:
+            self._counts[decision.route] += 1
+            self._methods[decision.method] += 1
+            self._latencies[decision.route].append(seconds * 1000)
+            self._total += 1
+            flush = self.flush_every > 0 and self._total % self.flush_every == 0
+        if flush:
+            self.export()
+
+    def stats(self) -> dict:
+        with self._lock:
+            routes = {}
+            for route, count in self._counts.items():
+                lat = np.asarray(self._latencies[route], dtype=np.float64)
+                routes[route] = {
+                    "count": count,
+                    "share": count / self._total,
+                    "latency_p50_ms": float(np.percentile(lat, 50)),
+                    "latency_p95_ms": float(np.percentile(lat, 95))
+                }
+            return {"total": self._total, "methods": dict(self._methods), "routes": routes}
+
+    def export(self) -> None:
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self.path.write_text(json.dumps(self.stats(), ensure_ascii=False, indent=2), encoding="utf-8")
+        except Exception as e:
+            logger.warning(f"No se pudieron exportar las métricas del router: {e}")
+
+
+class IntentRouter:
+    """
+    Envía cada mensaje al handler más barato capaz de responderlo, en el orden de la tabla de rutas:
+    plantillas de conversación, horarios estructurados, FAQ directa y, como último recurso, el RAG completo.
+
+    1. Reglas: la primera ruta cuya expresión regular coincide y cuyo handler produce respuesta.
+    2. Clasificador: vecino más cercano (HashingEmbeddings, sin red) entre los ejemplos de las rutas,
+       solo para mensajes cortos y si la similitud supera `classifier_threshold`. Los ejemplos de la
+       ruta RAG sirven de contraejemplos: si gana el RAG, el mensaje sigue a la ruta por defecto.
+    3. Ruta por defecto (`default_route`, normalmente el RAG).
+    """
+
+    def __init__(self, resources, path: Path = INTENT_ROUTES_PATH, metrics: Optional[RouterMetrics] = None):
+        from src.chat.schedule_lookup import get_schedule_index
+
+        self.resources = resources
+        self.routes, config = load_routes(path)
+        self.default_route = next(r for r in self.routes if r.name == config.get("default_route", "rag"))
+        self.classifier_threshold = float(config.get("classifier_threshold", 0.35))
+        self.classifier_max_words = int(config.get("classifier_max_words", 8))
+        self.metrics = metrics or RouterMetrics()
+        self.schedules = get_schedule_index()
+        self._handlers: dict[str, Callable[[Route, str], Optional[str]]] = {
+            "smalltalk": self._smalltalk,
+            "schedule": self._schedule,
+            "faq": self._faq,
+            "rag": lambda route, question: None
+        }
+        self._build_classifier()
+
+    def _build_classifier(self) -> None:
+        self._embedder = HashingEmbeddings()
+        examples, labels = [], []
+        for i, route in enumerate(self.routes):
+            examples.extend(route.examples)
+            labels.extend([i] * len(route.examples))
+        self._labels = np.asarray(labels, dtype=np.int32)
+        self._examples = np.asarray(self._embedder.embed_documents(examples), dtype=np.float32) if examples else None
+
+    def classify(self, question: str) -> tuple[Optional[Route], float]:
+        """Ruta del ejemplo más parecido y su similitud coseno (los vectores ya vienen normalizados)."""
+        if self._examples is None:
+            return None, 0.0
+        vec = np.asarray(self._embedder.embed_query(question), dtype=np.float32)
+        scores = self._examples @ vec
+        best = int(np.argmax(scores))
+        return self.routes[self._labels[best]], float(scores[best])
+
+    def _smalltalk(self, route: Route, question: str) -> Optional[str]:
+        return random.choice(route.responses) if route.responses else None
+
+    def _schedule(self, route: Route, question: str) -> Optional[str]:
+        return self.schedules.answer(question) if self.schedules is not None else None
+
+    def _faq(self, route: Route, question: str) -> Optional[str]:
+        faq_table = self.resources.index.faq_table
+        faq = faq_table.match_text(question) if faq_table is not None else None
+        return faq["respuesta"] if faq is not None else None
+
+    def route(self, question: str) -> RouteDecision:
+        """Decide la ruta del mensaje; para rutas distintas al RAG incluye la respuesta."""
+        normalized = normalize_text(question)
+
+        # 1) Reglas de la tabla, en orden
+        for route in self.routes:
+            if route.handler == "rag":
+                continue
+            if any(p.search(normalized) for p in route.patterns):
+                answer = self._handlers[route.handler](route, question)
+                if answer is not None:
+                    return RouteDecision(route.name, route.handler, "regex", answer)
+
+        # 2) Clasificador local para mensajes cortos que no cubren las reglas
+        if len(normalized.split()) <= self.classifier_max_words:
+            route, score = self.classify(question)
+            if route is not None and score >= self.classifier_threshold:
+                answer = self._handlers[route.handler](route, question)
+                if answer is not None:
+                    return RouteDecision(route.name, route.handler, "classifier", answer)
+
+        # 3) Ruta por defecto
+        default = self.default_route
+        return RouteDecision(default.name, default.handler, "default",
+                             self._handlers[default.handler](default, question))
+
+    def stream(self, question: str, config: Optional[dict] = None) -> Iterator[str]:
+        """Responde el mensaje por la ruta elegida; el RAG se emite fragmento a fragmento."""
+        t0 = time.perf_counter()
+        with span("route"):
+            decision = self.route(question)
+        try:
+            if decision.answer is not None:
+                set_path(decision.handler)
+                logger.info(f"Ruta {decision.route} ({decision.method})")
+                record_turn(config, question, decision.answer)
+                yield decision.answer
+                return
+            for chunk in self.resources.rag_chain.stream({"question": question}, config=config):
+                yield chunk.get("answer", "")
+        finally:
+            self.metrics.record(decision, time.perf_counter() - t0)
+
+    async def astream(self, question: str, config: Optional[dict] = None) -> AsyncIterator[str]:
+        """Versión asíncrona de `stream`: el ruteo y la memoria de las rutas rápidas corren en un hilo."""
+        t0 = time.perf_counter()
+
+        def route() -> RouteDecision:
+            with span("route"):
+                return self.route(question)
+
+        decision = await asyncio.to_thread(route)
+        try:
+            if decision.answer is not None:
+                set_path(decision.handler)
+                logger.info(f"Ruta {decision.route} ({decision.method})")
+                await asyncio.to_thread(record_turn, config, question, decision.answer)
+                yield decision.answer
+                return
+            async for chunk in self.resources.rag_chain.astream({"question": question}, config=config):
+                yield chunk.get("answer", "")
+        finally:
+            self.metrics.record(decision, time.perf_counter() - t0)
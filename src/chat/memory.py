@@ -0,0 +1,303 @@
+import os
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable, Optional, Sequence
+import logging
+
+from langchain_core.chat_history import BaseChatMessageHistory
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage, SystemMessage
+
+from src.utils.tokens import count_tokens
+from src.utils.tracing import span
+
+logger = logging.getLogger(__name__)
+
+# Parámetros de entorno
+MEMORY_BACKEND = os.getenv("MEMORY_BACKEND", "sqlite")  # sqlite | memory
+MEMORY_DB_PATH = Path(os.getenv("MEMORY_DB_PATH", "data/processed/chat_memory.sqlite"))
+MEMORY_MAX_TOKENS = int(os.getenv("MEMORY_MAX_TOKENS", "1200"))
+MEMORY_SUMMARY_MAX_TOKENS = int(os.getenv("MEMORY_SUMMARY_MAX_TOKENS", "300"))
+MEMORY_TTL_SECONDS = float(os.getenv("MEMORY_TTL_SECONDS", str(24 * 3600)))
+MEMORY_EVICT_INTERVAL = float(os.getenv("MEMORY_EVICT_INTERVAL", "600"))
+MEMORY_SUMMARY_MODE = os.getenv("MEMORY_SUMMARY_MODE", "extractive")  # extractive | llm
+MEMORY_SUMMARY_MODEL = os.getenv("MEMORY_SUMMARY_MODEL", "gpt-4o-mini")
+
+ROLES = {"human": HumanMessage, "ai": AIMessage}
+LABELS = {"human": "Cliente", "ai": "Asistente"}
+
+Summarizer = Callable[[str, list[tuple[str, str]]], str]
+
+
+@dataclass
+class StoredMessage:
+    role: str  # human | ai
+    content: str
+    tokens: int
+
+
+def extractive_summary(summary: str, dropped: list[tuple[str, str]], max_tokens: int = MEMORY_SUMMARY_MAX_TOKENS) -> str:
+    """
+    Resumen acumulado sin LLM: conserva las preguntas del cliente que salen de la ventana
+    (las más recientes primero) hasta `max_tokens`.
+    """
+    lines = [line for line in summary.splitlines() if line]
+    lines.extend(f"- {LABELS['human']} preguntó: {content.strip()[:200]}" for role, content in dropped if role == "human")
+    kept: list[str] = []
+    budget = max_tokens
+    for line in reversed(lines):
+        cost = count_tokens(line)
+        if cost > budget:
+            break
+        kept.append(line)
+        budget -= cost
+    return "\n".join(reversed(kept))
+
+
+def llm_summarizer(llm, max_tokens: int = MEMORY_SUMMARY_MAX_TOKENS) -> Summarizer:
+    """Resumen acumulado con el LLM; si la llamada falla se usa el resumen extractivo."""
+    def summarize(summary: str, dropped: list[tuple[str, str]]) -> str:
+        turns = "\n".join(f"{LABELS[role]}: {content}" for role, content in dropped)
+        prompt = (
+            f"Actualiza el resumen de una conversación de atención al cliente en menos de {max_tokens} tokens, "
+            f"conservando datos concretos (sucursales, productos, fechas).\n\n"
+            f"Resumen actual:\n{summary or '(vacío)'}\n\nNuevos mensajes:\n{turns}\n\nResumen actualizado:"
+        )
+        try:
+            return llm.invoke(prompt).content.strip()
+        except Exception as e:
+            logger.warning(f"No se pudo resumir con el LLM, se usa el resumen extractivo: {e}")
+            return extractive_summary(summary, dropped, max_tokens)
+    return summarize
+
+
+class BoundedChatHistory(BaseChatMessageHistory):
+    """
+    Historial de una sesión limitado por presupuesto de tokens.
+
+    Los mensajes más antiguos salen de la ventana deslizante cuando el total supera `max_tokens`
+    y se incorporan a un resumen acumulado, que se entrega como primer mensaje (SystemMessage).
+    Así el tamaño del prompt y la latencia del LLM se mantienen estables en conversaciones largas.
+    """
+
+    def __init__(self, store: "ConversationMemoryStore", session_id: str):
+        self.store = store
+        self.session_id = session_id
+
+    @property
+    def messages(self) -> list[BaseMessage]:
+        with span("history_load"):
+            summary, window = self.store.load(self.session_id)
+        out: list[BaseMessage] = []
+        if summary:
+            out.append(SystemMessage(content=f"Resumen de la conversación anterior:\n{summary}"))
+        out.extend(ROLES[m.role](content=m.content) for m in window)
+        return out
+
+    def add_messages(self, messages: Sequence[BaseMessage]) -> None:
+        new = [
+            StoredMessage(role=m.type, content=m.content, tokens=count_tokens(m.content))
+            for m in messages if m.type in ROLES and isinstance(m.content, str)
+        ]
+        if new:
+            with span("history_save"):
+                self.store.append(self.session_id, new)
+
+    def clear(self) -> None:
+        self.store.clear(self.session_id)
+
+
+class ConversationMemoryStore:
+    """
+    Almacén de historiales por session_id con ventana por tokens, resumen acumulado y expulsión por TTL.
+    Esta implementación guarda todo en memoria del proceso; `SQLiteMemoryStore` la persiste en disco.
+    """
+
+    def __init__(
+        self,
+        max_tokens: int = MEMORY_MAX_TOKENS,
+        ttl_seconds: float = MEMORY_TTL_SECONDS,
+        summarizer: Optional[Summarizer] = None,
+        evict_interval: float = MEMORY_EVICT_INTERVAL
+    ):
+        self.max_tokens = max_tokens
+        self.ttl_seconds = ttl_seconds
+        self.summarizer = summarizer or extractive_summary
+        self.evict_interval = evict_interval
+        self._lock = threading.RLock()
+        self._sessions: dict[str, tuple[str, list[StoredMessage], float]] = {}
+        self._next_evict = time.time() + evict_interval
+
+    def get_history(self, session_id: str) -> BoundedChatHistory:
+        return BoundedChatHistory(self, session_id)
+
+    # Persistencia: las subclases reemplazan estos tres métodos
+    def _read(self, session_id: str) -> tuple[str, list[StoredMessage]]:
+        summary, window, _ = self._sessions.get(session_id, ("", [], 0.0))
+        return summary, list(window)
+
+    def _write(self, session_id: str, summary: str, window: list[StoredMessage]) -> None:
+        self._sessions[session_id] = (summary, window, time.time())
+
+    def _delete(self, session_id: Optional[str] = None, older_than: Optional[float] = None) -> int:
+        if session_id is not None:
+            return 1 if self._sessions.pop(session_id, None) is not None else 0
+        expired = [sid for sid, (_, _, updated) in self._sessions.items() if updated < older_than]
+        for sid in expired:
+            del self._sessions[sid]
+        return len(expired)
+
+    def load(self, session_id: str) -> tuple[str, list[StoredMessage]]:
+        with self._lock:
+            return self._read(session_id)
+
+    def append(self, session_id: str, messages: list[StoredMessage]) -> None:
+        with self._lock:
+            summary, window = self._read(session_id)
+            window.extend(messages)
+            total = sum(m.tokens for m in window)
+            # Ventana deslizante: se conservan siempre los mensajes recién agregados
+            cut = 0
+            while total > self.max_tokens and cut < len(window) - len(messages):
+                total -= window[cut].tokens
+                cut += 1
+            # Los mensajes se guardan ya; el resumen (quizá una llamada al LLM) se calcula fuera del lock
+            self._write(session_id, summary, window)
+        if cut:
+            dropped = window[:cut]
+            new_summary = self.summarizer(summary, [(m.role, m.content) for m in dropped])
+            with self._lock:
+                current_summary, current = self._read(session_id)
+                # Si otra petición de la misma sesión ya resumió o borró esos mensajes, se deja para el próximo turno
+                if current_summary == summary and current[:cut] == dropped:
+                    self._write(session_id, new_summary, current[cut:])
+                    logger.debug(f"Memoria {session_id}: {cut} mensajes resumidos, ventana de {total} tokens")
+        self._maybe_evict()
+
+    def clear(self, session_id: str) -> None:
+        with self._lock:
+            self._delete(session_id=session_id)
+
+    def evict_expired(self) -> int:
+        """Elimina las sesiones sin actividad durante más de `ttl_seconds`."""
+        with self._lock:
+            removed = self._delete(older_than=time.time() - self.ttl_seconds)
+        if removed:
+            logger.info(f"Memoria conversacional: {removed} sesiones expiradas eliminadas")
+        return removed
+
+    def _maybe_evict(self) -> None:
+        now = time.time()
+        if now >= self._next_evict:
+            self._next_evict = now + self.evict_interval
+            self.evict_expired()
+
+
+class SQLiteMemoryStore(ConversationMemoryStore):
+    """Misma ventana y resumen que `ConversationMemoryStore`, persistidos en SQLite."""
+
+    def __init__(self, path: str | Path = MEMORY_DB_PATH, **kwargs):
+        super().__init__(**kwargs)
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False)
+        self._conn.executescript(
+            """
+            PRAGMA journal_mode=WAL;
+            CREATE TABLE IF NOT EXISTS sessions (
+                session_id TEXT PRIMARY KEY,
+                summary TEXT NOT NULL DEFAULT '',
+                updated_at REAL NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS messages (
+                session_id TEXT NOT NULL,
+                position INTEGER NOT NULL,
+                role TEXT NOT NULL,
+                content TEXT NOT NULL,
+                tokens INTEGER NOT NULL,
+                PRIMARY KEY (session_id, position)
+            );
+            CREATE INDEX IF NOT EXISTS idx_sessions_updated ON sessions (updated_at);
+            """
+        )
+        self._conn.commit()
+
+    def _read(self, session_id: str) -> tuple[str, list[StoredMessage]]:
+        row = self._conn.execute("SELECT summary FROM sessions WHERE session_id = ?", (session_id,)).fetchone()
+        rows = self._conn.execute(
+            "SELECT role, content, tokens FROM messages WHERE session_id = ? ORDER BY position", (session_id,)
+        ).fetchall()
+        return (row[0] if row else ""), [StoredMessage(*r) for r in rows]
+
+    def _write(self, session_id: str, summary: str, window: list[StoredMessage]) -> None:
+        # La ventana está acotada por tokens, así que reescribirla completa es barato
+        with self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO sessions (session_id, summary, updated_at) VALUES (?, ?, ?)",
+                (session_id, summary, time.time())
+            )
+            self._conn.execute("DELETE FROM messages WHERE session_id = ?", (session_id,))
+            self._conn.executemany(
+                "INSERT INTO messages VALUES (?, ?, ?, ?, ?)",
+                [(session_id, i, m.role, m.content, m.tokens) for i, m in enumerate(window)]
+            )
+
+    def _delete(self, session_id: Optional[str] = None, older_than: Optional[float] = None) -> int:
+        with self._conn:
+            if session_id is not None:
+                ids = [session_id]
+            else:
+                ids = [r[0] for r in self._conn.execute(
+                    "SELECT session_id FROM sessions WHERE updated_at < ?", (older_than,)
+                )]
+            self._conn.executemany("DELETE FROM messages WHERE session_id = ?", [(i,) for i in ids])
+            cur = self._conn.executemany("DELETE FROM sessions WHERE session_id = ?", [(i,) for i in ids])
+        return cur.rowcount if ids else 0
+
+    def close(self) -> None:
+        self._conn.close()
+
+
+def format_history(messages: Sequence[BaseMessage]) -> str:
+    """Historial como texto para el prompt (el resumen va primero)."""
+    lines = []
+    for m in messages:
+        if isinstance(m, SystemMessage):
+            lines.append(m.content)
+        else:
+            lines.append(f"{LABELS.get(m.type, m.type)}: {m.content}")
+    return "\n".join(lines)
+
+
+_memory_store: Optional[ConversationMemoryStore] = None
+_memory_lock = threading.Lock()
+
+
+def get_memory_store() -> ConversationMemoryStore:
+    """Almacén de memoria conversacional compartido del proceso (MEMORY_BACKEND)."""
+    global _memory_store
+    if _memory_store is None:
+        with _memory_lock:
+            if _memory_store is None:
+                summarizer = None
+                if MEMORY_SUMMARY_MODE == "llm":
+                    from langchain_openai import ChatOpenAI
+                    summarizer = llm_summarizer(ChatOpenAI(model=MEMORY_SUMMARY_MODEL, temperature=0))
+                if MEMORY_BACKEND == "sqlite":
+                    _memory_store = SQLiteMemoryStore(MEMORY_DB_PATH, summarizer=summarizer)
+                elif MEMORY_BACKEND == "memory":
+                    _memory_store = ConversationMemoryStore(summarizer=summarizer)
+                else:
+                    raise ValueError(f"MEMORY_BACKEND desconocido: {MEMORY_BACKEND} (usa 'sqlite' o 'memory')")
+    return _memory_store
+
+
+def record_turn(config: Optional[dict], question: str, answer: str) -> None:
+    """Guarda en la memoria un turno respondido fuera del chain (rutas rápidas y router)."""
+    session_id = ((config or {}).get("configurable") or {}).get("session_id")
+    if session_id and answer:
+        get_memory_store().get_history(session_id).add_messages(
+            [HumanMessage(content=question), AIMessage(content=answer)]
+        )
@@ -1,16 +1,29 @@
 import os
+import asyncio
+import hashlib
+import json
+import re
+import time
 from pathlib import Path
 from dotenv import load_dotenv
-from langchain_openai import OpenAIEmbeddings
 from langchain_community.vectorstores import FAISS
-from langchain_openai import ChatOpenAI
 from langchain.prompts import PromptTemplate
-from langchain_core.runnables import RunnableSequence, RunnablePassthrough
+from langchain_core.runnables import RunnableSequence, RunnablePassthrough, RunnableLambda, RunnableGenerator
+from langchain_core.runnables.utils import AddableDict
 from langchain_core.runnables.history import RunnableWithMessageHistory
-from langchain_community.chat_message_histories import ChatMessageHistory
 import logging
 
-from pydantic import SecretStr
+from src.chat.answer_cache import SemanticAnswerCache
+from src.chat.context_packer import CONTEXT_PACKER_ENABLED, ContextPacker
+from src.chat.memory import BoundedChatHistory, format_history, get_memory_store, record_turn
+from src.chat.schedule_lookup import ScheduleIndex, get_schedule_index
+from src.embeddings.backends import EMBEDDING_BACKEND, MANIFEST_FILE, get_embeddings, validate_index_manifest
+from src.embeddings.docstore import has_sqlite_docstore, load_mmap_vectorstore
+from src.embeddings.faiss_index import apply_manifest_search_params
+from src.embeddings.query_batcher import QUERY_EMBED_BATCHING, BatchingEmbeddings
+from src.utils.text import normalize_text
+from src.utils.tokens import count_tokens
+from src.utils.tracing import add_event, add_tokens, current_trace, get_collector, set_path, span
 
 # Configuración de logging
 logging.basicConfig(level=logging.INFO)
@@ -25,20 +38,93 @@ PROMPT_DIR = Path(os.getenv("PROMPT_DIR", "src/prompts"))
 PROMPT_VERSION = os.getenv("PROMPT_VERSION", "v2_preguntas_faq")
 OPENAI_MODEL = os.getenv("OPENAI_MODEL", "gpt-4o")
 OPENAI_TEMPERATURE = float(os.getenv("OPENAI_TEMPERATURE", "0"))
+OPENAI_STREAMING = os.getenv("OPENAI_STREAMING", "true").lower() == "true"
+LLM_BACKEND = os.getenv("LLM_BACKEND", "openai")  # openai | stub (sin red, para benchmarks)
+RETRIEVER_K = int(os.getenv("RETRIEVER_K", "5"))
 
-def load_vectorstore() -> FAISS:
-    """Carga el FAISS vectorstore desde disco."""
+# Caché semántica de respuestas
+ANSWER_CACHE_ENABLED = os.getenv("ANSWER_CACHE_ENABLED", "true").lower() == "true"
+ANSWER_CACHE_THRESHOLD = float(os.getenv("ANSWER_CACHE_THRESHOLD", "0.95"))
+ANSWER_CACHE_MAX_SIZE = int(os.getenv("ANSWER_CACHE_MAX_SIZE", "1000"))
+ANSWER_CACHE_TTL = float(os.getenv("ANSWER_CACHE_TTL", "3600"))
+
+# Respuestas directas de FAQs (sin LLM)
+FAQ_FASTPATH_ENABLED = os.getenv("FAQ_FASTPATH_ENABLED", "true").lower() == "true"
+FAQ_LEXICAL_THRESHOLD = float(os.getenv("FAQ_LEXICAL_THRESHOLD", "0.8"))
+FAQ_EMBEDDING_THRESHOLD = float(os.getenv("FAQ_EMBEDDING_THRESHOLD", "0.92"))
+
+# Respuestas directas de horarios por sucursal (sin LLM)
+SCHEDULE_FASTPATH_ENABLED = os.getenv("SCHEDULE_FASTPATH_ENABLED", "true").lower() == "true"
+
+# Preguntas que dependen de la conversación ("¿y el sábado?", "¿eso aplica en domicilios?"):
+# empiezan con un conector, usan una referencia anafórica o son muy cortas
+FOLLOW_UP_MAX_WORDS = int(os.getenv("FOLLOW_UP_MAX_WORDS", "3"))
+FOLLOW_UP_PATTERN = re.compile(
+    r"^(y|e|pero|entonces|tambien|ademas|o sea)\b"
+    r"|\b(eso|esos|esa|esas|ese|ello|ellos|ellas|ahi|alli|alla|dicho|dicha|mismo|misma|anterior)\b"
+)
+
+
+def looks_like_follow_up(question: str) -> bool:
+    """Heurística barata: la pregunta parece incompleta sin el historial de la conversación."""
+    normalized = normalize_text(question)
+    return len(normalized.split()) <= FOLLOW_UP_MAX_WORDS or bool(FOLLOW_UP_PATTERN.search(normalized))
+
+
+# Una sola caché por proceso, compartida por todas las sesiones
+_answer_cache = SemanticAnswerCache(
+    threshold=ANSWER_CACHE_THRESHOLD,
+    max_size=ANSWER_CACHE_MAX_SIZE,
+    ttl_seconds=ANSWER_CACHE_TTL
+)
+
+def get_answer_cache() -> SemanticAnswerCache:
+    """Devuelve la caché de respuestas compartida del proceso."""
+    return _answer_cache
+
+def vectorstore_fingerprint(path: str = VECTORSTORE_PATH) -> str:
+    """
+    Huella del índice en disco. El manifiesto se escribe al final de cada construcción, así que
+    basta con él: mientras se reescriben FAISS, docstore o BM25 la huella no cambia. Sin manifiesto
+    (índices anteriores) se usan nombre, tamaño y mtime de todos los archivos.
+    """
+    h = hashlib.sha1()
+    folder = Path(path)
+    manifest = folder / MANIFEST_FILE
+    if manifest.exists():
+        st = manifest.stat()
+        h.update(f"{manifest.name}:{st.st_size}:{st.st_mtime_ns}".encode())
+    elif folder.exists():
+        for f in sorted(folder.iterdir()):
+            if f.is_file():
+                st = f.stat()
+                h.update(f"{f.name}:{st.st_size}:{st.st_mtime_ns}".encode())
+    return h.hexdigest()[:12]
+
+def load_vectorstore(path: str = VECTORSTORE_PATH) -> FAISS:
+    """Carga el FAISS vectorstore desde disco con el backend de embeddings configurado (mmap si es posible)."""
     try:
-        api_key = os.getenv("OPENAI_API_KEY")
-        if not api_key:
-            raise ValueError("OPENAI_API_KEY no está definida en .env")
-        embeddings = OpenAIEmbeddings(api_key=SecretStr(api_key))
-        vectorstore = FAISS.load_local(
-            folder_path=VECTORSTORE_PATH,
-            embeddings=embeddings,
-            allow_dangerous_deserialization=True
-        )
-        logger.info(f"Vectorstore cargado desde {VECTORSTORE_PATH}")
+        t0 = time.perf_counter()
+        embeddings = get_embeddings()
+        if has_sqlite_docstore(path):
+            # Índice mapeado en memoria (compartido entre procesos) y docstore SQLite perezoso
+            vectorstore = load_mmap_vectorstore(path, embeddings)
+        else:
+            # Formato anterior: índice completo en RAM y docstore en pickle
+            vectorstore = FAISS.load_local(
+                folder_path=path,
+                embeddings=embeddings,
+                allow_dangerous_deserialization=True
+            )
+        validate_index_manifest(path, embeddings, vectorstore.index.d)
+        manifest_file = Path(path) / MANIFEST_FILE
+        manifest = json.loads(manifest_file.read_text(encoding="utf-8")) if manifest_file.exists() else None
+        apply_manifest_search_params(vectorstore.index, manifest)
+        if QUERY_EMBED_BATCHING:
+            # Las consultas concurrentes de todas las sesiones comparten llamadas a la API de embeddings
+            vectorstore.embedding_function = BatchingEmbeddings(embeddings)
+        logger.info(f"Vectorstore cargado desde {path} ({EMBEDDING_BACKEND}, dim={vectorstore.index.d})")
+        get_collector().observe("load_vectorstore", time.perf_counter() - t0)
         return vectorstore
     except Exception as e:
         logger.error(f"Error al cargar vectorstore: {e}")
@@ -55,41 +141,249 @@ def load_prompt() -> PromptTemplate:
         template=template
     )
 
-def build_rag_chain():
-    """Construye el chain de RAG listo para usarse."""
+class FastPathRAGChain:
+    """
+    Envuelve el chain RAG con rutas rápidas (interfaz `invoke`/`stream`/`astream`):
+    horarios por sucursal, respuesta directa de FAQ y caché semántica de respuestas.
+    El chain completo es el último recurso.
+    """
+
+    def __init__(self, chain, resources, cache: SemanticAnswerCache | None = None, use_faq: bool = True,
+                 schedules: ScheduleIndex | None = None):
+        self.chain = chain
+        self.resources = resources
+        self.cache = cache
+        self.use_faq = use_faq
+        self.schedules = schedules
+
+    def _fast_path(self, question: str, config=None) -> tuple[str | None, str, list[float] | None, str | None]:
+        """
+        Intenta responder sin LLM. Devuelve (respuesta, clave de caché, embedding calculado,
+        versión de la caché consultada).
+        """
+        with span("fast_path"):
+            # Solo las preguntas que parecen de seguimiento consultan la memoria de la sesión
+            follow_up = looks_like_follow_up(question) and self._has_history(config)
+            return self._lookup(question, follow_up=follow_up)
+
+    @staticmethod
+    def _has_history(config) -> bool:
+        session_id = ((config or {}).get("configurable") or {}).get("session_id")
+        if not session_id:
+            return False
+        summary, window = get_memory_store().load(session_id)
+        return bool(summary or window)
+
+    def _lookup(
+        self, question: str, follow_up: bool = False
+    ) -> tuple[str | None, str, list[float] | None, str | None]:
+        # 0) Horarios de sucursal: se responden desde el índice en memoria
+        if self.schedules is not None:
+            answer = self.schedules.answer(question)
+            if answer is not None:
+                logger.info("Respuesta directa de horarios")
+                set_path("schedule")
+                return answer, "", None, None
+
+        # Se toma la versión del índice una sola vez por consulta
+        index = self.resources.index
+        faq_table = index.faq_table if self.use_faq else None
+        def embed():
+            with span("embed"):
+                return index.vectorstore.embeddings.embed_query(question)
+
+        # 1) FAQ idéntica o casi idéntica: sin embedding ni LLM
+        if faq_table is not None:
+            faq = faq_table.match_text(question)
+            if faq is not None:
+                logger.info(f"Respuesta directa de FAQ ({faq['id']})")
+                set_path("faq")
+                add_event("faq_exact_hit")
+                return faq["respuesta"], "", None, None
+
+        # Una pregunta de seguimiento depende de la conversación: la caché y la FAQ por similitud
+        # solo miran la pregunta y son compartidas entre sesiones, así que van al RAG
+        if follow_up:
+            set_path("rag")
+            add_event("answer_cache_skip_history")
+            return None, "", None, None
+
+        # Si BM25 basta para recuperar el contexto no se calcula el embedding:
+        # solo se consulta la caché por coincidencia exacta y se recupera léxicamente.
+        key = normalize_text(question)
+        if index.retriever.lexical_confident(question):
+            embed = None
+
+        # 2) Caché semántica (calcula el embedding solo si no hay coincidencia exacta)
+        embedding = None
+        version = None
+        if self.cache is not None:
+            version = f"{index.version}:{PROMPT_VERSION}:{OPENAI_MODEL}"
+            self.cache.ensure_version(version)
+            answer, embedding = self.cache.lookup(key, embed)
+            if answer is not None:
+                logger.info(f"Respuesta servida desde caché ({self.cache.stats()['hit_rate']:.0%} hit rate)")
+                set_path("cache")
+                add_event("answer_cache_hit")
+                return answer, key, None, version
+            add_event("answer_cache_miss")
+
+        # 3) FAQ similar por embedding
+        if faq_table is not None and embed is not None:
+            if embedding is None:
+                embedding = embed()
+            faq = faq_table.match_embedding(embedding)
+            if faq is not None:
+                logger.info(f"Respuesta de FAQ por similitud ({faq['id']})")
+                set_path("faq")
+                add_event("faq_similar_hit")
+                return faq["respuesta"], key, None, version
+
+        set_path("rag")
+        return None, key, [float(v) for v in embedding] if embedding is not None else None, version
+
+    def _chain_inputs(self, inputs: dict, embedding: list[float] | None) -> dict:
+        # Se reutiliza el embedding de la pregunta para la búsqueda en FAISS
+        return {**inputs, "question_embedding": embedding} if embedding is not None else inputs
+
+    def _store(self, key: str, embedding: list[float] | None, answer: str, version: str | None) -> None:
+        # Sin clave (respuestas que dependen del historial) no se guarda en la caché compartida;
+        # con `version` la caché descarta respuestas generadas antes de una recarga del índice
+        if self.cache is not None and key:
+            self.cache.put(key, embedding, answer, version)
+
+    def invoke(self, inputs: dict, config=None) -> dict:
+        answer, key, embedding, version = self._fast_path(inputs["question"], config)
+        if answer is not None:
+            record_turn(config, inputs["question"], answer)
+            return {"answer": answer}
+        # 4) Chain RAG completo
+        out = self.chain.invoke(self._chain_inputs(inputs, embedding), config=config)
+        self._store(key, embedding, out["answer"], version)
+        return out
+
+    def stream(self, inputs: dict, config=None):
+        """Igual que `invoke`, pero emite la respuesta en fragmentos {"answer": ...} a medida que llegan."""
+        t0 = time.perf_counter()
+        answer, key, embedding, version = self._fast_path(inputs["question"], config)
+        if answer is not None:
+            record_turn(config, inputs["question"], answer)
+            yield {"answer": answer}
+            return
+        parts: list[str] = []
+        ttft = None
+        for chunk in self.chain.stream(self._chain_inputs(inputs, embedding), config=config):
+            piece = chunk.get("answer", "")
+            if piece:
+                if ttft is None:
+                    ttft = time.perf_counter() - t0
+                parts.append(piece)
+                yield {"answer": piece}
+        total = time.perf_counter() - t0
+        logger.info(f"RAG stream: TTFT {ttft * 1000 if ttft else 0:.0f} ms, total {total * 1000:.0f} ms")
+        self._store(key, embedding, "".join(parts), version)
+
+    async def astream(self, inputs: dict, config=None):
+        """Versión asíncrona de `stream`; la ruta rápida se ejecuta en un hilo para no bloquear el event loop."""
+        t0 = time.perf_counter()
+        answer, key, embedding, version = await asyncio.to_thread(self._fast_path, inputs["question"], config)
+        if answer is not None:
+            await asyncio.to_thread(record_turn, config, inputs["question"], answer)
+            yield {"answer": answer}
+            return
+        parts: list[str] = []
+        ttft = None
+        async for chunk in self.chain.astream(self._chain_inputs(inputs, embedding), config=config):
+            piece = chunk.get("answer", "")
+            if piece:
+                if ttft is None:
+                    ttft = time.perf_counter() - t0
+                parts.append(piece)
+                yield {"answer": piece}
+        total = time.perf_counter() - t0
+        logger.info(f"RAG astream: TTFT {ttft * 1000 if ttft else 0:.0f} ms, total {total * 1000:.0f} ms")
+        self._store(key, embedding, "".join(parts), version)
+
+def build_rag_chain(resources=None, use_cache: bool | None = None, use_faq: bool | None = None,
+                    use_schedules: bool | None = None):
+    """Construye el chain de RAG sobre los recursos compartidos del proceso (índice, prompt y LLM)."""
     try:
-        # a) Vectorstore
-        vectordb = load_vectorstore()
-        retriever = vectordb.as_retriever(search_kwargs={"k": 5})
+        if resources is None:
+            from src.chat.resources import get_resources
+            resources = get_resources()
+
+        # a) Recuperación híbrida sobre la versión vigente del índice (se intercambia al recargar)
+        def retrieve(x: dict):
+            with span("retrieve"):
+                return resources.index.retriever.retrieve(x["question"], x.get("question_embedding"))
 
         # b) Prompt
-        prompt = load_prompt()
+        prompt = resources.rag_prompt
 
         # c) LLM
-        llm = ChatOpenAI(
-            model=OPENAI_MODEL,
-            temperature=OPENAI_TEMPERATURE
-        )
+        llm = resources.llm
+
+        # d) Formatear contexto desde documentos recuperados: agrupados por sección,
+        #    sin casi duplicados y dentro del presupuesto de tokens
+        packer = ContextPacker() if CONTEXT_PACKER_ENABLED else None
 
-        # d) Formatear contexto desde documentos recuperados
         def format_docs(docs):
-            return "\n\n".join(doc.page_content for doc in docs)
+            with span("format_context"):
+                if packer is not None:
+                    return packer.pack(docs)
+                return "\n\n".join(doc.page_content for doc in docs)
+
+        # Tokens del prompt (solo en mensajes muestreados); marca el inicio de la llamada al LLM
+        def count_prompt(prompt_value):
+            trace = current_trace()
+            if trace is not None:
+                add_tokens("prompt", count_tokens(prompt_value.to_string()))
+                trace.marks["llm_start"] = time.perf_counter()
+            return prompt_value
+
+        # Envolver la salida en un diccionario con clave 'answer'. Como generador, los tokens
+        # fluyen con stream/astream y los fragmentos AddableDict se concatenan para el historial.
+        # Se mide el LLM desde que se renderizó el prompt: primer token, total y tokens de la respuesta.
+        def to_answer(chunks):
+            trace = current_trace()
+            parts = []
+            for chunk in chunks:
+                if trace is not None and not parts:
+                    trace.add_stage("llm_first_token", time.perf_counter() - trace.marks.get("llm_start", time.perf_counter()))
+                parts.append(chunk.content)
+                yield AddableDict(answer=chunk.content)
+            if trace is not None:
+                trace.add_stage("llm", time.perf_counter() - trace.marks.get("llm_start", time.perf_counter()))
+                add_tokens("completion", count_tokens("".join(parts)))
+
+        async def ato_answer(chunks):
+            trace = current_trace()
+            parts = []
+            async for chunk in chunks:
+                if trace is not None and not parts:
+                    trace.add_stage("llm_first_token", time.perf_counter() - trace.marks.get("llm_start", time.perf_counter()))
+                parts.append(chunk.content)
+                yield AddableDict(answer=chunk.content)
+            if trace is not None:
+                trace.add_stage("llm", time.perf_counter() - trace.marks.get("llm_start", time.perf_counter()))
+                add_tokens("completion", count_tokens("".join(parts)))
 
         # e) Pipeline RAG
         rag_chain = RunnableSequence(
             {
                 "question": RunnablePassthrough() | (lambda x: x["question"]),
-                "context": (lambda x: x["question"]) | retriever | format_docs,
-                "chat_history": lambda x: x.get("chat_history", [])
+                "context": RunnableLambda(retrieve) | format_docs,
+                "chat_history": lambda x: format_history(x.get("chat_history", []))
             },
             prompt,
+            RunnableLambda(count_prompt),
             llm,
-            lambda x: {"answer": x.content}  # Envolver la salida en un diccionario con clave 'answer'
+            RunnableGenerator(to_answer, ato_answer)
         )
 
-        # f) Memoria conversacional
-        def get_session_history(session_id: str) -> ChatMessageHistory:
-            return ChatMessageHistory()
+        # f) Memoria conversacional por sesión, acotada por tokens (ventana + resumen)
+        def get_session_history(session_id: str) -> BoundedChatHistory:
+            return get_memory_store().get_history(session_id)
 
         # g) Chain con historial
         chain = RunnableWithMessageHistory(
@@ -101,7 +395,21 @@ def build_rag_chain():
         )
 
         logger.info("RAG chain construido correctamente")
-        return chain
+
+        # h) Rutas rápidas: horarios, FAQs precalculadas y caché semántica de respuestas
+        if use_cache is None:
+            use_cache = ANSWER_CACHE_ENABLED
+        if use_faq is None:
+            use_faq = FAQ_FASTPATH_ENABLED
+        if use_schedules is None:
+            use_schedules = SCHEDULE_FASTPATH_ENABLED
+        return FastPathRAGChain(
+            chain,
+            resources,
+            cache=_answer_cache if use_cache else None,
+            use_faq=use_faq,
+            schedules=get_schedule_index() if use_schedules else None
+        )
 
     except Exception as e:
         logger.error(f"Error al construir RAG chain: {e}")
@@ -0,0 +1,217 @@
+import json
+import os
+import threading
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Callable, Optional
+import logging
+
+from langchain_community.vectorstores import FAISS
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_openai import ChatOpenAI
+
+from src.chat.faq_answers import FAQAnswerTable
+from src.chat.hybrid_retriever import HybridRetriever
+from src.chat.intent_router import IntentRouter
+from src.embeddings.chunk import PARENT_CHUNKS_FILE
+from src.embeddings.lexical_index import BM25Index, LEXICAL_INDEX_FILE
+from src.embeddings.query_batcher import BatchingEmbeddings
+from src.utils.stubs import StubChatModel
+from src.chat.rag_pipeline import (
+    VECTORSTORE_PATH,
+    OPENAI_MODEL,
+    OPENAI_TEMPERATURE,
+    OPENAI_STREAMING,
+    LLM_BACKEND,
+    FAQ_LEXICAL_THRESHOLD,
+    FAQ_EMBEDDING_THRESHOLD,
+    RETRIEVER_K,
+    build_rag_chain,
+    load_vectorstore,
+    load_prompt,
+    vectorstore_fingerprint
+)
+
+logger = logging.getLogger(__name__)
+
+# Cada cuántos segundos se revisa si hay una nueva versión del índice (0 = desactivado)
+VECTORSTORE_WATCH_INTERVAL = float(os.getenv("VECTORSTORE_WATCH_INTERVAL", "30"))
+
+
+@dataclass(frozen=True)
+class IndexSnapshot:
+    """Versión inmutable del índice cargado; se reemplaza completa al recargar."""
+    vectorstore: FAISS
+    faq_table: Optional[FAQAnswerTable]
+    retriever: HybridRetriever
+    version: str
+    loaded_at: float
+
+
+def close_snapshot(snapshot: IndexSnapshot) -> None:
+    """Libera los hilos de una versión reemplazada; sus consultas en curso siguen funcionando."""
+    embeddings = snapshot.vectorstore.embeddings
+    if isinstance(embeddings, BatchingEmbeddings):
+        embeddings.close()
+
+
+class RAGResources:
+    """
+    Registro de recursos del RAG compartido por todas las sesiones del proceso:
+    índice (vectorstore + tabla de FAQs), cliente LLM, prompts y el chain construido sobre ellos.
+
+    El índice se intercambia de forma atómica: cada consulta toma la referencia a `index`
+    una sola vez, así que las consultas en curso terminan con la versión anterior.
+    """
+
+    def __init__(self, path: str = VECTORSTORE_PATH, llm: Optional[BaseChatModel] = None):
+        self.path = path
+        self._lock = threading.RLock()
+        self._index: Optional[IndexSnapshot] = None
+        self._llm: Optional[BaseChatModel] = llm
+        self._prompts: dict[str, Any] = {}
+        self._rag_chain = None
+        self._router: Optional[IntentRouter] = None
+        self._started = False
+        self._stop = threading.Event()
+
+    def _load_index(self) -> IndexSnapshot:
+        version = vectorstore_fingerprint(self.path)
+        vectorstore = load_vectorstore(self.path)
+        faq_table = FAQAnswerTable.load(
+            self.path,
+            lexical_threshold=FAQ_LEXICAL_THRESHOLD,
+            embedding_threshold=FAQ_EMBEDDING_THRESHOLD
+        )
+        lexical_file = Path(self.path) / LEXICAL_INDEX_FILE
+        lexical = BM25Index.load(lexical_file) if lexical_file.exists() else None
+        parents_file = Path(self.path) / PARENT_CHUNKS_FILE
+        parents = json.loads(parents_file.read_text(encoding="utf-8")) if parents_file.exists() else None
+        retriever = HybridRetriever(vectorstore, lexical, k=RETRIEVER_K, parents=parents)
+        return IndexSnapshot(vectorstore, faq_table, retriever, version, time.time())
+
+    @property
+    def index(self) -> IndexSnapshot:
+        snapshot = self._index
+        if snapshot is None:
+            with self._lock:
+                if self._index is None:
+                    self._index = self._load_index()
+                snapshot = self._index
+        return snapshot
+
+    @property
+    def llm(self) -> BaseChatModel:
+        if self._llm is None:
+            with self._lock:
+                if self._llm is None and LLM_BACKEND == "stub":
+                    self._llm = StubChatModel()
+                elif self._llm is None:
+                    self._llm = ChatOpenAI(
+                        model=OPENAI_MODEL,
+                        temperature=OPENAI_TEMPERATURE,
+                        streaming=OPENAI_STREAMING
+                    )
+        return self._llm
+
+    def prompt(self, name: str, loader: Callable[[], Any]) -> Any:
+        """Devuelve el prompt `name`, cargándolo con `loader` la primera vez."""
+        if name not in self._prompts:
+            with self._lock:
+                if name not in self._prompts:
+                    self._prompts[name] = loader()
+        return self._prompts[name]
+
+    @property
+    def rag_prompt(self):
+        return self.prompt("rag", load_prompt)
+
+    @property
+    def rag_chain(self):
+        """Chain RAG compartido; el historial sigue separado por session_id."""
+        if self._rag_chain is None:
+            with self._lock:
+                if self._rag_chain is None:
+                    self._rag_chain = build_rag_chain(resources=self)
+        return self._rag_chain
+
+    @property
+    def router(self) -> IntentRouter:
+        """Router de intenciones que decide si un mensaje necesita el RAG completo."""
+        if self._router is None:
+            with self._lock:
+                if self._router is None:
+                    self._router = IntentRouter(self)
+        return self._router
+
+    def warm_up(self) -> None:
+        """Carga índice, LLM, prompt, chain y router antes de atender la primera consulta."""
+        t0 = time.perf_counter()
+        _ = self.index, self.llm, self.rag_prompt, self.rag_chain, self.router
+        logger.info(f"Recursos RAG listos en {time.perf_counter() - t0:.2f}s (índice {self.index.version})")
+
+    def reload_if_changed(self) -> bool:
+        """Carga el índice en disco si su versión cambió; devuelve True si se reemplazó."""
+        current = self._index
+        version = vectorstore_fingerprint(self.path)
+        if current is not None and version == current.version:
+            return False
+        with self._lock:
+            try:
+                snapshot = self._load_index()
+            except Exception as e:
+                logger.error(f"No se pudo recargar el índice, se mantiene la versión actual: {e}")
+                return False
+            self._index = snapshot
+        logger.info(f"Índice recargado: {current.version if current else None} -> {snapshot.version}")
+        if current is not None:
+            close_snapshot(current)
+        return True
+
+    def _watch(self, interval: float) -> None:
+        pending = None
+        while not self._stop.wait(interval):
+            version = vectorstore_fingerprint(self.path)
+            if self._index is None or version == self._index.version:
+                pending = None
+                continue
+            # Solo se recarga cuando la versión en disco es estable entre dos revisiones,
+            # para no leer un índice a medio escribir.
+            if version == pending:
+                self.reload_if_changed()
+                pending = None
+            else:
+                pending = version
+
+    def start(self, watch_interval: float = VECTORSTORE_WATCH_INTERVAL) -> "RAGResources":
+        """Precalienta los recursos y arranca (una sola vez) el vigilante del índice."""
+        with self._lock:
+            if self._started:
+                return self
+            self.warm_up()
+            if watch_interval > 0:
+                threading.Thread(
+                    target=self._watch, args=(watch_interval,), name="vectorstore-watcher", daemon=True
+                ).start()
+            self._started = True
+        return self
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._index is not None:
+            close_snapshot(self._index)
+
+
+_resources: Optional[RAGResources] = None
+_resources_lock = threading.Lock()
+
+
+def get_resources() -> RAGResources:
+    """Devuelve el registro de recursos del proceso."""
+    global _resources
+    if _resources is None:
+        with _resources_lock:
+            if _resources is None:
+                _resources = RAGResources()
+    return _resources
@@ -0,0 +1,273 @@
+import difflib
+import json
+import os
+import re
+import threading
+import time
+from dataclasses import dataclass
+from datetime import datetime
+from pathlib import Path
+from typing import Optional
+import logging
+
+import numpy as np
+
+from src.utils.text import normalize_text
+
+logger = logging.getLogger(__name__)
+
+# Parámetros de entorno
+SCHEDULES_PATH = Path(os.getenv("SCHEDULES_PATH", "data/processed/cleaned_horarios.json"))
+STORE_TIMEZONE = os.getenv("STORE_TIMEZONE", "America/Bogota")
+SCHEDULE_RELOAD_CHECK_SECONDS = float(os.getenv("SCHEDULE_RELOAD_CHECK_SECONDS", "2"))
+
+# Mismo orden que datetime.weekday()
+DAYS = ["lunes", "martes", "miercoles", "jueves", "viernes", "sabado", "domingo"]
+DAY_LABELS = ["lunes", "martes", "miércoles", "jueves", "viernes", "sábado", "domingo"]
+TIME_PATTERN = re.compile(r"(\d{1,2}):(\d{2})\s*([ap])\.?\s*m\.?")
+OPEN_NOW_PATTERN = re.compile(r"\b(abiert[oa]s?|atendiendo)\b.*\b(ahora|ya|este momento|en este instante)\b"
+                              r"|\b(ahora|ya)\b.*\babiert[oa]s?\b")
+# Palabras de horario: sin ellas (o un día de la semana) el mensaje no es una consulta de horarios,
+# aunque nombre una sucursal ("¿hay parqueadero en la sucursal El Lago?" va al RAG)
+SCHEDULE_HINT_PATTERN = re.compile(r"\b(horarios?|hora|abren?|abiert[oa]s?|cierran?|cerrad[oa]s?|atienden?)\b")
+WEEKDAY_PATTERN = re.compile(r"\b(" + "|".join(DAYS) + r")s?\b")
+CLOSED = -1
+
+
+def parse_minutes(text: str) -> int:
+    """'7:30 p.m.' -> minutos desde medianoche."""
+    m = TIME_PATTERN.search(text)
+    if not m:
+        raise ValueError(f"Hora no reconocida: {text}")
+    hours, minutes, ampm = int(m.group(1)), int(m.group(2)), m.group(3)
+    hours = hours % 12 + (12 if ampm == "p" else 0)
+    return hours * 60 + minutes
+
+
+def format_minutes(minutes: int) -> str:
+    hours, mins = divmod(minutes, 60)
+    suffix = "a.m." if hours < 12 else "p.m."
+    return f"{(hours % 12) or 12}:{mins:02d} {suffix}"
+
+
+@dataclass(frozen=True)
+class Branch:
+    name: str
+    key: str
+    direccion: str
+
+
+def _now() -> datetime:
+    try:
+        from zoneinfo import ZoneInfo
+        return datetime.now(ZoneInfo(STORE_TIMEZONE))
+    except Exception:
+        return datetime.now()
+
+
+@dataclass(frozen=True)
+class ScheduleTables:
+    """
+    Tablas de una versión de `cleaned_horarios.json`. Se publican juntas en una sola asignación:
+    una consulta toma la referencia una vez y nunca mezcla índices nuevos con matrices anteriores.
+    """
+    branches: tuple[Branch, ...]
+    # Claves más largas primero: "portal sur" debe ganar sobre "sur"
+    by_key: dict[str, int]
+    # Nombres como segunda secuencia de SequenceMatcher: se preprocesan una sola vez
+    matchers: tuple[tuple[difflib.SequenceMatcher, int], ...]
+    # Matrices (n_sucursales, 7): minuto de apertura/cierre, CLOSED si no abre
+    opens: np.ndarray
+    closes: np.ndarray
+
+
+EMPTY_TABLES = ScheduleTables((), {}, (), np.zeros((0, 7), dtype=np.int32), np.zeros((0, 7), dtype=np.int32))
+
+
+class ScheduleIndex:
+    """
+    Índice en memoria de horarios: sucursal -> día -> (apertura, cierre) en minutos.
+    Responde consultas de horario sin LLM y se recarga cuando cambia `cleaned_horarios.json`.
+    """
+
+    def __init__(self, path: Path = SCHEDULES_PATH):
+        self.path = Path(path)
+        self._lock = threading.Lock()
+        # Los SequenceMatcher guardan la secuencia comparada: la búsqueda aproximada es de a una
+        self._match_lock = threading.Lock()
+        self._mtime: Optional[float] = None
+        self._next_check = 0.0
+        self._tables = EMPTY_TABLES
+        self._load()
+
+    @property
+    def branches(self) -> tuple[Branch, ...]:
+        return self._tables.branches
+
+    def _load(self) -> None:
+        data = json.loads(self.path.read_text(encoding="utf-8"))
+        branches, opens, closes = [], [], []
+        for entry in data:
+            name = entry.get("sucursal", "").strip()
+            key = normalize_text(name).removeprefix("sucursal ").strip()
+            row_open, row_close = [], []
+            for day in DAYS:
+                h = entry.get("horario", {}).get(day)
+                if h:
+                    start, end = h.split(" - ")
+                    row_open.append(parse_minutes(start))
+                    row_close.append(parse_minutes(end))
+                else:
+                    row_open.append(CLOSED)
+                    row_close.append(CLOSED)
+            branches.append(Branch(name=name, key=key, direccion=entry.get("direccion", "")))
+            opens.append(row_open)
+            closes.append(row_close)
+        by_key = {b.key: i for i, b in sorted(enumerate(branches), key=lambda x: -len(x[1].key))}
+        self._tables = ScheduleTables(
+            branches=tuple(branches),
+            by_key=by_key,
+            matchers=tuple((difflib.SequenceMatcher(None, "", key), idx) for key, idx in by_key.items()),
+            opens=np.asarray(opens, dtype=np.int32).reshape(-1, 7),
+            closes=np.asarray(closes, dtype=np.int32).reshape(-1, 7)
+        )
+        self._mtime = self.path.stat().st_mtime
+        logger.info(f"Índice de horarios cargado: {len(branches)} sucursales")
+
+    def _maybe_reload(self) -> ScheduleTables:
+        """Recarga si cambió el archivo y devuelve las tablas vigentes (una sola lectura por consulta)."""
+        now = time.monotonic()
+        if now >= self._next_check:
+            with self._lock:
+                self._next_check = now + SCHEDULE_RELOAD_CHECK_SECONDS
+                try:
+                    if self.path.stat().st_mtime != self._mtime:
+                        self._load()
+                except Exception as e:
+                    logger.error(f"No se pudo recargar {self.path}, se mantienen los horarios actuales: {e}")
+        return self._tables
+
+    @staticmethod
+    def is_schedule_question(text: str) -> bool:
+        """Si el mensaje pregunta por horarios: palabra de horario, día de la semana o "abierto ahora"."""
+        normalized = normalize_text(text)
+        return bool(SCHEDULE_HINT_PATTERN.search(normalized) or WEEKDAY_PATTERN.search(normalized)
+                    or OPEN_NOW_PATTERN.search(normalized))
+
+    def match_branch(self, text: str, tables: Optional[ScheduleTables] = None) -> Optional[Branch]:
+        """Sucursal mencionada en el texto (coincidencia exacta o aproximada del nombre)."""
+        t = tables or self._maybe_reload()
+        normalized = f" {normalize_text(text)} "
+        for key, idx in t.by_key.items():
+            if f" {key} " in normalized:
+                return t.branches[idx]
+        if not SCHEDULE_HINT_PATTERN.search(normalized):
+            return None
+        # Aproximada: n-gramas de palabras del texto contra los nombres (errores de tipeo)
+        words = normalized.split()
+        candidates = {" ".join(words[i:i + n]) for n in (1, 2, 3) for i in range(len(words) - n + 1)}
+        best, best_score = None, 0.0
+        with self._match_lock:
+            for matcher, idx in t.matchers:
+                for cand in candidates:
+                    matcher.set_seq1(cand)
+                    # real_quick_ratio y quick_ratio son cotas superiores baratas de ratio
+                    floor = max(best_score, 0.85)
+                    if matcher.real_quick_ratio() < floor or matcher.quick_ratio() < floor:
+                        continue
+                    score = matcher.ratio()
+                    if score > best_score:
+                        best, best_score = idx, score
+        return t.branches[best] if best is not None and best_score >= 0.85 else None
+
+    @staticmethod
+    def match_day(text: str, now: Optional[datetime] = None) -> Optional[int]:
+        normalized = f" {normalize_text(text)} "
+        if " hoy " in normalized:
+            return (now or _now()).weekday()
+        if " manana " in normalized and " la manana " not in normalized:
+            return ((now or _now()).weekday() + 1) % 7
+        for idx, day in enumerate(DAYS):
+            if f" {day} " in normalized or f" {day}s " in normalized:
+                return idx
+        return None
+
+    def hours(self, branch: Branch, day: int, tables: Optional[ScheduleTables] = None) -> Optional[tuple[int, int]]:
+        t = tables or self._tables
+        idx = t.by_key[branch.key]
+        if t.opens[idx, day] == CLOSED:
+            return None
+        return int(t.opens[idx, day]), int(t.closes[idx, day])
+
+    def open_now(self, when: Optional[datetime] = None, tables: Optional[ScheduleTables] = None) -> list[Branch]:
+        """Sucursales abiertas en `when` (por defecto, ahora en STORE_TIMEZONE)."""
+        t = tables or self._maybe_reload()
+        when = when or _now()
+        day, minute = when.weekday(), when.hour * 60 + when.minute
+        opens, closes = t.opens[:, day], t.closes[:, day]
+        is_open = (opens != CLOSED) & (opens <= minute) & (minute < closes)
+        return [t.branches[i] for i in np.flatnonzero(is_open)]
+
+    def weekly_schedule(self, branch: Branch, tables: Optional[ScheduleTables] = None) -> str:
+        """Horario semanal agrupando días consecutivos con el mismo horario."""
+        t = tables or self._tables
+        parts = []
+        start = 0
+        for day in range(1, 8):
+            if day == 7 or self.hours(branch, day, t) != self.hours(branch, start, t):
+                h = self.hours(branch, start, t)
+                if day - 1 == start:
+                    days = DAY_LABELS[start]
+                else:
+                    sep = " y " if day - 1 == start + 1 else " a "
+                    days = f"{DAY_LABELS[start]}{sep}{DAY_LABELS[day - 1]}"
+                parts.append(f"{days}: {f'{format_minutes(h[0])} - {format_minutes(h[1])}' if h else 'cerrado'}")
+                start = day
+        return "; ".join(parts)
+
+    def answer(self, question: str, now: Optional[datetime] = None) -> Optional[str]:
+        """Respuesta directa a una pregunta de horarios, o None si no es una consulta que sepa resolver."""
+        if not self.is_schedule_question(question):
+            return None
+        # Todas las lecturas de la consulta usan la misma versión de las tablas
+        t = self._maybe_reload()
+        now = now or _now()
+        normalized = normalize_text(question)
+        branch = self.match_branch(question, t)
+
+        if branch is None:
+            if OPEN_NOW_PATTERN.search(normalized):
+                abiertas = self.open_now(now, t)
+                if not abiertas:
+                    return "En este momento no hay sucursales abiertas."
+                return "En este momento están abiertas: " + ", ".join(b.name for b in abiertas) + "."
+            return None
+
+        day = self.match_day(question, now)
+        if day is None:
+            if OPEN_NOW_PATTERN.search(normalized):
+                h = self.hours(branch, now.weekday(), t)
+                minute = now.hour * 60 + now.minute
+                if h and h[0] <= minute < h[1]:
+                    return f"Sí, la {branch.name} está abierta ahora; hoy cierra a las {format_minutes(h[1])}"
+                return f"La {branch.name} está cerrada en este momento. Su horario es: {self.weekly_schedule(branch, t)}"
+            return f"El horario de la {branch.name} ({branch.direccion}) es: {self.weekly_schedule(branch, t)}"
+
+        h = self.hours(branch, day, t)
+        if h is None:
+            return f"La {branch.name} no abre el {DAY_LABELS[day]}."
+        return (
+            f"El {DAY_LABELS[day]} la {branch.name} abre a las {format_minutes(h[0])} "
+            f"y cierra a las {format_minutes(h[1])}"
+        )
+
+
+_schedule_index: Optional[ScheduleIndex] = None
+
+
+def get_schedule_index() -> Optional[ScheduleIndex]:
+    """Índice de horarios compartido del proceso (None si no existe el JSON)."""
+    global _schedule_index
+    if _schedule_index is None and SCHEDULES_PATH.exists():
+        _schedule_index = ScheduleIndex(SCHEDULES_PATH)
+    return _schedule_index
@@ -0,0 +1,167 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Optional
+import logging
+
+from src.chat.conversation import SessionState
+
+logger = logging.getLogger(__name__)
+
+# Parámetros de entorno
+SESSION_BACKEND = os.getenv("SESSION_BACKEND", "sqlite")  # sqlite | memory
+SESSION_DB_PATH = Path(os.getenv("SESSION_DB_PATH", "data/processed/chat_sessions.sqlite"))
+SESSION_TTL_SECONDS = float(os.getenv("SESSION_TTL_SECONDS", str(24 * 3600)))
+SESSION_EVICT_INTERVAL = float(os.getenv("SESSION_EVICT_INTERVAL", "600"))
+
+
+class SessionConflictError(Exception):
+    """Otra petición guardó la sesión primero (dos mensajes simultáneos de la misma sesión)."""
+
+
+class SessionStore:
+    """
+    Estado de las conversaciones por session_id, serializado como JSON.
+    Cada guardado compara la versión leída (bloqueo optimista), así varios procesos pueden
+    atender la misma sesión sin pisarse. Esta implementación vive en memoria del proceso;
+    `SQLiteSessionStore` la comparte entre procesos.
+    """
+
+    def __init__(self, ttl_seconds: float = SESSION_TTL_SECONDS, evict_interval: float = SESSION_EVICT_INTERVAL):
+        self.ttl_seconds = ttl_seconds
+        self.evict_interval = evict_interval
+        self._lock = threading.RLock()
+        self._sessions: dict[str, tuple[str, int, float]] = {}
+        self._next_evict = time.time() + evict_interval
+
+    # Persistencia: las subclases reemplazan estos tres métodos
+    def _read(self, session_id: str) -> Optional[tuple[str, int]]:
+        entry = self._sessions.get(session_id)
+        return (entry[0], entry[1]) if entry is not None else None
+
+    def _write(self, session_id: str, data: str, expected_version: int) -> bool:
+        entry = self._sessions.get(session_id)
+        if (entry[1] if entry is not None else 0) != expected_version:
+            return False
+        self._sessions[session_id] = (data, expected_version + 1, time.time())
+        return True
+
+    def _delete(self, session_id: Optional[str] = None, older_than: Optional[float] = None) -> int:
+        if session_id is not None:
+            return 1 if self._sessions.pop(session_id, None) is not None else 0
+        expired = [sid for sid, (_, _, updated) in self._sessions.items() if updated < older_than]
+        for sid in expired:
+            del self._sessions[sid]
+        return len(expired)
+
+    def load(self, session_id: str) -> Optional[SessionState]:
+        with self._lock:
+            entry = self._read(session_id)
+        if entry is None:
+            return None
+        state = SessionState.from_dict(json.loads(entry[0]))
+        state.version = entry[1]
+        return state
+
+    def save(self, state: SessionState) -> None:
+        """Guarda el estado si nadie lo cambió desde que se leyó; si no, SessionConflictError."""
+        data = json.dumps(state.to_dict(), ensure_ascii=False)
+        with self._lock:
+            if not self._write(state.session_id, data, state.version):
+                raise SessionConflictError(f"La sesión {state.session_id} cambió mientras se atendía el mensaje")
+        state.version += 1
+        self._maybe_evict()
+
+    def delete(self, session_id: str) -> bool:
+        with self._lock:
+            return self._delete(session_id=session_id) > 0
+
+    def evict_expired(self) -> int:
+        """Elimina las sesiones sin actividad durante más de `ttl_seconds`."""
+        with self._lock:
+            removed = self._delete(older_than=time.time() - self.ttl_seconds)
+        if removed:
+            logger.info(f"Sesiones de chat: {removed} sesiones expiradas eliminadas")
+        return removed
+
+    def _maybe_evict(self) -> None:
+        now = time.time()
+        if now >= self._next_evict:
+            self._next_evict = now + self.evict_interval
+            self.evict_expired()
+
+
+class SQLiteSessionStore(SessionStore):
+    """Mismo contrato que `SessionStore`, en un archivo SQLite compartido por los workers."""
+
+    def __init__(self, path: str | Path = SESSION_DB_PATH, **kwargs):
+        super().__init__(**kwargs)
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False, timeout=30)
+        self._conn.executescript(
+            """
+            PRAGMA journal_mode=WAL;
+            PRAGMA synchronous=NORMAL;
+            CREATE TABLE IF NOT EXISTS chat_sessions (
+                session_id TEXT PRIMARY KEY,
+                data TEXT NOT NULL,
+                version INTEGER NOT NULL,
+                updated_at REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_chat_sessions_updated ON chat_sessions (updated_at);
+            """
+        )
+        self._conn.commit()
+
+    def _read(self, session_id: str) -> Optional[tuple[str, int]]:
+        return self._conn.execute(
+            "SELECT data, version FROM chat_sessions WHERE session_id = ?", (session_id,)
+        ).fetchone()
+
+    def _write(self, session_id: str, data: str, expected_version: int) -> bool:
+        with self._conn:
+            if expected_version == 0:
+                cur = self._conn.execute(
+                    "INSERT OR IGNORE INTO chat_sessions VALUES (?, ?, 1, ?)", (session_id, data, time.time())
+                )
+            else:
+                cur = self._conn.execute(
+                    "UPDATE chat_sessions SET data = ?, version = version + 1, updated_at = ? "
+                    "WHERE session_id = ? AND version = ?",
+                    (data, time.time(), session_id, expected_version)
+                )
+        return cur.rowcount == 1
+
+    def _delete(self, session_id: Optional[str] = None, older_than: Optional[float] = None) -> int:
+        with self._conn:
+            if session_id is not None:
+                cur = self._conn.execute("DELETE FROM chat_sessions WHERE session_id = ?", (session_id,))
+            else:
+                cur = self._conn.execute("DELETE FROM chat_sessions WHERE updated_at < ?", (older_than,))
+        return cur.rowcount
+
+    def close(self) -> None:
+        self._conn.close()
+
+
+_session_store: Optional[SessionStore] = None
+_session_lock = threading.Lock()
+
+
+def get_session_store() -> SessionStore:
+    """Almacén de sesiones compartido del proceso (SESSION_BACKEND)."""
+    global _session_store
+    if _session_store is None:
+        with _session_lock:
+            if _session_store is None:
+                if SESSION_BACKEND == "sqlite":
+                    _session_store = SQLiteSessionStore(SESSION_DB_PATH)
+                elif SESSION_BACKEND == "memory":
+                    _session_store = SessionStore()
+                else:
+                    raise ValueError(f"SESSION_BACKEND desconocido: {SESSION_BACKEND} (usa 'sqlite' o 'memory')")
+    return _session_store
@@ -0,0 +1,109 @@
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Optional
+import os
+
+from sqlalchemy import event, select
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.pool import StaticPool
+
+from src.db.database import (
+    DATABASE_URL, DB_MAX_OVERFLOW, DB_POOL_RECYCLE, DB_POOL_SIZE, DB_POOL_TIMEOUT, SQLITE_BUSY_TIMEOUT_MS,
+    Base, Cliente, ClienteInfo, customer_cache, set_sqlite_pragmas
+)
+from src.utils.tracing import add_event, span
+
+# Drivers asíncronos para cada driver síncrono de DATABASE_URL
+ASYNC_DRIVERS = {
+    "sqlite": "sqlite+aiosqlite",
+    "postgresql": "postgresql+asyncpg",
+    "postgresql+psycopg2": "postgresql+asyncpg"
+}
+
+
+def to_async_url(url: str) -> str:
+    """sqlite:///./data/clientes.db -> sqlite+aiosqlite:///./data/clientes.db (las URLs ya asíncronas no cambian)."""
+    scheme, sep, rest = url.partition("://")
+    return f"{ASYNC_DRIVERS.get(scheme, scheme)}{sep}{rest}"
+
+
+# Por defecto la misma base que el motor síncrono
+ASYNC_DATABASE_URL = os.getenv("ASYNC_DATABASE_URL") or to_async_url(DATABASE_URL)
+
+
+def make_async_engine(url: str = ASYNC_DATABASE_URL) -> AsyncEngine:
+    """Motor asíncrono con el mismo pool y los mismos PRAGMA de SQLite que `make_engine`."""
+    if not url.startswith("sqlite"):
+        return create_async_engine(
+            url, echo=False, pool_size=DB_POOL_SIZE, max_overflow=DB_MAX_OVERFLOW,
+            pool_timeout=DB_POOL_TIMEOUT, pool_recycle=DB_POOL_RECYCLE, pool_pre_ping=True
+        )
+
+    connect_args = {"timeout": SQLITE_BUSY_TIMEOUT_MS / 1000}
+    if url.endswith("://") or url.endswith(":memory:"):
+        sqlite_engine = create_async_engine(url, echo=False, connect_args=connect_args, poolclass=StaticPool)
+    else:
+        sqlite_engine = create_async_engine(
+            url, echo=False, connect_args=connect_args,
+            pool_size=DB_POOL_SIZE, max_overflow=DB_MAX_OVERFLOW, pool_timeout=DB_POOL_TIMEOUT
+        )
+    event.listen(sqlite_engine.sync_engine, "connect", set_sqlite_pragmas)
+    return sqlite_engine
+
+
+# Las conexiones quedan ligadas al event loop que las abre: un motor por loop
+async_engine = make_async_engine(ASYNC_DATABASE_URL)
+AsyncSessionLocal = async_sessionmaker(async_engine, expire_on_commit=False, autoflush=False)
+
+
+async def init_db_async(engine: AsyncEngine = async_engine) -> None:
+    """Crea las tablas en la base de datos."""
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+
+@asynccontextmanager
+async def async_session_scope(factory: async_sessionmaker = AsyncSessionLocal) -> AsyncIterator[AsyncSession]:
+    """Sesión asíncrona tomada del pool solo mientras se usa; se revierte si hay un error."""
+    async with factory() as db:
+        try:
+            yield db
+        except Exception:
+            await db.rollback()
+            raise
+
+async def aget_cliente_por_identificacion(db: AsyncSession, identificacion: str) -> Optional[Cliente]:
+    return await db.scalar(select(Cliente).where(Cliente.identificacion == identificacion).limit(1))
+
+async def alookup_cliente(identificacion: str, db: Optional[AsyncSession] = None,
+                          trust_cached_miss: bool = True) -> Optional[ClienteInfo]:
+    """Versión asíncrona de `lookup_cliente`; comparte la caché con el camino síncrono."""
+    cached, cliente = customer_cache.get(identificacion)
+    if cached and (cliente is not None or trust_cached_miss):
+        add_event("customer_cache_hit")
+        return cliente
+    add_event("customer_cache_miss")
+    with span("db_query"):
+        if db is not None:
+            found = await aget_cliente_por_identificacion(db, identificacion)
+            cliente = ClienteInfo.from_model(found) if found else None
+        else:
+            async with async_session_scope() as session:
+                found = await aget_cliente_por_identificacion(session, identificacion)
+                cliente = ClienteInfo.from_model(found) if found else None
+    customer_cache.put(identificacion, cliente)
+    return cliente
+
+async def acreate_cliente(db: AsyncSession, identificacion: str, nombre: str, telefono: str, email: str) -> Cliente:
+    cliente = Cliente(
+        identificacion=identificacion,
+        nombre=nombre,
+        telefono=telefono,
+        email=email
+    )
+    db.add(cliente)
+    try:
+        await db.commit()
+    finally:
+        # Igual que create_cliente: el "no encontrado" en caché se descarta aunque el commit falle
+        customer_cache.invalidate(identificacion)
+    customer_cache.put(identificacion, ClienteInfo.from_model(cliente))
+    return cliente
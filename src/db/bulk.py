@@ -0,0 +1,223 @@
+import argparse
+import csv
+import json
+import os
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Iterator, Optional
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import select
+from sqlalchemy.engine import Engine
+
+from src.db.database import Base, Cliente, customer_cache, engine, make_engine
+from src.db.validations import FIELDS, validate_frame
+
+# Filas por lote (una transacción por lote)
+BULK_BATCH_SIZE = int(os.getenv("BULK_BATCH_SIZE", "50000"))
+
+UPDATABLE = ("nombre", "telefono", "email")
+EXPORT_COLUMNS = ("identificacion", "nombre", "telefono", "email", "fecha_registro")
+
+
+def detect_format(path: Path, fmt: Optional[str]) -> str:
+    fmt = fmt or ("jsonl" if path.suffix in (".jsonl", ".ndjson") else "csv")
+    if fmt not in ("csv", "jsonl"):
+        raise ValueError(f"Formato no soportado: {fmt} (usa csv o jsonl)")
+    return fmt
+
+
+def read_batches(path: Path, fmt: str, batch_size: int) -> Iterator[pd.DataFrame]:
+    """Lee el archivo por lotes de `batch_size` filas (memoria constante), todo como texto."""
+    if fmt == "csv":
+        reader = pd.read_csv(path, dtype=str, keep_default_na=False, chunksize=batch_size)
+    else:
+        reader = pd.read_json(path, lines=True, dtype=False, chunksize=batch_size)
+    for df in reader:
+        df.columns = [str(c).strip().lower() for c in df.columns]
+        for field in FIELDS:
+            df[field] = df[field].fillna("").astype(str).str.strip() if field in df else ""
+        yield df
+
+
+def upsert_statement(db_engine: Engine, on_conflict: str):
+    """INSERT con ON CONFLICT (identificacion): `skip` conserva el registro existente, `update` lo reemplaza."""
+    dialect = db_engine.dialect.name
+    if dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    elif dialect == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert
+    else:
+        raise ValueError(f"La carga masiva no soporta la base {dialect} (usa SQLite o PostgreSQL)")
+    stmt = insert(Cliente.__table__)
+    if on_conflict == "skip":
+        return stmt.on_conflict_do_nothing(index_elements=["identificacion"])
+    if on_conflict == "update":
+        return stmt.on_conflict_do_update(
+            index_elements=["identificacion"], set_={c: stmt.excluded[c] for c in UPDATABLE}
+        )
+    raise ValueError(f"on_conflict inválido: {on_conflict} (usa skip o update)")
+
+
+class RejectsWriter:
+    """Filas inválidas con el motivo, escritas a medida que aparecen (se reemplaza en cada carga)."""
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self.count = 0
+        self._header = True
+        self.path.unlink(missing_ok=True)
+
+    def write(self, df: pd.DataFrame, errors: pd.Series) -> None:
+        if df.empty:
+            return
+        out = df[list(FIELDS)].assign(error=errors)
+        out.to_csv(self.path, mode="a", header=self._header, index=False, encoding="utf-8")
+        self._header = False
+        self.count += len(out)
+
+
+def import_clientes(path: Path, fmt: Optional[str] = None, on_conflict: str = "skip",
+                    batch_size: int = BULK_BATCH_SIZE, db_engine: Engine = engine,
+                    rejects_path: Optional[Path] = None) -> dict:
+    """
+    Carga clientes desde CSV/JSONL: valida cada lote con las reglas del registro y lo inserta en
+    una sola transacción con ON CONFLICT. Las filas inválidas van a `<archivo>.rejects.csv`.
+    """
+    path = Path(path)
+    fmt = detect_format(path, fmt)
+    Base.metadata.create_all(bind=db_engine)
+    stmt = upsert_statement(db_engine, on_conflict)
+    rejects = RejectsWriter(rejects_path or path.with_name(f"{path.stem}.rejects.csv"))
+    stats = {"read": 0, "invalid": 0, "duplicated_in_batch": 0, "written": 0, "unknown_rowcount": False}
+
+    t0 = time.perf_counter()
+    for df in read_batches(path, fmt, batch_size):
+        stats["read"] += len(df)
+        errors = validate_frame(df)
+        invalid = errors != ""
+        rejects.write(df[invalid], errors[invalid])
+        stats["invalid"] += int(invalid.sum())
+
+        # Dentro del lote gana la última fila con update y la primera con skip
+        valid = df.loc[~invalid, list(FIELDS)]
+        deduped = valid.drop_duplicates("identificacion", keep="last" if on_conflict == "update" else "first")
+        stats["duplicated_in_batch"] += len(valid) - len(deduped)
+        if deduped.empty:
+            continue
+
+        # Listas nativas en vez de to_dict("records"): evita convertir celda por celda
+        fecha = datetime.utcnow()
+        rows = [
+            {"identificacion": i, "nombre": n, "telefono": t, "email": e, "fecha_registro": fecha}
+            for i, n, t, e in zip(*(deduped[field].tolist() for field in FIELDS))
+        ]
+        with db_engine.begin() as conn:
+            result = conn.execute(stmt, rows)
+        if result.rowcount is None or result.rowcount < 0:
+            stats["unknown_rowcount"] = True
+        else:
+            stats["written"] += result.rowcount
+
+        elapsed = time.perf_counter() - t0
+        print(f" {stats['read']:,} filas leídas, {stats['written']:,} escritas ({stats['read'] / elapsed:,.0f} filas/s)")
+
+    stats["seconds"] = time.perf_counter() - t0
+    stats["rows_per_second"] = stats["read"] / stats["seconds"] if stats["seconds"] else 0.0
+    # Las búsquedas en caché de este proceso podrían ser anteriores a la carga
+    customer_cache.invalidate()
+    return stats
+
+
+def export_clientes(path: Path, fmt: Optional[str] = None, batch_size: int = BULK_BATCH_SIZE,
+                    db_engine: Engine = engine) -> dict:
+    """Exporta la tabla por lotes (cursor con `yield_per`) sin cargarla completa en memoria."""
+    path = Path(path)
+    fmt = detect_format(path, fmt)
+    columns = [getattr(Cliente, c) for c in EXPORT_COLUMNS]
+    n = 0
+    t0 = time.perf_counter()
+    with db_engine.connect() as conn, path.open("w", encoding="utf-8", newline="") as f:
+        result = conn.execution_options(yield_per=batch_size).execute(select(*columns).order_by(Cliente.id))
+        writer = csv.writer(f) if fmt == "csv" else None
+        if writer is not None:
+            writer.writerow(EXPORT_COLUMNS)
+        for partition in result.partitions():
+            rows = [(*row[:-1], row[-1].isoformat() if row[-1] else "") for row in partition]
+            if writer is not None:
+                writer.writerows(rows)
+            else:
+                f.writelines(json.dumps(dict(zip(EXPORT_COLUMNS, row)), ensure_ascii=False) + "\n" for row in rows)
+            n += len(rows)
+    seconds = time.perf_counter() - t0
+    return {"written": n, "seconds": seconds, "rows_per_second": n / seconds if seconds else 0.0}
+
+
+def generate_clientes(path: Path, rows: int, invalid_ratio: float = 0.01, duplicate_ratio: float = 0.01,
+                      batch_size: int = BULK_BATCH_SIZE, seed: int = 0) -> None:
+    """Archivo sintético para medir la carga: identificaciones únicas con un % de filas inválidas y repetidas."""
+    path = Path(path)
+    fmt = detect_format(path, None)
+    rng = np.random.default_rng(seed)
+    nombres = np.array(["Ana", "Luis", "María", "José", "Camila", "Andrés", "Lucía", "Sebastián", "Valentina", "Juan"])
+    apellidos = np.array(["Gómez", "Rodríguez", "Martínez", "López", "García", "Pérez", "Muñoz", "Díaz", "Ramírez"])
+    path.unlink(missing_ok=True)
+    for start in range(0, rows, batch_size):
+        n = min(batch_size, rows - start)
+        ids = np.arange(start, start + n) + 10_000_000
+        dup = rng.random(n) < duplicate_ratio
+        ids[dup] = rng.integers(10_000_000, 10_000_000 + start + n, int(dup.sum()))
+        df = pd.DataFrame({
+            "identificacion": ids.astype(str),
+            "nombre": np.char.add(np.char.add(rng.choice(nombres, n), " "), rng.choice(apellidos, n)),
+            "telefono": np.char.add("3", rng.integers(100_000_000, 999_999_999, n).astype(str)),
+            "email": np.char.add(np.char.add("cliente", ids.astype(str)), "@correo.com")
+        })
+        bad = rng.random(n) < invalid_ratio
+        df.loc[bad, "telefono"] = "12345"
+        if fmt == "csv":
+            df.to_csv(path, mode="a", header=start == 0, index=False, encoding="utf-8")
+        else:
+            with path.open("a", encoding="utf-8") as f:
+                df.to_json(f, orient="records", lines=True, force_ascii=False)
+    print(f" {rows:,} filas sintéticas en {path}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Carga y exportación masiva de la tabla clientes")
+    parser.add_argument("--database-url", help="Base destino (por defecto DATABASE_URL)")
+    parser.add_argument("--batch-size", type=int, default=BULK_BATCH_SIZE)
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p_import = sub.add_parser("import", help="Carga un CSV/JSONL validando cada fila")
+    p_import.add_argument("path", type=Path)
+    p_import.add_argument("--format", choices=["csv", "jsonl"])
+    p_import.add_argument("--on-conflict", choices=["skip", "update"], default="skip",
+                          help="Qué hacer si la identificación ya existe")
+    p_import.add_argument("--rejects", type=Path, help="Archivo de filas inválidas")
+
+    p_export = sub.add_parser("export", help="Exporta la tabla a CSV/JSONL")
+    p_export.add_argument("path", type=Path)
+    p_export.add_argument("--format", choices=["csv", "jsonl"])
+
+    p_generate = sub.add_parser("generate", help="Genera un archivo sintético para medir la carga")
+    p_generate.add_argument("path", type=Path)
+    p_generate.add_argument("--rows", type=int, default=1_000_000)
+
+    args = parser.parse_args()
+    db_engine = make_engine(args.database_url) if args.database_url else engine
+
+    if args.command == "import":
+        stats = import_clientes(args.path, args.format, args.on_conflict, args.batch_size, db_engine, args.rejects)
+        written = "desconocidas" if stats["unknown_rowcount"] else f"{stats['written']:,}"
+        print(
+            f"Carga terminada: {stats['read']:,} filas en {stats['seconds']:.1f}s ({stats['rows_per_second']:,.0f} filas/s); "
+            f"escritas {written}, inválidas {stats['invalid']:,}, repetidas en el lote {stats['duplicated_in_batch']:,}"
+        )
+    elif args.command == "export":
+        stats = export_clientes(args.path, args.format, args.batch_size, db_engine)
+        print(f"Exportadas {stats['written']:,} filas en {stats['seconds']:.1f}s ({stats['rows_per_second']:,.0f} filas/s)")
+    else:
+        generate_clientes(args.path, args.rows, batch_size=args.batch_size)
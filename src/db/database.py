@@ -1,14 +1,73 @@
-from sqlalchemy import Column, Integer, String, DateTime, create_engine
+from sqlalchemy import Column, Integer, String, DateTime, create_engine, event
+from sqlalchemy.engine import Engine
 from sqlalchemy.orm import declarative_base, sessionmaker, Session
-from typing import Generator
+from sqlalchemy.pool import StaticPool
+from collections import OrderedDict
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Generator, Iterator, Optional
 import os
+import threading
+import time
 from datetime import datetime
 
-# Cargar URL de la base de datos desde variables de entorno
-DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./test.db")
+from src.utils.tracing import add_event, span
+
+# Cargar URL de la base de datos desde variables de entorno. La base local vive en data/ (ignorada
+# por git): en modo WAL SQLite crea archivos -wal/-shm junto a ella en cada ejecución.
+DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./data/clientes.db")
+
+# Pool de conexiones
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+
+# Caché de búsquedas de clientes (los "no encontrado" expiran antes)
+CUSTOMER_CACHE_TTL = float(os.getenv("CUSTOMER_CACHE_TTL", "300"))
+CUSTOMER_NEGATIVE_CACHE_TTL = float(os.getenv("CUSTOMER_NEGATIVE_CACHE_TTL", "30"))
+CUSTOMER_CACHE_MAX_SIZE = int(os.getenv("CUSTOMER_CACHE_MAX_SIZE", "10000"))
+
+
+def set_sqlite_pragmas(dbapi_connection, _) -> None:
+    """Se aplica a cada conexión nueva de SQLite (motor síncrono y asíncrono)."""
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}")
+    cursor.execute("PRAGMA temp_store=MEMORY")
+    cursor.execute("PRAGMA cache_size=-16000")  # ~16 MB por conexión
+    cursor.close()
+
+
+def make_engine(url: str = DATABASE_URL) -> Engine:
+    """
+    Motor con pool explícito. En SQLite: WAL (lecturas concurrentes con una escritura),
+    synchronous=NORMAL y busy_timeout para que las escrituras simultáneas esperen en vez de fallar.
+    """
+    if not url.startswith("sqlite"):
+        return create_engine(
+            url, echo=False, pool_size=DB_POOL_SIZE, max_overflow=DB_MAX_OVERFLOW,
+            pool_timeout=DB_POOL_TIMEOUT, pool_recycle=DB_POOL_RECYCLE, pool_pre_ping=True
+        )
+
+    connect_args = {"check_same_thread": False, "timeout": SQLITE_BUSY_TIMEOUT_MS / 1000}
+    if url in ("sqlite://", "sqlite:///:memory:"):
+        # Base en memoria: una sola conexión compartida, si no cada conexión vería una base vacía
+        sqlite_engine = create_engine(url, echo=False, connect_args=connect_args, poolclass=StaticPool)
+    else:
+        sqlite_engine = create_engine(
+            url, echo=False, connect_args=connect_args,
+            pool_size=DB_POOL_SIZE, max_overflow=DB_MAX_OVERFLOW, pool_timeout=DB_POOL_TIMEOUT
+        )
+
+    event.listen(sqlite_engine, "connect", set_sqlite_pragmas)
+    return sqlite_engine
+
 
 # Configuración del motor y la sesión
-engine = create_engine(DATABASE_URL, echo=False)
+engine = make_engine(DATABASE_URL)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
 
@@ -21,6 +80,77 @@ class Cliente(Base):
     email = Column(String(255), nullable=True)
     fecha_registro = Column(DateTime, default=datetime.utcnow)
 
+
+@dataclass(frozen=True)
+class ClienteInfo:
+    """Copia inmutable de un cliente: se puede guardar en caché sin depender de una sesión abierta."""
+    id: int
+    identificacion: str
+    nombre: str
+    telefono: Optional[str]
+    email: Optional[str]
+
+    @classmethod
+    def from_model(cls, cliente: Cliente) -> "ClienteInfo":
+        return cls(cliente.id, cliente.identificacion, cliente.nombre, cliente.telefono, cliente.email)
+
+
+class CustomerCache:
+    """
+    Caché LRU de búsquedas por identificación con TTL. Guarda también los "no encontrado"
+    (con un TTL más corto) para que validar un registro nuevo no consulte la base dos veces.
+    """
+
+    def __init__(self, ttl: float = CUSTOMER_CACHE_TTL, negative_ttl: float = CUSTOMER_NEGATIVE_CACHE_TTL,
+                 max_size: int = CUSTOMER_CACHE_MAX_SIZE):
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.max_size = max_size
+        self._lock = threading.Lock()
+        self._entries: OrderedDict[str, tuple[Optional[ClienteInfo], float]] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, identificacion: str) -> tuple[bool, Optional[ClienteInfo]]:
+        """Devuelve (encontrado en caché, cliente o None)."""
+        with self._lock:
+            entry = self._entries.get(identificacion)
+            if entry is None or entry[1] < time.monotonic():
+                if entry is not None:
+                    del self._entries[identificacion]
+                self.misses += 1
+                return False, None
+            self._entries.move_to_end(identificacion)
+            self.hits += 1
+            return True, entry[0]
+
+    def put(self, identificacion: str, cliente: Optional[ClienteInfo]) -> None:
+        ttl = self.ttl if cliente is not None else self.negative_ttl
+        if ttl <= 0:
+            return
+        with self._lock:
+            self._entries[identificacion] = (cliente, time.monotonic() + ttl)
+            self._entries.move_to_end(identificacion)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, identificacion: Optional[str] = None) -> None:
+        with self._lock:
+            if identificacion is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(identificacion, None)
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {"size": len(self._entries), "hits": self.hits, "misses": self.misses,
+                    "hit_rate": self.hits / total if total else 0.0}
+
+
+customer_cache = CustomerCache()
+
+
 def init_db():
     """Crea las tablas en la base de datos."""
     Base.metadata.create_all(bind=engine)
@@ -33,9 +163,44 @@ def get_db() -> Generator[Session, None, None]:
     finally:
         db.close()
 
+@contextmanager
+def session_scope() -> Iterator[Session]:
+    """Sesión tomada del pool solo mientras se usa; se revierte si hay un error."""
+    db = SessionLocal()
+    try:
+        yield db
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
 def get_cliente_por_identificacion(db: Session, identificacion: str):
     return db.query(Cliente).filter(Cliente.identificacion == identificacion).first()
 
+def lookup_cliente(identificacion: str, db: Optional[Session] = None,
+                   trust_cached_miss: bool = True) -> Optional[ClienteInfo]:
+    """
+    Busca un cliente pasando por la caché; solo abre una sesión si no está en caché.
+    Con `trust_cached_miss=False` un "no encontrado" en caché se vuelve a consultar: la caché es
+    de cada proceso y otro worker pudo registrar al cliente después.
+    """
+    cached, cliente = customer_cache.get(identificacion)
+    if cached and (cliente is not None or trust_cached_miss):
+        add_event("customer_cache_hit")
+        return cliente
+    add_event("customer_cache_miss")
+    with span("db_query"):
+        if db is not None:
+            found = get_cliente_por_identificacion(db, identificacion)
+            cliente = ClienteInfo.from_model(found) if found else None
+        else:
+            with session_scope() as session:
+                found = get_cliente_por_identificacion(session, identificacion)
+                cliente = ClienteInfo.from_model(found) if found else None
+    customer_cache.put(identificacion, cliente)
+    return cliente
+
 def create_cliente(db: Session, identificacion: str, nombre: str, telefono: str, email: str) -> Cliente:
     cliente = Cliente(
         identificacion=identificacion,
@@ -44,6 +209,15 @@ def create_cliente(db: Session, identificacion: str, nombre: str, telefono: str,
         email=email
     )
     db.add(cliente)
-    db.commit()
+    try:
+        db.commit()
+    finally:
+        # Se descarta el "no encontrado" en caché aunque el commit falle (p. ej. registro duplicado)
+        customer_cache.invalidate(identificacion)
     db.refresh(cliente)
-    return cliente
\ No newline at end of file
+    customer_cache.put(identificacion, ClienteInfo.from_model(cliente))
+    return cliente
+
+if __name__ == "__main__":
+    init_db()
+    print(f"Base de datos inicializada en {DATABASE_URL}")
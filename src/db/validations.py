@@ -0,0 +1,57 @@
+import re
+
+import pandas as pd
+
+# Reglas de los datos de un cliente (registro en el chat y carga masiva)
+IDENTIFICACION_PATTERN = r"\d{4,11}"
+NOMBRE_PATTERN = r"[a-zA-ZáéíóúÁÉÍÓÚñÑ\s]{1,100}"
+TELEFONO_PATTERN = r"[63]\d{9}"
+EMAIL_PATTERN = r"[^@]+@[^@]+\.[^@]+"
+
+IDENTIFICACION_ERROR = "La identificación debe tener entre 4 y 11 dígitos numéricos."
+NOMBRE_ERROR = "El nombre debe tener entre 1 y 100 letras, sin números ni caracteres especiales (excepto tildes y ñ)."
+TELEFONO_ERROR = "El teléfono debe tener 10 dígitos y empezar con 6 o 3."
+EMAIL_ERROR = "El correo debe contener '@' y un dominio válido."
+
+FIELDS = ("identificacion", "nombre", "telefono", "email")
+RULES = {
+    "identificacion": (IDENTIFICACION_PATTERN, IDENTIFICACION_ERROR),
+    "nombre": (NOMBRE_PATTERN, NOMBRE_ERROR),
+    "telefono": (TELEFONO_PATTERN, TELEFONO_ERROR),
+    "email": (EMAIL_PATTERN, EMAIL_ERROR)
+}
+
+
+def validate_identificacion(identificacion: str) -> tuple[bool, str]:
+    if not re.fullmatch(IDENTIFICACION_PATTERN, identificacion):
+        return False, IDENTIFICACION_ERROR
+    return True, ""
+
+def validate_nombre(nombre: str) -> tuple[bool, str]:
+    if not re.fullmatch(NOMBRE_PATTERN, nombre):
+        return False, NOMBRE_ERROR
+    return True, ""
+
+def validate_telefono(telefono: str) -> tuple[bool, str]:
+    if not re.fullmatch(TELEFONO_PATTERN, telefono):
+        return False, TELEFONO_ERROR
+    return True, ""
+
+def validate_email(email: str) -> tuple[bool, str]:
+    if not re.fullmatch(EMAIL_PATTERN, email):
+        return False, EMAIL_ERROR
+    return True, ""
+
+
+def validate_frame(df: pd.DataFrame) -> pd.Series:
+    """
+    Las mismas reglas aplicadas a un lote completo (operaciones vectorizadas de pandas).
+    Devuelve el primer error de cada fila ("" si la fila es válida).
+    """
+    errors = pd.Series("", index=df.index, dtype=object)
+    for field in reversed(FIELDS):
+        pattern, message = RULES[field]
+        values = df[field] if field in df else pd.Series("", index=df.index)
+        ok = values.fillna("").astype(str).str.fullmatch(pattern)
+        errors = errors.mask(~ok, message)
+    return errors
@@ -0,0 +1,122 @@
+import json
+import os
+import zlib
+from pathlib import Path
+from typing import List, Optional
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from langchain_openai import OpenAIEmbeddings
+from pydantic import SecretStr
+
+from src.utils.text import normalize_text
+
+# Parámetros de entorno
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "openai")  # openai | hashing | stub (hashing con latencia simulada)
+OPENAI_EMBEDDING_MODEL = os.getenv("OPENAI_EMBEDDING_MODEL", "text-embedding-ada-002")
+HASHING_EMBEDDING_DIM = int(os.getenv("HASHING_EMBEDDING_DIM", "1024"))
+HASHING_BATCH_SIZE = int(os.getenv("HASHING_BATCH_SIZE", "512"))
+
+MANIFEST_FILE = "manifest.json"
+
+
+class HashingEmbeddings(Embeddings):
+    """
+    Embeddings locales en CPU, sin red ni modelo descargado: n-gramas de caracteres y palabras
+    proyectados con hashing firmado a `dim` dimensiones, TF sublineal y normalización L2.
+    Captura bien variaciones de tildes, plurales y errores de tipeo en preguntas cortas.
+    """
+
+    def __init__(self, dim: int = HASHING_EMBEDDING_DIM, ngram_range: tuple[int, int] = (3, 5),
+                 batch_size: int = HASHING_BATCH_SIZE):
+        self.dim = dim
+        self.ngram_range = ngram_range
+        self.batch_size = batch_size
+        self.model = f"hashing-char{ngram_range[0]}{ngram_range[1]}-{dim}"
+
+    def _features(self, text: str) -> List[str]:
+        normalized = normalize_text(text)
+        feats = [f"w:{w}" for w in normalized.split()]
+        padded = f" {normalized} "
+        lo, hi = self.ngram_range
+        for n in range(lo, hi + 1):
+            feats.extend(padded[i:i + n] for i in range(len(padded) - n + 1))
+        return feats
+
+    def _vectorize(self, texts: List[str]) -> np.ndarray:
+        rows, cols, signs = [], [], []
+        for row, text in enumerate(texts):
+            for feat in self._features(text):
+                h = zlib.crc32(feat.encode("utf-8"))
+                rows.append(row)
+                cols.append(h % self.dim)
+                signs.append(1.0 if (h >> 31) & 1 else -1.0)
+        matrix = np.zeros((len(texts), self.dim), dtype=np.float32)
+        np.add.at(matrix, (np.asarray(rows, dtype=np.int64), np.asarray(cols, dtype=np.int64)),
+                  np.asarray(signs, dtype=np.float32))
+        # TF sublineal conservando el signo del hashing
+        matrix = np.sign(matrix) * np.log1p(np.abs(matrix))
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        return matrix / np.where(norms == 0, 1, norms)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        out = [self._vectorize(texts[i:i + self.batch_size]) for i in range(0, len(texts), self.batch_size)]
+        return np.vstack(out).tolist() if out else []
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._vectorize([text])[0].tolist()
+
+
+def get_embeddings(backend: Optional[str] = None, api_key: Optional[str] = None) -> Embeddings:
+    """Instancia el backend de embeddings configurado (EMBEDDING_BACKEND)."""
+    backend = backend or EMBEDDING_BACKEND
+    if backend == "openai":
+        api_key = api_key or os.getenv("OPENAI_API_KEY")
+        if not api_key:
+            raise ValueError("OPENAI_API_KEY no está definida en .env (requerida por EMBEDDING_BACKEND=openai)")
+        return OpenAIEmbeddings(model=OPENAI_EMBEDDING_MODEL, api_key=SecretStr(api_key))
+    if backend == "hashing":
+        return HashingEmbeddings()
+    if backend == "stub":
+        from src.utils.stubs import StubEmbeddings
+        return StubEmbeddings()
+    raise ValueError(f"EMBEDDING_BACKEND desconocido: {backend} (usa 'openai', 'hashing' o 'stub')")
+
+
+def embeddings_signature(embeddings: Embeddings) -> dict:
+    """Backend y modelo que identifican los vectores; se guarda en el manifiesto del índice."""
+    if isinstance(embeddings, HashingEmbeddings):
+        backend = "hashing"
+    elif isinstance(embeddings, OpenAIEmbeddings):
+        backend = "openai"
+    else:
+        backend = type(embeddings).__name__
+    return {
+        "backend": backend,
+        "model": getattr(embeddings, "model", None) or type(embeddings).__name__
+    }
+
+
+def validate_index_manifest(folder: str | Path, embeddings: Embeddings, index_dim: int) -> None:
+    """
+    Rechaza un índice construido con otro backend/modelo de embeddings o con otra dimensión.
+    Los índices sin manifiesto (anteriores a esta validación) se asumen construidos con OpenAI.
+    """
+    manifest_file = Path(folder) / MANIFEST_FILE
+    manifest = json.loads(manifest_file.read_text(encoding="utf-8")) if manifest_file.exists() else {}
+    expected = embeddings_signature(embeddings)
+    built_backend = manifest.get("backend", "openai")
+    if built_backend != expected["backend"]:
+        raise ValueError(
+            f"El índice en {folder} se construyó con EMBEDDING_BACKEND={built_backend}, "
+            f"pero está configurado {expected['backend']}. Reconstruye el índice."
+        )
+    if "model" in manifest and manifest["model"] != expected["model"]:
+        raise ValueError(
+            f"El índice en {folder} se construyó con el modelo {manifest['model']}, "
+            f"pero está configurado {expected['model']}. Reconstruye el índice."
+        )
+    if "dimension" in manifest and manifest["dimension"] != index_dim:
+        raise ValueError(f"Dimensión del índice ({index_dim}) distinta a la del manifiesto ({manifest['dimension']})")
+    if isinstance(embeddings, HashingEmbeddings) and embeddings.dim != index_dim:
+        raise ValueError(f"Dimensión del índice ({index_dim}) distinta a HASHING_EMBEDDING_DIM ({embeddings.dim})")
@@ -0,0 +1,164 @@
+import argparse
+import logging
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Callable, Optional, Sequence
+
+from src.utils.tokens import count_tokens
+
+logger = logging.getLogger(__name__)
+
+# Parámetros de entorno
+EMBED_BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", "256"))
+EMBED_MAX_CONCURRENCY = int(os.getenv("EMBED_MAX_CONCURRENCY", "4"))
+EMBED_TPM_LIMIT = int(os.getenv("EMBED_TPM_LIMIT", "1000000"))
+EMBED_MAX_RETRIES = int(os.getenv("EMBED_MAX_RETRIES", "5"))
+EMBED_BACKOFF_BASE = float(os.getenv("EMBED_BACKOFF_BASE", "1.0"))
+
+
+class TokenRateLimiter:
+    """Token bucket de tokens por minuto, compartido por todos los hilos."""
+
+    def __init__(self, tokens_per_minute: int):
+        self.capacity = float(tokens_per_minute)
+        self.rate = tokens_per_minute / 60.0
+        self._available = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, tokens: int) -> float:
+        """Bloquea hasta disponer de `tokens`; devuelve el tiempo esperado en segundos."""
+        # Un lote más grande que el bucket completo solo puede esperar a que esté lleno
+        tokens = min(float(tokens), self.capacity)
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._available = min(self.capacity, self._available + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._available >= tokens:
+                    self._available -= tokens
+                    return waited
+                wait = (tokens - self._available) / self.rate
+            time.sleep(wait)
+            waited += wait
+
+
+class BatchEmbedder:
+    """
+    Etapa de embedding para indexación: lotes de tamaño configurable, peticiones concurrentes
+    acotadas (pool de hilos), límite de tokens por minuto y reintentos con backoff exponencial.
+    Expone `embed_documents`/`embed_query`, por lo que sustituye al objeto de embeddings original.
+    """
+
+    def __init__(
+        self,
+        embeddings,
+        batch_size: int = EMBED_BATCH_SIZE,
+        max_concurrency: int = EMBED_MAX_CONCURRENCY,
+        tpm_limit: int = EMBED_TPM_LIMIT,
+        max_retries: int = EMBED_MAX_RETRIES,
+        backoff_base: float = EMBED_BACKOFF_BASE
+    ):
+        self.embeddings = embeddings
+        self.batch_size = batch_size
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.limiter = TokenRateLimiter(tpm_limit)
+        self.last_stats: dict = {}
+
+    @property
+    def model(self) -> str:
+        return getattr(self.embeddings, "model", None) or type(self.embeddings).__name__
+
+    def _embed_batch(self, batch: Sequence[str]) -> list[list[float]]:
+        self.limiter.acquire(sum(count_tokens(t) for t in batch))
+        for attempt in range(self.max_retries + 1):
+            try:
+                return self.embeddings.embed_documents(list(batch))
+            except Exception as e:
+                if attempt == self.max_retries:
+                    raise
+                delay = self.backoff_base * (2 ** attempt) * (0.5 + random.random())
+                logger.warning(f"Error al embeber lote ({e}); reintento {attempt + 1} en {delay:.1f}s")
+                time.sleep(delay)
+        return []
+
+    def embed_documents(self, texts: Sequence[str],
+                        on_batch: Optional[Callable[[int, list[list[float]]], None]] = None) -> list[list[float]]:
+        """`on_batch(inicio, vectores)` se llama en este hilo al terminar cada lote (p. ej. para guardarlo ya)."""
+        if not texts:
+            return []
+        batches = [texts[i:i + self.batch_size] for i in range(0, len(texts), self.batch_size)]
+        results: list[list[list[float]]] = [[] for _ in batches]
+        t0 = time.perf_counter()
+        done = 0
+        next_report = 0.1
+
+        with ThreadPoolExecutor(max_workers=self.max_concurrency) as pool:
+            futures = {pool.submit(self._embed_batch, batch): idx for idx, batch in enumerate(batches)}
+            for fut in as_completed(futures):
+                idx = futures[fut]
+                results[idx] = fut.result()
+                if on_batch is not None:
+                    on_batch(idx * self.batch_size, results[idx])
+                done += len(batches[idx])
+                if done / len(texts) >= next_report or done == len(texts):
+                    elapsed = time.perf_counter() - t0
+                    logger.info(
+                        f"Embeddings: {done}/{len(texts)} ({done / len(texts):.0%}), "
+                        f"{done / elapsed if elapsed else 0:.1f} chunks/s"
+                    )
+                    next_report = done / len(texts) + 0.1
+
+        elapsed = time.perf_counter() - t0
+        self.last_stats = {
+            "n_texts": len(texts),
+            "n_batches": len(batches),
+            "seconds": elapsed,
+            "chunks_per_second": len(texts) / elapsed if elapsed else 0.0
+        }
+        return [vec for batch in results for vec in batch]
+
+    def embed_query(self, text: str) -> list[float]:
+        return self.embeddings.embed_query(text)
+
+
+def run_benchmark(n_texts: int, base_url: str | None = None):
+    """Mide el throughput de indexación contra la API (o un servidor falso vía `base_url`)."""
+    from langchain_openai import OpenAIEmbeddings
+    from pydantic import SecretStr
+
+    api_key = os.getenv("OPENAI_API_KEY", "fake-key")
+    # Con un servidor local se envían los textos tal cual (sin tokenizar con tiktoken)
+    embeddings = OpenAIEmbeddings(
+        api_key=SecretStr(api_key),
+        base_url=base_url,
+        check_embedding_ctx_length=base_url is None
+    )
+    texts = [f"Sucursal {i % 50}: horario {i % 7} de 7:00 a.m. a {i % 12} p.m. (chunk {i})" for i in range(n_texts)]
+    embedder = BatchEmbedder(embeddings)
+    embedder.embed_documents(texts)
+    stats = embedder.last_stats
+    print(
+        f" {stats['n_texts']} chunks en {stats['n_batches']} lotes, {stats['seconds']:.2f}s "
+        f"-> {stats['chunks_per_second']:.1f} chunks/s "
+        f"(batch_size={embedder.batch_size}, concurrencia={embedder.max_concurrency})"
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark de throughput de embeddings por lotes")
+    parser.add_argument("--n", type=int, default=5000, help="Número de textos sintéticos")
+    parser.add_argument(
+        "--base-url",
+        default=os.getenv("OPENAI_BASE_URL"),
+        help="URL base de la API (p. ej. http://localhost:8765/v1 con fake_embedding_server)"
+    )
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    run_benchmark(args.n, args.base_url)
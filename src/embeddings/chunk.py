@@ -1,87 +1,231 @@
 from pathlib import Path
+import argparse
 import json
-from typing import List, Dict, Any
+import os
+import re
+from typing import List, Dict, Any, Optional
+
+import numpy as np
+
+from src.embeddings.lexical_index import BM25Index, LEXICAL_INDEX_FILE
+from src.utils.tokens import count_tokens
 
 PROCESSED_DIR = Path("data/processed")
 CHUNKS_PATH   = PROCESSED_DIR / "chunks.jsonl"
+# El índice léxico y los textos padre (estrategia parent_child: se buscan los hijos y se devuelve
+# el padre) se preparan aquí; embed_and_index los mueve a vectordb junto con el manifiesto, para
+# que el vigilante nunca empareje un índice léxico nuevo con el FAISS anterior
+LEXICAL_INDEX_PATH = PROCESSED_DIR / LEXICAL_INDEX_FILE
+PARENT_CHUNKS_FILE = "parent_chunks.json"
+PARENT_CHUNKS_PATH = PROCESSED_DIR / PARENT_CHUNKS_FILE
+
+# Estrategias disponibles por fuente; la primera es la predeterminada
+STRATEGIES = {
+    "cleaned_horarios": ("per_day", "per_branch"),
+    "suma_gana": ("per_paragraph", "token", "parent_child"),
+    "preguntas_frecuentes": ("per_question",),
+}
+# Ej.: CHUNK_STRATEGIES="cleaned_horarios=per_branch,suma_gana=parent_child"
+CHUNK_STRATEGIES = os.getenv("CHUNK_STRATEGIES", "")
+CHUNK_MAX_TOKENS = int(os.getenv("CHUNK_MAX_TOKENS", "200"))
+CHUNK_OVERLAP_TOKENS = int(os.getenv("CHUNK_OVERLAP_TOKENS", "40"))
+
+SENTENCE_SPLIT = re.compile(r"(?<=[.!?;:])\s+")
+
+
+def parse_strategies(spec: str = CHUNK_STRATEGIES) -> Dict[str, str]:
+    """Estrategia por fuente: la predeterminada, sobrescrita por `spec` (fuente=estrategia,...)."""
+    selected = {source: options[0] for source, options in STRATEGIES.items()}
+    for item in filter(None, (s.strip() for s in spec.split(","))):
+        source, _, strategy = item.partition("=")
+        source, strategy = source.strip(), strategy.strip()
+        if strategy not in STRATEGIES.get(source, ()):
+            raise ValueError(
+                f"Estrategia de chunking inválida para {source}: {strategy} "
+                f"(opciones: {', '.join(STRATEGIES.get(source, ())) or 'ninguna'})"
+            )
+        selected[source] = strategy
+    return selected
+
+
+def split_tokens(text: str, max_tokens: int = CHUNK_MAX_TOKENS, overlap: int = CHUNK_OVERLAP_TOKENS) -> List[str]:
+    """
+    Divide el texto en ventanas de hasta `max_tokens` respetando oraciones,
+    repitiendo al inicio de cada ventana hasta `overlap` tokens de la anterior.
+    """
+    text = text.strip()
+    if count_tokens(text) <= max_tokens:
+        return [text] if text else []
+
+    # Unidades: oraciones; las que no caben solas se cortan por palabras
+    units: List[str] = []
+    for sentence in SENTENCE_SPLIT.split(text):
+        if count_tokens(sentence) <= max_tokens:
+            units.append(sentence)
+            continue
+        words, current = sentence.split(), []
+        for w in words:
+            if current and count_tokens(" ".join(current + [w])) > max_tokens:
+                units.append(" ".join(current))
+                current = []
+            current.append(w)
+        if current:
+            units.append(" ".join(current))
+
+    sizes = [count_tokens(u) for u in units]
+    chunks: List[str] = []
+    start = 0
+    while start < len(units):
+        end, total = start, 0
+        while end < len(units) and total + sizes[end] <= max_tokens:
+            total += sizes[end]
+            end += 1
+        end = max(end, start + 1)
+        chunks.append(" ".join(units[start:end]))
+        if end >= len(units):
+            break
+        # Solapamiento: se retroceden unidades completas hasta `overlap` tokens
+        back, carried = end, 0
+        while back - 1 > start and carried + sizes[back - 1] <= overlap:
+            back -= 1
+            carried += sizes[back]
+        start = back
+    return chunks
+
+
+def faq_answer_text(resp: Any) -> str:
+    """Convierte la respuesta de una FAQ (texto o dict con ítems) a texto plano."""
+    if isinstance(resp, dict):
+        texto = resp.get("texto", "").strip()
+        items = resp.get("items", [])
+        return texto + ("\n" + "\n".join(items) if items else "")
+    return str(resp).strip()
+
+
+def _suma_gana_units(sec: Dict[str, Any]) -> List[tuple[str, str]]:
+    """(tipo, texto) de cada párrafo, ítem y nota de una sección."""
+    units = [("para", p.strip()) for p in sec.get("parrafos", [])]
+    units += [("item", it.strip()) for it in sec.get("items", [])]
+    units += [("note", n.strip()) for n in sec.get("notas", [])]
+    return units
 
-def load_json_docs() -> List[Dict[str, Any]]:
+
+def chunk_suma_gana(data: Dict[str, Any], source: str, strategy: str,
+                    parents: Dict[str, Dict[str, Any]]) -> List[Dict[str, Any]]:
     docs: List[Dict[str, Any]] = []
+    desc = data.get("descripcion", "").strip()
+    if desc:
+        pieces = [desc] if strategy == "per_paragraph" else split_tokens(desc)
+        for i, piece in enumerate(pieces):
+            docs.append({
+                "id": f"{source}-descripcion" + (f"-tok-{i}" if len(pieces) > 1 else ""),
+                "source": source,
+                "section": "descripcion",
+                "text": piece
+            })
 
-    for file in PROCESSED_DIR.glob("*.json"):
-        data = json.loads(file.read_text(encoding="utf-8"))
-        source = file.stem.lower()
+    for sec in data.get("secciones", []):
+        title = sec.get("titulo", "").strip()
+        units = _suma_gana_units(sec)
 
-        # 1) 'Suma y Gana': descripción general + fragmentos por sección
-        if source == "suma_gana" and isinstance(data, dict):
-            desc = data.get("descripcion", "").strip()
-            if desc:
+        # Un fragmento por párrafo, ítem o nota (comportamiento original)
+        if strategy == "per_paragraph":
+            counters = {"para": 0, "item": 0, "note": 0}
+            for kind, text in units:
                 docs.append({
-                    "id": f"{source}-descripcion",
+                    "id": f"{source}-{title}-{kind}-{counters[kind]}",
                     "source": source,
-                    "section": "descripcion",
-                    "text": desc
+                    "section": title,
+                    "text": text
                 })
-            # Inicializar contadores por sección
-            section_counters = {
-                sec.get("titulo", ""): {"para": 0, "item": 0, "note": 0}
-                for sec in data.get("secciones", [])
+                counters[kind] += 1
+
+        # Sección completa dividida en ventanas de tokens con solapamiento
+        elif strategy == "token":
+            section_text = "\n".join([title] + [text for _, text in units])
+            for i, piece in enumerate(split_tokens(section_text)):
+                docs.append({
+                    "id": f"{source}-{title}-tok-{i}",
+                    "source": source,
+                    "section": title,
+                    "text": piece
+                })
+
+        # Se indexan las unidades pequeñas y la recuperación devuelve la sección completa
+        elif strategy == "parent_child":
+            parent_id = f"{source}-{title}"
+            parents[parent_id] = {
+                "id": parent_id,
+                "source": source,
+                "section": title,
+                "text": "\n".join([title] + [text for _, text in units])
             }
-            for sec in data.get("secciones", []):
-                title = sec.get("titulo", "").strip()
-                cnt = section_counters[title]
-                # Párrafos
-                for p in sec.get("parrafos", []):
+            counters = {"para": 0, "item": 0, "note": 0}
+            for kind, text in units:
+                pieces = split_tokens(text)
+                for j, piece in enumerate(pieces):
                     docs.append({
-                        "id": f"{source}-{title}-para-{cnt['para']}",
+                        "id": f"{source}-{title}-{kind}-{counters[kind]}" + (f"-part-{j}" if len(pieces) > 1 else ""),
                         "source": source,
                         "section": title,
-                        "text": p.strip()
+                        "text": piece,
+                        "parent_id": parent_id
                     })
-                    cnt["para"] += 1
-                # Ítems
-                for it in sec.get("items", []):
-                    docs.append({
-                        "id": f"{source}-{title}-item-{cnt['item']}",
-                        "source": source,
-                        "section": title,
-                        "text": it.strip()
-                    })
-                    cnt["item"] += 1
-                # Notas
-                for n in sec.get("notas", []):
+                counters[kind] += 1
+    return docs
+
+
+def chunk_horarios(data: List[Dict[str, Any]], source: str, strategy: str) -> List[Dict[str, Any]]:
+    docs: List[Dict[str, Any]] = []
+    for entry in data:
+        suc = entry.get("sucursal", "")
+        horario = entry.get("horario", {})
+        # Un fragmento por día (comportamiento original)
+        if strategy == "per_day":
+            for dia, h in horario.items():
+                if h:
                     docs.append({
-                        "id": f"{source}-{title}-note-{cnt['note']}",
+                        "id": f"{source}-{suc}-{dia}",
                         "source": source,
-                        "section": title,
-                        "text": n.strip()
+                        "section": suc,
+                        "text": f"{dia}: {h}"
                     })
-                    cnt["note"] += 1
+        # Un fragmento por sucursal con la semana completa
+        elif strategy == "per_branch":
+            lines = [f"{suc} ({entry.get('direccion', '')})"]
+            lines += [f"{dia}: {h or 'cerrado'}" for dia, h in horario.items()]
+            docs.append({
+                "id": f"{source}-{suc}",
+                "source": source,
+                "section": suc,
+                "text": "\n".join(lines)
+            })
+    return docs
+
+
+def load_json_docs(strategies: Optional[Dict[str, str]] = None,
+                   parents: Optional[Dict[str, Dict[str, Any]]] = None) -> List[Dict[str, Any]]:
+    strategies = strategies or parse_strategies()
+    parents = parents if parents is not None else {}
+    docs: List[Dict[str, Any]] = []
+
+    for file in PROCESSED_DIR.glob("*.json"):
+        data = json.loads(file.read_text(encoding="utf-8"))
+        source = file.stem.lower()
 
-        # 2) 'Horarios': un fragmento por día
+        # 1) 'Suma y Gana': descripción general + fragmentos por sección
+        if source == "suma_gana" and isinstance(data, dict):
+            docs.extend(chunk_suma_gana(data, source, strategies["suma_gana"], parents))
+
+        # 2) 'Horarios': un fragmento por día o por sucursal
         elif source.startswith("cleaned_horarios") and isinstance(data, list):
-            for entry in data:
-                suc = entry.get("sucursal", "")
-                for dia, h in entry.get("horario", {}).items():
-                    if h:
-                        docs.append({
-                            "id": f"{source}-{suc}-{dia}",
-                            "source": source,
-                            "section": suc,
-                            "text": f"{dia}: {h}"
-                        })
+            docs.extend(chunk_horarios(data, source, strategies["cleaned_horarios"]))
 
         # 3) 'Preguntas frecuentes': un fragmento por pregunta+respuesta
         elif source.startswith("preguntas_frecuentes") and isinstance(data, list):
             for idx, faq in enumerate(data):
                 pregunta = faq.get("pregunta", "").strip()
-                resp = faq.get("respuesta")
-                if isinstance(resp, dict):
-                    texto = resp.get("texto", "").strip()
-                    items = resp.get("items", [])
-                    respuesta = texto + ("\n" + "\n".join(items) if items else "")
-                else:
-                    respuesta = str(resp).strip()
+                respuesta = faq_answer_text(faq.get("respuesta"))
                 docs.append({
                     "id": f"{source}-{idx}",
                     "source": source,
@@ -110,14 +254,78 @@ def load_json_docs() -> List[Dict[str, Any]]:
     return docs
 
 
-def run_chunking():
-    docs = load_json_docs()
+def chunk_stats(docs: List[Dict[str, Any]]) -> Dict[str, Dict[str, float]]:
+    """Cantidad de chunks y distribución de tamaño (tokens) por fuente."""
+    by_source: Dict[str, List[int]] = {}
+    for doc in docs:
+        by_source.setdefault(doc["source"], []).append(count_tokens(doc["text"]))
+    stats = {}
+    for source, sizes in sorted(by_source.items()):
+        arr = np.asarray(sizes)
+        stats[source] = {
+            "chunks": len(sizes),
+            "tokens_total": int(arr.sum()),
+            "tokens_min": int(arr.min()),
+            "tokens_p50": float(np.percentile(arr, 50)),
+            "tokens_p95": float(np.percentile(arr, 95)),
+            "tokens_max": int(arr.max())
+        }
+    return stats
+
+
+def print_report(strategies: Dict[str, str], docs: List[Dict[str, Any]]) -> None:
+    for source, s in chunk_stats(docs).items():
+        print(
+            f" {source:<22} {strategies.get(source, '-'):<14} {s['chunks']:>5} chunks | tokens "
+            f"total {s['tokens_total']:>6}, min {s['tokens_min']:>4}, p50 {s['tokens_p50']:>6.1f}, "
+            f"p95 {s['tokens_p95']:>6.1f}, max {s['tokens_max']:>4}"
+        )
+
+
+def compare_strategies() -> None:
+    """Reporte de todas las estrategias de cada fuente, sin escribir archivos."""
+    print(f" Comparación de estrategias (CHUNK_MAX_TOKENS={CHUNK_MAX_TOKENS}, CHUNK_OVERLAP_TOKENS={CHUNK_OVERLAP_TOKENS})")
+    defaults = parse_strategies("")
+    for source, options in STRATEGIES.items():
+        for strategy in options:
+            strategies = {**defaults, source: strategy}
+            docs = [d for d in load_json_docs(strategies, {}) if d["source"] == source]
+            print_report(strategies, docs)
+
+
+def run_chunking(strategies: Optional[Dict[str, str]] = None):
+    strategies = strategies or parse_strategies()
+    parents: Dict[str, Dict[str, Any]] = {}
+    docs = load_json_docs(strategies, parents)
     PROCESSED_DIR.mkdir(parents=True, exist_ok=True)
     with CHUNKS_PATH.open("w", encoding="utf-8") as fout:
         for doc in docs:
             fout.write(json.dumps(doc, ensure_ascii=False) + "\n")
     print(f" Generados {len(docs)} chunks en {CHUNKS_PATH}")
+    print_report(strategies, docs)
+
+    # Textos padre (parent_child); se elimina el archivo si ninguna fuente usa esa estrategia
+    if parents:
+        PARENT_CHUNKS_PATH.write_text(json.dumps(parents, ensure_ascii=False), encoding="utf-8")
+        print(f" {len(parents)} chunks padre en {PARENT_CHUNKS_PATH}")
+    elif PARENT_CHUNKS_PATH.exists():
+        PARENT_CHUNKS_PATH.unlink()
+
+    # Índice invertido BM25 (búsqueda léxica sin embeddings)
+    lexical = BM25Index.build(docs)
+    lexical.save(LEXICAL_INDEX_PATH)
+    print(f" Índice léxico con {len(lexical.idf)} términos en {LEXICAL_INDEX_PATH}")
 
 
 if __name__ == "__main__":
-    run_chunking()
+    parser = argparse.ArgumentParser(description="Chunking de los documentos procesados")
+    parser.add_argument(
+        "--strategies", default=CHUNK_STRATEGIES,
+        help="Estrategia por fuente, p. ej. 'cleaned_horarios=per_branch,suma_gana=parent_child'"
+    )
+    parser.add_argument("--report", action="store_true", help="Solo compara las estrategias, sin escribir archivos")
+    args = parser.parse_args()
+    if args.report:
+        compare_strategies()
+    else:
+        run_chunking(parse_strategies(args.strategies))
@@ -0,0 +1,151 @@
+import json
+import os
+import sqlite3
+import threading
+from collections.abc import Mapping
+from pathlib import Path
+from typing import Iterator, Sequence, Union
+import logging
+
+import faiss
+from langchain.docstore.document import Document
+from langchain_community.docstore.base import Docstore
+from langchain_community.vectorstores import FAISS
+from langchain_core.embeddings import Embeddings
+
+logger = logging.getLogger(__name__)
+
+# Formato al construir: mmap (index.faiss + docstore.sqlite) | legacy (index.faiss + index.pkl)
+VECTORSTORE_FORMAT = os.getenv("VECTORSTORE_FORMAT", "mmap")
+
+DOCSTORE_FILE = "docstore.sqlite"
+INDEX_FILE = "index.faiss"
+LEGACY_DOCSTORE_FILE = "index.pkl"
+
+
+def write_docstore(path: str | Path, ids: Sequence[str], docs: Sequence[Document]) -> None:
+    """Guarda los documentos en SQLite; `position` es la fila del vector en el índice FAISS."""
+    path = Path(path)
+    tmp = path.with_suffix(".tmp")
+    tmp.unlink(missing_ok=True)
+    conn = sqlite3.connect(str(tmp))
+    try:
+        conn.execute(
+            "CREATE TABLE docs (position INTEGER PRIMARY KEY, id TEXT NOT NULL UNIQUE, "
+            "text TEXT NOT NULL, metadata TEXT NOT NULL)"
+        )
+        conn.executemany(
+            "INSERT INTO docs VALUES (?, ?, ?, ?)",
+            ((i, doc_id, d.page_content, json.dumps(d.metadata, ensure_ascii=False))
+             for i, (doc_id, d) in enumerate(zip(ids, docs)))
+        )
+        conn.commit()
+    finally:
+        conn.close()
+    # Reemplazo atómico: los procesos que lo tengan abierto siguen leyendo la versión anterior
+    tmp.replace(path)
+
+
+class _ReadOnlySQLite:
+    """
+    Conexión de solo lectura abierta al cargar el índice y compartida por todos los hilos (con lock).
+    Mantiene abierto el archivo de esa versión: si una reconstrucción reemplaza docstore.sqlite,
+    esta instantánea sigue leyendo las posiciones que corresponden a su índice FAISS.
+    """
+
+    def __init__(self, path: Path):
+        self.path = path
+        self._conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True, check_same_thread=False)
+        self._lock = threading.Lock()
+
+    def fetchone(self, sql: str, params: tuple = ()) -> tuple | None:
+        with self._lock:
+            return self._conn.execute(sql, params).fetchone()
+
+    def fetchall(self, sql: str, params: tuple = ()) -> list[tuple]:
+        with self._lock:
+            return self._conn.execute(sql, params).fetchall()
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+class SQLiteDocstore(Docstore):
+    """Docstore de solo lectura que lee cada documento de SQLite al pedirlo (sin pickle ni carga completa)."""
+
+    def __init__(self, db: _ReadOnlySQLite):
+        self._db = db
+
+    def search(self, search: str) -> Union[str, Document]:
+        row = self._db.fetchone("SELECT id, text, metadata FROM docs WHERE id = ?", (search,))
+        if row is None:
+            return f"ID {search} not found."
+        return Document(id=row[0], page_content=row[1], metadata=json.loads(row[2]))
+
+    def add(self, texts: dict[str, Document]) -> None:
+        raise NotImplementedError("SQLiteDocstore es de solo lectura; reconstruye el índice para agregar documentos")
+
+    def delete(self, ids: list) -> None:
+        raise NotImplementedError("SQLiteDocstore es de solo lectura; reconstruye el índice para eliminar documentos")
+
+
+class SQLiteIndexToDocstoreId(Mapping):
+    """Posición en FAISS -> id del documento, consultada en SQLite en lugar de cargarse como dict."""
+
+    def __init__(self, db: _ReadOnlySQLite):
+        self._db = db
+
+    def __getitem__(self, position: int) -> str:
+        row = self._db.fetchone("SELECT id FROM docs WHERE position = ?", (int(position),))
+        if row is None:
+            raise KeyError(position)
+        return row[0]
+
+    def __len__(self) -> int:
+        return self._db.fetchone("SELECT COUNT(*) FROM docs")[0]
+
+    def __iter__(self) -> Iterator[int]:
+        for (position,) in self._db.fetchall("SELECT position FROM docs ORDER BY position"):
+            yield position
+
+
+def read_index_mmap(path: str | Path) -> faiss.Index:
+    """
+    Abre el índice mapeado en memoria y de solo lectura: los procesos comparten las páginas
+    a través de la caché del sistema operativo. Los tipos sin soporte de mmap se leen completos.
+    """
+    flags = faiss.IO_FLAG_READ_ONLY | getattr(faiss, "IO_FLAG_MMAP_IFC", faiss.IO_FLAG_MMAP)
+    try:
+        return faiss.read_index(str(path), flags)
+    except RuntimeError as e:
+        logger.warning(f"El índice {path} no admite mmap, se lee completo: {e}")
+        return faiss.read_index(str(path))
+
+
+def has_sqlite_docstore(folder: str | Path) -> bool:
+    return (Path(folder) / DOCSTORE_FILE).exists()
+
+
+def save_mmap_vectorstore(folder: str | Path, index: faiss.Index, ids: Sequence[str], docs: Sequence[Document]) -> None:
+    """Guarda el índice FAISS y el docstore SQLite; elimina el pickle del formato anterior."""
+    folder = Path(folder)
+    folder.mkdir(parents=True, exist_ok=True)
+    tmp_index = folder / f"{INDEX_FILE}.tmp"
+    faiss.write_index(index, str(tmp_index))
+    tmp_index.replace(folder / INDEX_FILE)
+    write_docstore(folder / DOCSTORE_FILE, ids, docs)
+    (folder / LEGACY_DOCSTORE_FILE).unlink(missing_ok=True)
+
+
+def load_mmap_vectorstore(folder: str | Path, embeddings: Embeddings) -> FAISS:
+    """Vectorstore con índice mapeado en memoria y docstore SQLite de lectura perezosa."""
+    folder = Path(folder)
+    # Una sola conexión para el docstore y el mapeo de posiciones: ambos ven la misma versión del archivo
+    db = _ReadOnlySQLite(folder / DOCSTORE_FILE)
+    return FAISS(
+        embedding_function=embeddings,
+        index=read_index_mmap(folder / INDEX_FILE),
+        docstore=SQLiteDocstore(db),
+        index_to_docstore_id=SQLiteIndexToDocstoreId(db)
+    )
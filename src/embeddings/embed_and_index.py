@@ -2,13 +2,31 @@ from pathlib import Path
 import json
 import os
 import subprocess
+import hashlib
+import time
 
-from langchain_openai import OpenAIEmbeddings
+import numpy as np
+from langchain_community.docstore.in_memory import InMemoryDocstore
 from langchain_community.vectorstores import FAISS
 # from dotenv import load_dotenv
 import mlflow
 from langchain.docstore.document import Document
-from pydantic import SecretStr
+
+from src.chat.faq_answers import FAQ_ANSWERS_FILE, FAQ_EMBEDDINGS_FILE
+from src.embeddings.backends import EMBEDDING_BACKEND, MANIFEST_FILE, embeddings_signature, get_embeddings
+from src.embeddings.chunk import LEXICAL_INDEX_PATH, PARENT_CHUNKS_FILE, PARENT_CHUNKS_PATH, faq_answer_text
+from src.embeddings.batch_embedder import BatchEmbedder
+from src.embeddings.docstore import DOCSTORE_FILE, VECTORSTORE_FORMAT, save_mmap_vectorstore
+from src.embeddings.faiss_index import (
+    FAISS_INDEX_TYPE, FAISS_NLIST, FAISS_HNSW_M, FAISS_PQ_M, FAISS_PQ_NBITS, build_index, index_size_bytes
+)
+from src.embeddings.embedding_store import (
+    EMBEDDING_STORE_RETENTION_DAYS,
+    EmbeddingStore,
+    content_hash,
+    embed_with_store,
+    embedding_model_name
+)
 
 # Cargar variables de entorno desde .env
 # load_dotenv()
@@ -16,22 +34,51 @@ from pydantic import SecretStr
 # Rutas
 CHUNKS_PATH = Path("data/processed/chunks.jsonl")
 VECTOR_DIR  = Path("data/processed/vectordb")
+FAQ_PATH    = Path("data/processed/preguntas_frecuentes.json")
+CHUNK_HASHES_FILE = "chunk_hashes.json"
 
 def load_chunks() -> list[Document]:
     docs: list[Document] = []
     with CHUNKS_PATH.open("r", encoding="utf-8") as f:
         for line in f:
             rec = json.loads(line)
-            docs.append(Document(
-                page_content=rec["text"],
-                metadata={
-                    "id": rec["id"],
-                    "source": rec["source"],
-                    "section": rec["section"]
-                }
-            ))
+            metadata = {
+                "id": rec["id"],
+                "source": rec["source"],
+                "section": rec["section"]
+            }
+            # Estrategia parent_child: la recuperación devuelve el chunk padre
+            if rec.get("parent_id"):
+                metadata["parent_id"] = rec["parent_id"]
+            docs.append(Document(page_content=rec["text"], metadata=metadata))
     return docs
 
+def build_faq_table(embeddings, store: EmbeddingStore) -> tuple[int, set[str]]:
+    """
+    Precalcula los embeddings de las preguntas frecuentes y guarda sus respuestas aprobadas.
+    Devuelve el número de FAQs y los hashes de sus preguntas (vigentes en el almacén).
+    """
+    if not FAQ_PATH.exists():
+        print(f" No se encontró {FAQ_PATH}, se omite la tabla de FAQs")
+        return 0, set()
+    faqs = json.loads(FAQ_PATH.read_text(encoding="utf-8"))
+    entries = [
+        {
+            "id": f"preguntas_frecuentes-{idx}",
+            "pregunta": faq.get("pregunta", "").strip(),
+            "respuesta": faq_answer_text(faq.get("respuesta"))
+        }
+        for idx, faq in enumerate(faqs)
+        if faq.get("pregunta")
+    ]
+    vectors, _ = embed_with_store([e["pregunta"] for e in entries], embeddings, store)
+    (VECTOR_DIR / FAQ_ANSWERS_FILE).write_text(
+        json.dumps(entries, ensure_ascii=False, indent=2), encoding="utf-8"
+    )
+    np.save(VECTOR_DIR / FAQ_EMBEDDINGS_FILE, np.stack(vectors).astype(np.float32))
+    print(f" Tabla de FAQs guardada con {len(entries)} respuestas")
+    return len(entries), {content_hash(e["pregunta"]) for e in entries}
+
 def get_git_commit() -> str:
     try:
         return subprocess.check_output(
@@ -40,35 +87,153 @@ def get_git_commit() -> str:
     except Exception:
         return "unknown"
 
-def run_embed_and_index(openai_api_key: str | None = None):
-    # 1) API Key
-    api_key = openai_api_key or os.getenv("OPENAI_API_KEY")
-    if not api_key:
+def read_manifest() -> dict:
+    """Lee el manifiesto del índice en disco (vacío si no existe)."""
+    path = VECTOR_DIR / MANIFEST_FILE
+    if not path.exists():
+        return {}
+    return json.loads(path.read_text(encoding="utf-8"))
+
+def publish_retrieval_files() -> None:
+    """
+    Mueve a VECTOR_DIR el índice léxico y los textos padre preparados por chunk.py. Se llama justo
+    antes de escribir el manifiesto: el vigilante del índice solo ve la versión completa.
+    """
+    if not LEXICAL_INDEX_PATH.exists():
+        return
+    os.replace(LEXICAL_INDEX_PATH, VECTOR_DIR / LEXICAL_INDEX_PATH.name)
+    # Sin textos padre preparados en la misma corrida, ninguna fuente usa parent_child
+    if PARENT_CHUNKS_PATH.exists():
+        os.replace(PARENT_CHUNKS_PATH, VECTOR_DIR / PARENT_CHUNKS_FILE)
+    else:
+        (VECTOR_DIR / PARENT_CHUNKS_FILE).unlink(missing_ok=True)
+
+def index_digest(model: str, chunk_hashes: dict[str, str]) -> str:
+    """Huella del contenido indexado: modelo + tipo de índice + (id, hash) de cada chunk + archivo de FAQs."""
+    h = hashlib.sha256(model.encode())
+    if FAISS_INDEX_TYPE != "flat":
+        h.update(f"{FAISS_INDEX_TYPE}:{FAISS_NLIST}:{FAISS_HNSW_M}:{FAISS_PQ_M}:{FAISS_PQ_NBITS}".encode())
+    for chunk_id in sorted(chunk_hashes):
+        h.update(f"{chunk_id}:{chunk_hashes[chunk_id]}".encode())
+    if FAQ_PATH.exists():
+        h.update(FAQ_PATH.read_bytes())
+    return h.hexdigest()
+
+def run_embed_and_index(openai_api_key: str | None = None, force: bool = False):
+    # 1) Backend de embeddings (OpenAI requiere API key; 'hashing' es local)
+    if EMBEDDING_BACKEND == "openai" and not (openai_api_key or os.getenv("OPENAI_API_KEY")):
         raise ValueError(
             "No se encontró OPENAI_API_KEY. Define la variable de entorno "
             "o pásala como parámetro a run_embed_and_index(openai_api_key=...)."
         )
+    embeddings = get_embeddings(api_key=openai_api_key)
 
     # 2) Cargar documentos
     docs = load_chunks()
     print(f" Cargando {len(docs)} documentos para embedding")
 
-    # 3) Instanciar embeddings
-    embeddings = OpenAIEmbeddings(api_key=SecretStr(api_key))
+    # 3) Claves de contenido para el almacén persistente
+    signature = embeddings_signature(embeddings)
+    model = embedding_model_name(embeddings)
+    texts = [d.page_content for d in docs]
+    chunk_hashes = {d.metadata["id"]: content_hash(d.page_content) for d in docs}
+    digest = index_digest(model, chunk_hashes)
+
+    # 4) Sin cambios desde la última construcción: no se toca el índice
+    manifest = read_manifest()
+    same_format = manifest.get("format", "legacy") == VECTORSTORE_FORMAT
+    if not force and manifest.get("digest") == digest and same_format and (VECTOR_DIR / "index.faiss").exists():
+        print(f" Vectorstore sin cambios ({len(docs)} chunks), se omite la reconstrucción")
+        # Mismos chunks, mismo contenido: el manifiesto no cambia y no se dispara una recarga
+        publish_retrieval_files()
+        return
+
+    # 5) Diferencias respecto al índice anterior (solo informativas)
+    prev_hashes_file = VECTOR_DIR / CHUNK_HASHES_FILE
+    prev_hashes = json.loads(prev_hashes_file.read_text(encoding="utf-8")) if prev_hashes_file.exists() else {}
+    added = [i for i in chunk_hashes if i not in prev_hashes]
+    changed = [i for i in chunk_hashes if i in prev_hashes and prev_hashes[i] != chunk_hashes[i]]
+    removed = [i for i in prev_hashes if i not in chunk_hashes]
+    print(f" Chunks nuevos: {len(added)}, modificados: {len(changed)}, eliminados: {len(removed)}")
 
-    # 4) Construir FAISS
-    vectordb = FAISS.from_documents(docs, embeddings)
+    # 6) Embeddings: solo los textos únicos nuevos van al backend.
+    # Lotes concurrentes con límite de TPM y reintentos para los textos nuevos
+    embedder = BatchEmbedder(embeddings)
+    store = EmbeddingStore(model=model)
+    try:
+        vectors, stats = embed_with_store(texts, embedder, store)
+        print(
+            f" Embeddings: {stats['n_unique']} textos únicos, "
+            f"{stats['n_reused']} reutilizados, {stats['n_embedded']} nuevos"
+        )
+
+        # 7) Reconstruir FAISS desde los vectores almacenados (ids eliminados ya no se incluyen).
+        # El tipo de índice (plano, IVF, HNSW, PQ/SQ) se elige con FAISS_INDEX_TYPE; la posición
+        # de cada vector coincide con la del documento en index_to_docstore_id.
+        t0 = time.perf_counter()
+        index, faiss_info = build_index(np.vstack(vectors))
+        faiss_info["build_seconds"] = round(time.perf_counter() - t0, 3)
+        faiss_info["size_bytes"] = index_size_bytes(index)
+        ids = [d.metadata["id"] for d in docs]
+        stored_docs = [Document(id=doc_id, page_content=d.page_content, metadata=d.metadata) for doc_id, d in zip(ids, docs)]
+        print(f" Índice FAISS {faiss_info['factory']} ({faiss_info['size_bytes'] / 1e6:.1f} MB)")
+
+        # 8) Guardar en disco: índice para mmap + docstore SQLite, o el formato pickle anterior
+        VECTOR_DIR.mkdir(parents=True, exist_ok=True)
+        if VECTORSTORE_FORMAT == "legacy":
+            FAISS(
+                embedding_function=embeddings,
+                index=index,
+                docstore=InMemoryDocstore(dict(zip(ids, stored_docs))),
+                index_to_docstore_id=dict(enumerate(ids))
+            ).save_local(str(VECTOR_DIR))
+            (VECTOR_DIR / DOCSTORE_FILE).unlink(missing_ok=True)
+        else:
+            save_mmap_vectorstore(VECTOR_DIR, index, ids, stored_docs)
+        print(f" Vectorstore guardado en: {VECTOR_DIR} (formato {VECTORSTORE_FORMAT})")
+
+        # 9) Tabla de respuestas de FAQs (fast path sin LLM)
+        n_faqs, faq_hashes = build_faq_table(embedder, store)
+
+        # 10) El almacén no crece sin límite: se eliminan los vectores que ya no usa el índice
+        # (chunks borrados o modificados, otros modelos) guardados hace más de la retención
+        pruned = store.prune(
+            set(chunk_hashes.values()) | faq_hashes,
+            older_than=time.time() - EMBEDDING_STORE_RETENTION_DAYS * 86400
+        )
+        if pruned:
+            print(f" Almacén de embeddings: {pruned} vectores obsoletos eliminados")
+    finally:
+        store.close()
 
-    # 5) Guardar en disco
-    VECTOR_DIR.mkdir(parents=True, exist_ok=True)
-    vectordb.save_local(str(VECTOR_DIR))
-    print(f" Vectorstore guardado en: {VECTOR_DIR}")
+    prev_hashes_file.write_text(json.dumps(chunk_hashes, ensure_ascii=False), encoding="utf-8")
+    # 11) Índice léxico y textos padre, y por último el manifiesto que marca la versión como completa
+    publish_retrieval_files()
+    (VECTOR_DIR / MANIFEST_FILE).write_text(json.dumps({
+        "digest": digest,
+        **signature,
+        "dimension": int(index.d),
+        "format": VECTORSTORE_FORMAT,
+        "faiss": faiss_info,
+        "n_docs": len(docs),
+        "built_at": time.time()
+    }, indent=2), encoding="utf-8")
 
-    # 6) Tracking en MLflow
+    # 12) Tracking en MLflow
     mlflow.set_experiment("vectorstore_build")
     with mlflow.start_run(run_name="build_vectordb"):
         mlflow.log_param("n_docs", len(docs))
         mlflow.log_param("vectordb_path", str(VECTOR_DIR))
+        mlflow.log_param("embedding_backend", signature["backend"])
+        mlflow.log_param("embedding_model", signature["model"])
+        mlflow.log_param("faiss_index", faiss_info["factory"])
+        mlflow.log_param("n_faqs", n_faqs)
+        mlflow.log_param("n_embedded", stats["n_embedded"])
+        mlflow.log_param("n_reused", stats["n_reused"])
+        mlflow.log_param("embed_batch_size", embedder.batch_size)
+        mlflow.log_param("embed_max_concurrency", embedder.max_concurrency)
+        if embedder.last_stats:
+            mlflow.log_metric("embed_chunks_per_second", embedder.last_stats["chunks_per_second"])
         # Taguear commit de Git
         mlflow.set_tag("git_commit", get_git_commit())
 
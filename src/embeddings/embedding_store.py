@@ -0,0 +1,128 @@
+import hashlib
+import os
+import sqlite3
+import time
+from pathlib import Path
+from typing import Iterable, Optional, Sequence
+
+import numpy as np
+
+from src.embeddings.batch_embedder import EMBED_BATCH_SIZE, BatchEmbedder
+
+EMBEDDING_STORE_PATH = Path(os.getenv("EMBEDDING_STORE_PATH", "data/processed/embedding_store.sqlite"))
+# Los vectores que ya no corresponden al índice vigente se conservan este tiempo (p. ej. los de rag_evaluate)
+EMBEDDING_STORE_RETENTION_DAYS = float(os.getenv("EMBEDDING_STORE_RETENTION_DAYS", "30"))
+
+
+def content_hash(text: str) -> str:
+    """Hash SHA-256 del texto, usado como clave de contenido."""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def embedding_model_name(embeddings) -> str:
+    """Nombre del modelo de embeddings, parte de la clave del almacén."""
+    return getattr(embeddings, "model", None) or type(embeddings).__name__
+
+
+class EmbeddingStore:
+    """
+    Almacén persistente de embeddings direccionado por contenido (SQLite).
+    La clave es (hash del texto, modelo): un texto idéntico se embebe una sola vez
+    y los chunks sin cambios se reutilizan entre ejecuciones.
+    """
+
+    def __init__(self, model: str, path: str | Path = EMBEDDING_STORE_PATH):
+        self.model = model
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(str(self.path))
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS embeddings (
+                content_hash TEXT NOT NULL,
+                model TEXT NOT NULL,
+                dim INTEGER NOT NULL,
+                vector BLOB NOT NULL,
+                created_at REAL NOT NULL,
+                PRIMARY KEY (content_hash, model)
+            )
+            """
+        )
+        self._conn.commit()
+
+    def get_many(self, hashes: Iterable[str]) -> dict[str, np.ndarray]:
+        """Devuelve los vectores almacenados para los hashes dados (los ausentes se omiten)."""
+        found: dict[str, np.ndarray] = {}
+        hashes = list(hashes)
+        # SQLite limita el número de parámetros por consulta
+        for i in range(0, len(hashes), 500):
+            batch = hashes[i:i + 500]
+            placeholders = ",".join("?" * len(batch))
+            rows = self._conn.execute(
+                f"SELECT content_hash, vector FROM embeddings WHERE model = ? AND content_hash IN ({placeholders})",
+                [self.model, *batch]
+            )
+            for h, blob in rows:
+                found[h] = np.frombuffer(blob, dtype=np.float32)
+        return found
+
+    def put_many(self, vectors: dict[str, Sequence[float]]) -> None:
+        now = time.time()
+        rows = []
+        for h, vec in vectors.items():
+            arr = np.asarray(vec, dtype=np.float32)
+            rows.append((h, self.model, int(arr.shape[0]), arr.tobytes(), now))
+        self._conn.executemany("INSERT OR REPLACE INTO embeddings VALUES (?, ?, ?, ?, ?)", rows)
+        self._conn.commit()
+
+    def prune(self, keep_hashes: Iterable[str], older_than: Optional[float] = None) -> int:
+        """
+        Elimina los vectores que ya no corresponden a ningún texto vigente del modelo actual, y los de
+        otros modelos. Con `older_than` (timestamp) solo se eliminan los guardados antes de esa fecha.
+        """
+        self._conn.execute("CREATE TEMP TABLE IF NOT EXISTS keep (content_hash TEXT PRIMARY KEY)")
+        self._conn.execute("DELETE FROM keep")
+        self._conn.executemany("INSERT OR IGNORE INTO keep VALUES (?)", ((h,) for h in keep_hashes))
+        cur = self._conn.execute(
+            "DELETE FROM embeddings WHERE (model != ? OR content_hash NOT IN (SELECT content_hash FROM keep)) "
+            "AND created_at < ?",
+            (self.model, older_than if older_than is not None else float("inf"))
+        )
+        self._conn.commit()
+        return cur.rowcount
+
+    def close(self) -> None:
+        self._conn.close()
+
+
+def embed_with_store(texts: Sequence[str], embeddings, store: EmbeddingStore) -> tuple[list[np.ndarray], dict]:
+    """
+    Embebe `texts` usando el almacén: solo los textos únicos que no estén almacenados
+    se envían a la API. Cada lote se guarda al terminar, así un fallo a mitad de una corrida
+    grande no pierde los embeddings ya pagados. Devuelve los vectores en el mismo orden y
+    estadísticas de reutilización.
+    """
+    hashes = [content_hash(t) for t in texts]
+    unique: dict[str, str] = dict(zip(hashes, texts))
+    cached = store.get_many(unique.keys())
+    missing = [h for h in unique if h not in cached]
+
+    def save(start: int, vectors: list[list[float]]) -> None:
+        fresh = dict(zip(missing[start:start + len(vectors)], vectors))
+        store.put_many(fresh)
+        cached.update({h: np.asarray(v, dtype=np.float32) for h, v in fresh.items()})
+
+    missing_texts = [unique[h] for h in missing]
+    if isinstance(embeddings, BatchEmbedder):
+        embeddings.embed_documents(missing_texts, on_batch=save)
+    else:
+        for start in range(0, len(missing_texts), EMBED_BATCH_SIZE):
+            save(start, embeddings.embed_documents(missing_texts[start:start + EMBED_BATCH_SIZE]))
+
+    stats = {
+        "n_texts": len(texts),
+        "n_unique": len(unique),
+        "n_reused": len(unique) - len(missing),
+        "n_embedded": len(missing)
+    }
+    return [cached[h] for h in hashes], stats
@@ -0,0 +1,115 @@
+import math
+import os
+from typing import Any, Dict, Optional
+import logging
+
+import faiss
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Parámetros de entorno
+FAISS_INDEX_TYPE = os.getenv("FAISS_INDEX_TYPE", "flat")  # flat | ivf | hnsw | ivfpq | ivfsq | sq8
+FAISS_NLIST = int(os.getenv("FAISS_NLIST", "0"))  # 0 = automático (~4·sqrt(n))
+FAISS_NPROBE = int(os.getenv("FAISS_NPROBE", "8"))
+FAISS_HNSW_M = int(os.getenv("FAISS_HNSW_M", "32"))
+FAISS_EF_CONSTRUCTION = int(os.getenv("FAISS_EF_CONSTRUCTION", "200"))
+FAISS_EF_SEARCH = int(os.getenv("FAISS_EF_SEARCH", "64"))
+FAISS_PQ_M = int(os.getenv("FAISS_PQ_M", "0"))  # 0 = automático (dim/8, divisor de dim)
+FAISS_PQ_NBITS = int(os.getenv("FAISS_PQ_NBITS", "8"))
+
+INDEX_TYPES = ("flat", "ivf", "hnsw", "ivfpq", "ivfsq", "sq8")
+# FAISS recomienda al menos ~39 vectores de entrenamiento por centroide
+MIN_POINTS_PER_CENTROID = 39
+
+
+def auto_nlist(n: int) -> int:
+    return max(1, min(int(4 * math.sqrt(n)), n // MIN_POINTS_PER_CENTROID))
+
+
+def auto_pq_m(dim: int) -> int:
+    """Mayor divisor de `dim` que no supera dim/8 (subvectores de al menos 8 dimensiones)."""
+    target = max(1, dim // 8)
+    return next(m for m in range(target, 0, -1) if dim % m == 0)
+
+
+def index_factory_string(index_type: str, n: int, dim: int, nlist: int = FAISS_NLIST,
+                         hnsw_m: int = FAISS_HNSW_M, pq_m: int = FAISS_PQ_M,
+                         pq_nbits: int = FAISS_PQ_NBITS) -> str:
+    """Descripción `faiss.index_factory` del tipo de índice configurado."""
+    nlist = nlist or auto_nlist(n)
+    if index_type == "flat":
+        return "Flat"
+    if index_type == "ivf":
+        return f"IVF{nlist},Flat"
+    if index_type == "hnsw":
+        return f"HNSW{hnsw_m},Flat"
+    if index_type == "ivfpq":
+        return f"IVF{nlist},PQ{pq_m or auto_pq_m(dim)}x{pq_nbits}"
+    if index_type == "ivfsq":
+        return f"IVF{nlist},SQ8"
+    if index_type == "sq8":
+        return "SQ8"
+    raise ValueError(f"FAISS_INDEX_TYPE inválido: {index_type} (usa {', '.join(INDEX_TYPES)})")
+
+
+def min_training_points(index_type: str, factory: str, pq_nbits: int = FAISS_PQ_NBITS) -> int:
+    """Vectores necesarios para entrenar el índice sin degradar los centroides."""
+    needed = 0
+    if factory.startswith("IVF"):
+        needed = int(factory[3:factory.index(",")]) * MIN_POINTS_PER_CENTROID
+    if index_type == "ivfpq":
+        needed = max(needed, (2 ** pq_nbits) * MIN_POINTS_PER_CENTROID)
+    return needed
+
+
+def set_search_params(index: faiss.Index, nprobe: int = FAISS_NPROBE, ef_search: int = FAISS_EF_SEARCH) -> None:
+    """Ajusta los parámetros de búsqueda (recall vs. latencia) sin reconstruir el índice."""
+    try:
+        faiss.extract_index_ivf(index).nprobe = nprobe
+    except (RuntimeError, AttributeError):
+        pass
+    hnsw = getattr(faiss.downcast_index(index), "hnsw", None)
+    if hnsw is not None:
+        hnsw.efSearch = ef_search
+
+
+def build_index(vectors: np.ndarray, index_type: str = FAISS_INDEX_TYPE, **params) -> tuple[faiss.Index, Dict[str, Any]]:
+    """
+    Construye un índice L2 del tipo pedido con los vectores en el mismo orden (posición = fila).
+    Si hay muy pocos vectores para entrenar IVF/PQ se usa el índice plano, que además es exacto.
+    Devuelve el índice y su descripción para el manifiesto.
+    """
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+    n, dim = vectors.shape
+    factory = index_factory_string(index_type, n, dim, **{k: v for k, v in params.items()
+                                                          if k in ("nlist", "hnsw_m", "pq_m", "pq_nbits")})
+    needed = min_training_points(index_type, factory, params.get("pq_nbits", FAISS_PQ_NBITS))
+    if n < needed:
+        logger.warning(f"{n} vectores no bastan para entrenar {factory} (mínimo {needed}), se usa Flat")
+        index_type, factory = "flat", "Flat"
+
+    index = faiss.index_factory(dim, factory, faiss.METRIC_L2)
+    hnsw = getattr(faiss.downcast_index(index), "hnsw", None)
+    if hnsw is not None:
+        hnsw.efConstruction = params.get("ef_construction", FAISS_EF_CONSTRUCTION)
+    if not index.is_trained:
+        index.train(vectors)
+    index.add(vectors)
+    nprobe = params.get("nprobe", FAISS_NPROBE)
+    ef_search = params.get("ef_search", FAISS_EF_SEARCH)
+    set_search_params(index, nprobe, ef_search)
+    return index, {"index_type": index_type, "factory": factory, "nprobe": nprobe, "ef_search": ef_search}
+
+
+def index_size_bytes(index: faiss.Index) -> int:
+    """Tamaño serializado del índice (aproxima su memoria residente)."""
+    return int(faiss.serialize_index(index).nbytes)
+
+
+def apply_manifest_search_params(index: faiss.Index, manifest: Optional[Dict[str, Any]]) -> None:
+    """Parámetros de búsqueda al cargar: el entorno (FAISS_NPROBE/FAISS_EF_SEARCH) prevalece sobre el manifiesto."""
+    manifest = (manifest or {}).get("faiss", {})
+    nprobe = int(os.getenv("FAISS_NPROBE", manifest.get("nprobe", FAISS_NPROBE)))
+    ef_search = int(os.getenv("FAISS_EF_SEARCH", manifest.get("ef_search", FAISS_EF_SEARCH)))
+    set_search_params(index, nprobe, ef_search)
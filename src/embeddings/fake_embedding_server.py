@@ -0,0 +1,95 @@
+"""
+Servidor local compatible con `POST /v1/embeddings` de OpenAI, para pruebas y benchmarks offline.
+
+Uso:
+    python -m src.embeddings.fake_embedding_server --port 8765 --latency-ms 50
+    OPENAI_BASE_URL=http://localhost:8765/v1 python -m src.embeddings.batch_embedder --n 10000
+"""
+import argparse
+import base64
+import hashlib
+import json
+import random
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+
+def fake_vector(text: str, dim: int) -> np.ndarray:
+    """Vector unitario determinista derivado del hash del texto."""
+    seed = int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:8], "little")
+    vec = np.random.default_rng(seed).standard_normal(dim).astype(np.float32)
+    return vec / np.linalg.norm(vec)
+
+
+def make_handler(dim: int, latency_ms: float, per_item_ms: float, error_rate: float):
+    class FakeEmbeddingHandler(BaseHTTPRequestHandler):
+        def log_message(self, format, *args):
+            pass
+
+        def _send(self, status: int, payload: dict):
+            body = json.dumps(payload).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_POST(self):
+            if not self.path.rstrip("/").endswith("/embeddings"):
+                self._send(404, {"error": {"message": "not found"}})
+                return
+            length = int(self.headers.get("Content-Length", 0))
+            req = json.loads(self.rfile.read(length) or b"{}")
+            inputs = req.get("input", [])
+            if isinstance(inputs, str) or (inputs and isinstance(inputs[0], int)):
+                inputs = [inputs]
+
+            if random.random() < error_rate:
+                self._send(429, {"error": {"message": "Rate limit reached (simulado)", "type": "rate_limit"}})
+                return
+            time.sleep((latency_ms + per_item_ms * len(inputs)) / 1000)
+
+            data = []
+            n_tokens = 0
+            for idx, item in enumerate(inputs):
+                # langchain envía listas de tokens (tiktoken) o strings según la configuración
+                key = item if isinstance(item, str) else ",".join(map(str, item))
+                n_tokens += len(item) if not isinstance(item, str) else max(1, len(item) // 4)
+                vec = fake_vector(key, dim)
+                if req.get("encoding_format") == "base64":
+                    embedding = base64.b64encode(vec.tobytes()).decode("ascii")
+                else:
+                    embedding = vec.tolist()
+                data.append({"object": "embedding", "index": idx, "embedding": embedding})
+
+            self._send(200, {
+                "object": "list",
+                "data": data,
+                "model": req.get("model", "fake-embedding"),
+                "usage": {"prompt_tokens": n_tokens, "total_tokens": n_tokens}
+            })
+
+    return FakeEmbeddingHandler
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Servidor falso de embeddings compatible con OpenAI")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--dim", type=int, default=1536, help="Dimensión de los vectores")
+    parser.add_argument("--latency-ms", type=float, default=50, help="Latencia fija por petición")
+    parser.add_argument("--per-item-ms", type=float, default=0.2, help="Latencia adicional por texto")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fracción de peticiones con 429 simulado")
+    args = parser.parse_args()
+
+    server = ThreadingHTTPServer(
+        (args.host, args.port),
+        make_handler(args.dim, args.latency_ms, args.per_item_ms, args.error_rate)
+    )
+    print(f" Servidor falso de embeddings en http://{args.host}:{args.port}/v1")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.shutdown()
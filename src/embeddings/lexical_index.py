@@ -0,0 +1,129 @@
+import json
+import math
+from collections import Counter, defaultdict
+from pathlib import Path
+from typing import Any, Dict, List
+
+import numpy as np
+
+from src.utils.text import normalize_text
+
+LEXICAL_INDEX_FILE = "lexical_index.json"
+
+# Palabras vacías del español (ya normalizadas: sin tildes)
+SPANISH_STOPWORDS = {
+    "a", "al", "algo", "como", "con", "cual", "cuales", "cuando", "de", "del", "donde", "el", "ella",
+    "en", "es", "esa", "ese", "esta", "este", "esto", "hay", "la", "las", "le", "les", "lo", "los",
+    "me", "mi", "mis", "muy", "no", "nos", "o", "para", "pero", "por", "que", "se", "si", "sin", "su",
+    "sus", "te", "tu", "tus", "un", "una", "uno", "unos", "unas", "y", "ya", "yo", "puedo", "puede",
+    "tienen", "tiene", "son", "estan", "ser", "hacer", "quiero", "saber", "cuanto", "cuanta"
+}
+
+
+def _stem(token: str) -> str:
+    """Stemming ligero para plurales en español (sucursales -> sucursal, horarios -> horario)."""
+    if len(token) > 5 and token.endswith("es") and token[-3] in "lrndzj":
+        return token[:-2]
+    if len(token) > 3 and token.endswith("s"):
+        return token[:-1]
+    return token
+
+
+def tokenize(text: str) -> List[str]:
+    """Tokeniza sin tildes ni mayúsculas, descartando palabras vacías."""
+    return [_stem(t) for t in normalize_text(text).split() if t not in SPANISH_STOPWORDS]
+
+
+class BM25Index:
+    """
+    Índice invertido BM25 sobre los chunks. Se construye en el chunking y se guarda en JSON
+    junto con el texto y metadatos de cada chunk, de modo que la búsqueda léxica no necesita el docstore.
+    """
+
+    def __init__(self, docs: List[Dict[str, Any]], postings: Dict[str, List[List[int]]],
+                 doc_lens: List[int], k1: float = 1.5, b: float = 0.75):
+        self.docs = docs
+        self.k1 = k1
+        self.b = b
+        self.doc_lens = np.asarray(doc_lens, dtype=np.float32)
+        self.avgdl = float(self.doc_lens.mean()) if len(doc_lens) else 0.0
+        n = len(docs)
+        self.idf: Dict[str, float] = {}
+        self._postings: Dict[str, tuple[np.ndarray, np.ndarray]] = {}
+        for term, plist in postings.items():
+            arr = np.asarray(plist, dtype=np.int64)
+            self._postings[term] = (arr[:, 0], arr[:, 1].astype(np.float32))
+            df = len(plist)
+            self.idf[term] = math.log(1 + (n - df + 0.5) / (df + 0.5))
+        self._raw_postings = postings
+
+    @staticmethod
+    def index_text(doc: Dict[str, Any]) -> str:
+        # La sección se indexa con el texto: los chunks de horarios solo nombran la sucursal ahí
+        return f"{doc.get('section', '')} {doc['text']}"
+
+    @classmethod
+    def build(cls, docs: List[Dict[str, Any]], **kwargs) -> "BM25Index":
+        postings: Dict[str, List[List[int]]] = defaultdict(list)
+        doc_lens = []
+        for idx, doc in enumerate(docs):
+            tokens = tokenize(cls.index_text(doc))
+            doc_lens.append(len(tokens))
+            for term, tf in Counter(tokens).items():
+                postings[term].append([idx, tf])
+        return cls(docs, dict(postings), doc_lens, **kwargs)
+
+    def save(self, path: Path) -> None:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(json.dumps({
+            "k1": self.k1,
+            "b": self.b,
+            "docs": self.docs,
+            "doc_lens": self.doc_lens.astype(int).tolist(),
+            "postings": self._raw_postings
+        }, ensure_ascii=False), encoding="utf-8")
+
+    @classmethod
+    def load(cls, path: Path) -> "BM25Index":
+        data = json.loads(Path(path).read_text(encoding="utf-8"))
+        return cls(data["docs"], data["postings"], data["doc_lens"], k1=data["k1"], b=data["b"])
+
+    def scores(self, query: str) -> tuple[np.ndarray, np.ndarray, float]:
+        """
+        Puntajes BM25 de todos los documentos, masa de idf de la consulta cubierta por cada documento
+        y fracción de términos de la consulta presentes en el vocabulario.
+        """
+        terms = set(tokenize(query))
+        scores = np.zeros(len(self.docs), dtype=np.float32)
+        covered = np.zeros(len(self.docs), dtype=np.float32)
+        known_idf = 0.0
+        n_known = 0
+        for term in terms:
+            posting = self._postings.get(term)
+            if posting is None:
+                continue
+            doc_idx, tf = posting
+            idf = self.idf[term]
+            norm = self.k1 * (1 - self.b + self.b * self.doc_lens[doc_idx] / self.avgdl)
+            scores[doc_idx] += idf * tf * (self.k1 + 1) / (tf + norm)
+            covered[doc_idx] += idf
+            known_idf += idf
+            n_known += 1
+        if known_idf:
+            covered /= known_idf
+        return scores, covered, n_known / len(terms) if terms else 0.0
+
+    def search(self, query: str, k: int = 5) -> tuple[List[tuple[Dict[str, Any], float]], float]:
+        """
+        Top-k (documento, puntaje) y confianza en [0, 1] del mejor resultado: qué parte de la consulta
+        (ponderada por idf) cubre, penalizada por los términos que no existen en el corpus.
+        """
+        scores, covered, known_fraction = self.scores(query)
+        if not known_fraction:
+            return [], 0.0
+        k = min(k, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        hits = [(self.docs[i], float(scores[i])) for i in top if scores[i] > 0]
+        confidence = float(covered[top[0]]) * known_fraction if hits else 0.0
+        return hits, confidence
@@ -0,0 +1,252 @@
+import argparse
+import asyncio
+import logging
+import os
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import List
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from src.utils.tracing import get_collector
+
+logger = logging.getLogger(__name__)
+
+# Parámetros de entorno
+QUERY_EMBED_BATCHING = os.getenv("QUERY_EMBED_BATCHING", "true").lower() == "true"
+QUERY_EMBED_MAX_WAIT_MS = float(os.getenv("QUERY_EMBED_MAX_WAIT_MS", "10"))
+QUERY_EMBED_MAX_BATCH = int(os.getenv("QUERY_EMBED_MAX_BATCH", "64"))
+QUERY_EMBED_MAX_INFLIGHT = int(os.getenv("QUERY_EMBED_MAX_INFLIGHT", "4"))
+QUERY_EMBED_TIMEOUT = float(os.getenv("QUERY_EMBED_TIMEOUT", "60"))
+# Esperas recientes con las que se calculan los percentiles de `stats()`
+STATS_WINDOW = 10000
+
+
+class BatchingEmbeddings(Embeddings):
+    """
+    Agrupa los `embed_query` concurrentes de todas las sesiones del proceso en una sola llamada
+    `embed_documents`: el primer pedido abre una ventana de `max_wait_ms` y el lote sale al cerrarse
+    o al llegar a `max_batch_size`. Cada llamador recibe su vector; los textos repetidos se embeben
+    una vez. Con `max_wait_ms=0` las consultas van directo al modelo, como antes.
+    `embed_documents` (indexación, tablas de FAQs) no se agrupa.
+    """
+
+    def __init__(
+        self,
+        embeddings: Embeddings,
+        max_wait_ms: float = QUERY_EMBED_MAX_WAIT_MS,
+        max_batch_size: int = QUERY_EMBED_MAX_BATCH,
+        max_inflight: int = QUERY_EMBED_MAX_INFLIGHT,
+        timeout: float = QUERY_EMBED_TIMEOUT
+    ):
+        self.embeddings = embeddings
+        self.max_wait_ms = max_wait_ms
+        self.max_batch_size = max_batch_size
+        self.max_inflight = max_inflight
+        self.timeout = timeout
+        self._queue: queue.Queue = queue.Queue()
+        # Llamadas en curso: mientras están todas ocupadas la cola sigue creciendo y el siguiente lote es mayor
+        self._slots = threading.Semaphore(max_inflight)
+        self._pool: ThreadPoolExecutor | None = None
+        self._start_lock = threading.Lock()
+        self._closed = False
+        self._stats_lock = threading.Lock()
+        # Contadores acumulados y una ventana acotada de esperas: el proceso puede vivir indefinidamente
+        self._batches = 0
+        self._queries = 0
+        self._unique = 0
+        self._max_batch = 0
+        self._call_seconds = 0.0
+        self._waits: deque[float] = deque(maxlen=STATS_WINDOW)
+
+    @property
+    def model(self) -> str:
+        return getattr(self.embeddings, "model", None) or type(self.embeddings).__name__
+
+    def _submit(self, text: str) -> Future | None:
+        """Encola la consulta; None si el agrupador ya se cerró (la consulta va directo al modelo)."""
+        future: Future = Future()
+        with self._start_lock:
+            if self._closed:
+                return None
+            # Hilo colector perezoso: cada worker de uvicorn arranca el suyo después del fork
+            if self._pool is None:
+                self._pool = ThreadPoolExecutor(max_workers=self.max_inflight, thread_name_prefix="query-embed")
+                threading.Thread(target=self._collect, name="query-embed-collector", daemon=True).start()
+            self._queue.put((text, future, time.perf_counter()))
+        return future
+
+    def close(self) -> None:
+        """
+        Detiene el colector y el pool cuando se reemplaza el índice. Las consultas ya encoladas se
+        atienden; las que lleguen después (consultas en curso sobre el índice anterior) van directo al modelo.
+        """
+        with self._start_lock:
+            if self._closed:
+                return
+            self._closed = True
+            if self._pool is not None:
+                self._queue.put(None)
+
+    def _collect(self) -> None:
+        stopping = False
+        while not stopping:
+            item = self._queue.get()
+            if item is None:
+                break
+            batch = [item]
+            self._slots.acquire()
+            deadline = batch[0][2] + self.max_wait_ms / 1000
+            while len(batch) < self.max_batch_size:
+                timeout = deadline - time.perf_counter()
+                try:
+                    item = self._queue.get(timeout=timeout) if timeout > 0 else self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is None:
+                    stopping = True
+                    break
+                batch.append(item)
+            # Las consultas canceladas mientras esperaban (cliente desconectado, timeout) no se embeben
+            batch = [item for item in batch if item[1].set_running_or_notify_cancel()]
+            if not batch:
+                self._slots.release()
+                continue
+            self._pool.submit(self._embed_batch, batch)
+        # Los lotes ya enviados terminan; luego los hilos del pool salen
+        self._pool.shutdown(wait=False)
+
+    def _embed_batch(self, batch: list[tuple[str, Future, float]]) -> None:
+        dispatched = time.perf_counter()
+        try:
+            texts = list(dict.fromkeys(text for text, _, _ in batch))
+            try:
+                vectors = dict(zip(texts, self.embeddings.embed_documents(texts)))
+            except Exception as e:
+                logger.warning(f"Error al embeber lote de {len(batch)} consultas: {e}")
+                for _, future, _ in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                return
+            for text, future, _ in batch:
+                if not future.done():
+                    future.set_result(vectors[text])
+            self._record(batch, len(texts), dispatched, time.perf_counter() - dispatched)
+        finally:
+            self._slots.release()
+
+    def _record(self, batch: list[tuple[str, Future, float]], unique: int, dispatched: float, call_s: float) -> None:
+        waits = [dispatched - enqueued for _, _, enqueued in batch]
+        with self._stats_lock:
+            self._batches += 1
+            self._queries += len(batch)
+            self._unique += unique
+            self._max_batch = max(self._max_batch, len(batch))
+            self._call_seconds += call_s
+            self._waits.extend(waits)
+        collector = get_collector()
+        collector.increment("embedding_batches")
+        collector.increment("embedding_batch_queries", len(batch))
+        collector.observe("embedding_batch_call", call_s)
+        for wait in waits:
+            collector.observe("embedding_batch_wait", wait)
+
+    def stats(self) -> dict:
+        """
+        Tamaño de lote frente a latencia: espera en la ventana y duración de cada llamada al modelo.
+        Los percentiles de espera son de las últimas STATS_WINDOW consultas.
+        """
+        with self._stats_lock:
+            if not self._batches:
+                return {"batches": 0, "queries": 0}
+            waits = np.fromiter(self._waits, dtype=np.float64, count=len(self._waits))
+            return {
+                "batches": self._batches,
+                "queries": self._queries,
+                "unique_texts": self._unique,
+                "mean_batch_size": self._queries / self._batches,
+                "max_batch_size": self._max_batch,
+                "wait_p50_ms": float(np.percentile(waits, 50) * 1000),
+                "wait_p95_ms": float(np.percentile(waits, 95) * 1000),
+                "call_mean_ms": self._call_seconds / self._batches * 1000
+            }
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.embeddings.embed_documents(texts)
+
+    def embed_query(self, text: str) -> List[float]:
+        if self.max_wait_ms <= 0:
+            return self.embeddings.embed_query(text)
+        future = self._submit(text)
+        if future is None:
+            return self.embeddings.embed_query(text)
+        # Tope de seguridad: si el lote nunca se resuelve, la sesión recibe un error en lugar de colgarse
+        return future.result(timeout=self.timeout)
+
+    async def aembed_query(self, text: str) -> List[float]:
+        if self.max_wait_ms <= 0:
+            return await asyncio.to_thread(self.embeddings.embed_query, text)
+        future = self._submit(text)
+        if future is None:
+            return await asyncio.to_thread(self.embeddings.embed_query, text)
+        return await asyncio.wait_for(asyncio.wrap_future(future), self.timeout)
+
+
+def run_benchmark(callers: int, queries: int, latency_ms: float, jitter: float, waits: list[float]) -> list[dict]:
+    """Consultas concurrentes contra embeddings falsos con latencia fija por llamada a la API."""
+    from src.utils.stubs import StubEmbeddings
+
+    texts = [f"¿Cuál es el horario de la sucursal {i % 40} el día {i % 7}?" for i in range(callers * queries)]
+    rows = []
+    for wait in waits:
+        inner = StubEmbeddings(latency_ms=latency_ms, jitter=jitter)
+        embedder = BatchingEmbeddings(inner, max_wait_ms=wait)
+        latencies: list[float] = []
+        lock = threading.Lock()
+
+        def caller(offset: int) -> None:
+            for text in texts[offset::callers]:
+                t0 = time.perf_counter()
+                embedder.embed_query(text)
+                with lock:
+                    latencies.append(time.perf_counter() - t0)
+
+        t0 = time.perf_counter()
+        threads = [threading.Thread(target=caller, args=(i,)) for i in range(callers)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        elapsed = time.perf_counter() - t0
+
+        stats = embedder.stats()
+        row = {
+            "max_wait_ms": wait,
+            "api_calls": stats["batches"] if wait > 0 else len(texts),
+            "mean_batch_size": stats.get("mean_batch_size", 1.0),
+            "queries_per_second": len(texts) / elapsed,
+            "p50_ms": float(np.percentile(latencies, 50) * 1000),
+            "p95_ms": float(np.percentile(latencies, 95) * 1000)
+        }
+        rows.append(row)
+        print(
+            f" ventana {wait:>4.0f} ms: {row['api_calls']:>5} llamadas (lote medio {row['mean_batch_size']:.1f}), "
+            f"{row['queries_per_second']:>7.1f} consultas/s, p50/p95 {row['p50_ms']:.0f}/{row['p95_ms']:.0f} ms"
+        )
+    return rows
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark del agrupamiento de embeddings de consultas entre sesiones")
+    parser.add_argument("--callers", type=int, default=32, help="Sesiones concurrentes")
+    parser.add_argument("--queries", type=int, default=20, help="Consultas por sesión")
+    parser.add_argument("--latency-ms", type=float, default=80, help="Latencia por llamada a la API de embeddings")
+    parser.add_argument("--jitter", type=float, default=0.0, help="Sigma log-normal de la latencia")
+    parser.add_argument("--waits", type=float, nargs="+", default=[0, 5, 10, 20], help="Ventanas a comparar (ms)")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    run_benchmark(args.callers, args.queries, args.latency_ms, args.jitter, args.waits)
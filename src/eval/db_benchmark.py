@@ -0,0 +1,186 @@
+import argparse
+import asyncio
+import json
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+from sqlalchemy import insert
+from sqlalchemy.ext.asyncio import async_sessionmaker
+from sqlalchemy.orm import sessionmaker
+
+from src.db.async_database import aget_cliente_por_identificacion, make_async_engine, to_async_url
+from src.db.database import Base, Cliente, ClienteInfo, get_cliente_por_identificacion, make_engine
+
+RESULTS_PATH = Path("data/metrics/db_benchmark.json")
+MODES = ("sync_threads", "sync_in_loop", "async")
+
+
+def seed_database(url: str, customers: int) -> list[str]:
+    """Base temporal con `customers` clientes; devuelve sus identificaciones."""
+    engine = make_engine(url)
+    Base.metadata.create_all(bind=engine)
+    ids = [str(10_000_000 + i) for i in range(customers)]
+    now = datetime.utcnow()
+    with engine.begin() as conn:
+        conn.execute(insert(Cliente), [
+            {"identificacion": i, "nombre": "Cliente Prueba", "telefono": "3001234567",
+             "email": f"cliente{i}@correo.com", "fecha_registro": now}
+            for i in ids
+        ])
+    engine.dispose()
+    return ids
+
+
+def summarize(latencies: list[float], seconds: float) -> dict:
+    ms = np.array(latencies) * 1000
+    return {
+        "logins": len(latencies),
+        "seconds": seconds,
+        "logins_per_second": len(latencies) / seconds,
+        "p50_ms": float(np.percentile(ms, 50)),
+        "p95_ms": float(np.percentile(ms, 95)),
+        "p99_ms": float(np.percentile(ms, 99))
+    }
+
+
+def run_sync_threads(url: str, ids: list[str], concurrency: int, db_latency_ms: float) -> dict:
+    """Camino síncrono actual: un hilo por login concurrente, sesión del pool por login."""
+    engine = make_engine(url)
+    factory = sessionmaker(bind=engine, autoflush=False)
+
+    def login(identificacion: str) -> float:
+        t0 = time.perf_counter()
+        with factory() as db:
+            if db_latency_ms:
+                time.sleep(db_latency_ms / 1000)
+            found = get_cliente_por_identificacion(db, identificacion)
+            ClienteInfo.from_model(found)
+        return time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        latencies = list(pool.map(login, ids))
+    result = summarize(latencies, time.perf_counter() - t0)
+    engine.dispose()
+    return result
+
+
+async def _loop_lag(stop: asyncio.Event, interval: float = 0.001) -> float:
+    """Retraso máximo del event loop: cuánto tarda en despertar un sleep de `interval`."""
+    worst = 0.0
+    while not stop.is_set():
+        t0 = time.perf_counter()
+        await asyncio.sleep(interval)
+        worst = max(worst, time.perf_counter() - t0 - interval)
+    return worst
+
+
+async def _run_in_loop(login, ids: list[str], concurrency: int) -> dict:
+    semaphore = asyncio.Semaphore(concurrency)
+    stop = asyncio.Event()
+    lag = asyncio.create_task(_loop_lag(stop))
+
+    async def bounded(identificacion: str) -> float:
+        async with semaphore:
+            return await login(identificacion)
+
+    t0 = time.perf_counter()
+    latencies = await asyncio.gather(*(bounded(i) for i in ids))
+    result = summarize(latencies, time.perf_counter() - t0)
+    stop.set()
+    result["max_loop_lag_ms"] = await lag * 1000
+    return result
+
+
+def run_sync_in_loop(url: str, ids: list[str], concurrency: int, db_latency_ms: float) -> dict:
+    """Lo que haría un front end asíncrono llamando a las funciones síncronas: bloquea el event loop."""
+    engine = make_engine(url)
+    factory = sessionmaker(bind=engine, autoflush=False)
+
+    async def login(identificacion: str) -> float:
+        t0 = time.perf_counter()
+        with factory() as db:
+            if db_latency_ms:
+                time.sleep(db_latency_ms / 1000)
+            found = get_cliente_por_identificacion(db, identificacion)
+            ClienteInfo.from_model(found)
+        await asyncio.sleep(0)
+        return time.perf_counter() - t0
+
+    result = asyncio.run(_run_in_loop(login, ids, concurrency))
+    engine.dispose()
+    return result
+
+
+def run_async(url: str, ids: list[str], concurrency: int, db_latency_ms: float) -> dict:
+    """Camino asíncrono: AsyncSession sobre aiosqlite, el loop sigue atendiendo mientras espera."""
+
+    async def main() -> dict:
+        engine = make_async_engine(to_async_url(url))
+        factory = async_sessionmaker(engine, expire_on_commit=False, autoflush=False)
+
+        async def login(identificacion: str) -> float:
+            t0 = time.perf_counter()
+            async with factory() as db:
+                if db_latency_ms:
+                    await asyncio.sleep(db_latency_ms / 1000)
+                found = await aget_cliente_por_identificacion(db, identificacion)
+                ClienteInfo.from_model(found)
+            return time.perf_counter() - t0
+
+        try:
+            return await _run_in_loop(login, ids, concurrency)
+        finally:
+            await engine.dispose()
+
+    return asyncio.run(main())
+
+
+RUNNERS = {"sync_threads": run_sync_threads, "sync_in_loop": run_sync_in_loop, "async": run_async}
+
+
+def run_db_benchmark(customers: int, logins: int, concurrency: list[int], db_latency_ms: float,
+                     output: Path = RESULTS_PATH, seed: int = 0) -> list[dict]:
+    """
+    Compara el throughput de logins concurrentes (búsqueda por identificación, sin la caché de clientes)
+    entre el camino síncrono con hilos, el síncrono dentro de un event loop y el asíncrono.
+    `db_latency_ms` simula la ida y vuelta de una base remota en cada consulta.
+    """
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        url = f"sqlite:///{tmp}/clientes_benchmark.db"
+        ids = seed_database(url, customers)
+        rng = np.random.default_rng(seed)
+        sample = [ids[i] for i in rng.integers(0, len(ids), logins)]
+        for c in concurrency:
+            for mode in MODES:
+                result = {"mode": mode, "concurrency": c, "db_latency_ms": db_latency_ms,
+                          **RUNNERS[mode](url, sample, c, db_latency_ms)}
+                results.append(result)
+                lag = f", lag máx. del loop {result['max_loop_lag_ms']:.1f} ms" if "max_loop_lag_ms" in result else ""
+                print(
+                    f" {mode:<13} concurrencia {c:>4}: {result['logins_per_second']:>8,.0f} logins/s, "
+                    f"p50 {result['p50_ms']:.2f} ms, p95 {result['p95_ms']:.2f} ms{lag}"
+                )
+
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps({"customers": customers, "logins": logins, "results": results},
+                                 ensure_ascii=False, indent=2), encoding="utf-8")
+    print(f"Resultados guardados en {output}")
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Throughput de logins concurrentes: base síncrona vs asíncrona")
+    parser.add_argument("--customers", type=int, default=10_000)
+    parser.add_argument("--logins", type=int, default=5_000)
+    parser.add_argument("--concurrency", nargs="+", type=int, default=[1, 10, 50])
+    parser.add_argument("--db-latency-ms", type=float, default=0.0, help="Latencia de red simulada por consulta")
+    parser.add_argument("--output", type=Path, default=RESULTS_PATH)
+    args = parser.parse_args()
+
+    run_db_benchmark(args.customers, args.logins, args.concurrency, args.db_latency_ms, args.output)
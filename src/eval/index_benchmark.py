@@ -0,0 +1,107 @@
+import argparse
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from src.embeddings.faiss_index import INDEX_TYPES, build_index, index_size_bytes, set_search_params
+
+RESULTS_PATH = Path("data/processed/index_benchmark_results.csv")
+
+
+def synthetic_corpus(n: int, dim: int, n_queries: int, seed: int = 0) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Vectores sintéticos agrupados (mezcla de gaussianas normalizadas), más parecidos a
+    embeddings reales que el ruido uniforme. Las consultas son documentos perturbados.
+    """
+    rng = np.random.default_rng(seed)
+    n_clusters = max(8, int(np.sqrt(n)))
+    centers = rng.standard_normal((n_clusters, dim)).astype(np.float32)
+    labels = rng.integers(0, n_clusters, n)
+    corpus = centers[labels] + 0.35 * rng.standard_normal((n, dim)).astype(np.float32)
+    corpus /= np.linalg.norm(corpus, axis=1, keepdims=True)
+    picks = rng.integers(0, n, n_queries)
+    queries = corpus[picks] + 0.05 * rng.standard_normal((n_queries, dim)).astype(np.float32)
+    queries /= np.linalg.norm(queries, axis=1, keepdims=True)
+    return corpus, queries.astype(np.float32)
+
+
+def recall_at_k(found: np.ndarray, truth: np.ndarray) -> float:
+    """Fracción de los k vecinos exactos que recupera el índice (promedio por consulta)."""
+    k = truth.shape[1]
+    hits = (found[:, :, None] == truth[:, None, :]).any(axis=2).sum(axis=1)
+    return float(hits.mean() / k)
+
+
+def query_latencies_ms(index, queries: np.ndarray, k: int) -> tuple[np.ndarray, np.ndarray]:
+    """Consulta una a una (como en el chat) y devuelve los ids y las latencias."""
+    ids = np.empty((len(queries), k), dtype=np.int64)
+    lat = np.empty(len(queries))
+    for i, q in enumerate(queries):
+        t0 = time.perf_counter()
+        _, ids[i] = index.search(q[None, :], k)
+        lat[i] = (time.perf_counter() - t0) * 1000
+    return ids, lat
+
+
+def run_index_benchmark(sizes: list[int], dim: int, n_queries: int, k: int, index_types: list[str],
+                        nprobes: list[int], ef_searches: list[int]) -> pd.DataFrame:
+    rows = []
+    for n in sizes:
+        corpus, queries = synthetic_corpus(n, dim, n_queries)
+        print(f" Corpus sintético: {n} vectores x {dim} dims, {n_queries} consultas, k={k}")
+
+        exact, _ = build_index(corpus, "flat")
+        _, truth = exact.search(queries, k)
+
+        for index_type in index_types:
+            t0 = time.perf_counter()
+            index, info = build_index(corpus, index_type)
+            build_s = time.perf_counter() - t0
+            size_mb = index_size_bytes(index) / 1e6
+
+            # Barrido del parámetro de búsqueda propio de cada tipo
+            if info["factory"].startswith("IVF"):
+                sweep = [("nprobe", v) for v in nprobes]
+            elif info["factory"].startswith("HNSW"):
+                sweep = [("ef_search", v) for v in ef_searches]
+            else:
+                sweep = [("-", 0)]
+
+            for param, value in sweep:
+                if param == "nprobe":
+                    set_search_params(index, nprobe=value)
+                elif param == "ef_search":
+                    set_search_params(index, ef_search=value)
+                found, lat = query_latencies_ms(index, queries, k)
+                rows.append({
+                    "n": n,
+                    "index": info["factory"],
+                    "param": f"{param}={value}" if param != "-" else "-",
+                    f"recall@{k}": recall_at_k(found, truth),
+                    "p50_ms": float(np.percentile(lat, 50)),
+                    "p99_ms": float(np.percentile(lat, 99)),
+                    "build_s": build_s,
+                    "size_mb": size_mb
+                })
+
+    df = pd.DataFrame(rows)
+    print(df.to_string(index=False, float_format=lambda v: f"{v:.3f}"))
+    RESULTS_PATH.parent.mkdir(parents=True, exist_ok=True)
+    df.to_csv(RESULTS_PATH, index=False, encoding="utf-8")
+    print(f"Resultados guardados en {RESULTS_PATH}")
+    return df
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark de tipos de índice FAISS (recall vs. latencia)")
+    parser.add_argument("--sizes", nargs="+", type=int, default=[10_000, 100_000])
+    parser.add_argument("--dim", type=int, default=256, help="Dimensión (ada-002 usa 1536)")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--types", nargs="+", default=list(INDEX_TYPES), choices=INDEX_TYPES)
+    parser.add_argument("--nprobe", nargs="+", type=int, default=[1, 8, 32])
+    parser.add_argument("--ef-search", nargs="+", type=int, default=[16, 64, 128])
+    args = parser.parse_args()
+    run_index_benchmark(args.sizes, args.dim, args.queries, args.k, args.types, args.nprobe, args.ef_search)
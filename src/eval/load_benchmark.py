@@ -0,0 +1,109 @@
+import argparse
+import json
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import faiss
+import numpy as np
+import pandas as pd
+from langchain.docstore.document import Document
+from langchain_community.docstore.in_memory import InMemoryDocstore
+from langchain_community.vectorstores import FAISS
+
+from src.embeddings.backends import HashingEmbeddings
+from src.embeddings.docstore import load_mmap_vectorstore, save_mmap_vectorstore
+
+RESULTS_PATH = Path("data/processed/load_benchmark_results.csv")
+
+
+def memory_mb() -> dict[str, float]:
+    """RSS del proceso separando páginas compartidas (caché del SO, mmap) de las privadas."""
+    stats = {}
+    with open("/proc/self/smaps_rollup", encoding="utf-8") as f:
+        for line in f:
+            parts = line.split()
+            if parts[0] in ("Rss:", "Shared_Clean:", "Private_Clean:", "Private_Dirty:"):
+                stats[parts[0][:-1]] = int(parts[1]) / 1024
+    return {
+        "rss_mb": stats.get("Rss", 0.0),
+        "shared_mb": stats.get("Shared_Clean", 0.0),
+        "private_mb": stats.get("Private_Clean", 0.0) + stats.get("Private_Dirty", 0.0)
+    }
+
+
+def build_synthetic(folder: Path, n: int, dim: int) -> None:
+    """Mismo corpus sintético guardado en ambos formatos: legacy/ (pickle) y mmap/ (SQLite)."""
+    rng = np.random.default_rng(0)
+    vectors = rng.standard_normal((n, dim)).astype(np.float32)
+    index = faiss.IndexFlatL2(dim)
+    index.add(vectors)
+    ids = [f"doc-{i}" for i in range(n)]
+    docs = [
+        Document(id=doc_id, page_content=f"Documento sintético {i} " + "texto de relleno " * 20,
+                 metadata={"id": doc_id, "source": "sintetico", "section": f"seccion-{i % 50}"})
+        for i, doc_id in enumerate(ids)
+    ]
+    FAISS(
+        embedding_function=HashingEmbeddings(dim=dim),
+        index=index,
+        docstore=InMemoryDocstore(dict(zip(ids, docs))),
+        index_to_docstore_id=dict(enumerate(ids))
+    ).save_local(str(folder / "legacy"))
+    save_mmap_vectorstore(folder / "mmap", index, ids, docs)
+
+
+def measure(fmt: str, folder: Path, dim: int) -> dict:
+    """Se ejecuta en un proceso nuevo: tiempo de carga, primera consulta y memoria."""
+    embeddings = HashingEmbeddings(dim=dim)
+    t0 = time.perf_counter()
+    if fmt == "legacy":
+        vs = FAISS.load_local(str(folder / "legacy"), embeddings, allow_dangerous_deserialization=True)
+    else:
+        vs = load_mmap_vectorstore(folder / "mmap", embeddings)
+    load_s = time.perf_counter() - t0
+    query = np.random.default_rng(1).standard_normal(dim).astype(np.float32).tolist()
+    t0 = time.perf_counter()
+    vs.similarity_search_by_vector(query, k=5)
+    first_query_ms = (time.perf_counter() - t0) * 1000
+    return {"format": fmt, "load_s": load_s, "first_query_ms": first_query_ms, **memory_mb()}
+
+
+def run_load_benchmark(n: int, dim: int, repeats: int) -> pd.DataFrame:
+    with tempfile.TemporaryDirectory() as tmp:
+        folder = Path(tmp)
+        print(f" Construyendo índice sintético: {n} documentos x {dim} dims")
+        build_synthetic(folder, n, dim)
+        rows = []
+        for fmt in ("legacy", "mmap"):
+            for _ in range(repeats):
+                # Proceso nuevo por medición, como un worker que arranca
+                out = subprocess.run(
+                    [sys.executable, "-m", "src.eval.load_benchmark", "--child", fmt,
+                     "--folder", str(folder), "--dim", str(dim)],
+                    capture_output=True, text=True, check=True
+                )
+                rows.append(json.loads(out.stdout.strip().splitlines()[-1]))
+
+    df = pd.DataFrame(rows).groupby("format").median()
+    print(df.to_string(float_format=lambda v: f"{v:.3f}"))
+    RESULTS_PATH.parent.mkdir(parents=True, exist_ok=True)
+    df.to_csv(RESULTS_PATH, encoding="utf-8")
+    print(f"Resultados guardados en {RESULTS_PATH}")
+    return df
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Arranque y memoria: load_local (pickle) vs. mmap + SQLite")
+    parser.add_argument("--n", type=int, default=100_000)
+    parser.add_argument("--dim", type=int, default=1536)
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--child", choices=["legacy", "mmap"], help=argparse.SUPPRESS)
+    parser.add_argument("--folder", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        print(json.dumps(measure(args.child, Path(args.folder), args.dim)))
+    else:
+        run_load_benchmark(args.n, args.dim, args.repeats)
@@ -0,0 +1,358 @@
+import argparse
+import asyncio
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from pathlib import Path
+import logging
+
+# Todo corre sobre datos temporales: base de clientes, memoria conversacional y vectorstore sintéticos.
+# Se fuerzan (no setdefault) para no escribir nunca en la base real aunque DATABASE_URL esté definida.
+SCRATCH_DIR = Path(tempfile.mkdtemp(prefix="load_test_"))
+os.environ["DATABASE_URL"] = f"sqlite:///{SCRATCH_DIR / 'clientes.db'}"
+os.environ["MEMORY_BACKEND"] = "sqlite"
+os.environ["MEMORY_DB_PATH"] = str(SCRATCH_DIR / "chat_memory.sqlite")
+os.environ["EMBEDDING_BACKEND"] = "stub"
+os.environ["LLM_BACKEND"] = "stub"
+os.environ["VECTORSTORE_WATCH_INTERVAL"] = "0"
+os.environ["TRACE_METRICS_PATH"] = str(SCRATCH_DIR / "chat_metrics.prom")
+# Sin caché de respuestas cada pregunta recorre el RAG completo (ANSWER_CACHE_ENABLED=true para medir con caché)
+os.environ.setdefault("ANSWER_CACHE_ENABLED", "false")
+os.environ.setdefault("PROMPT_VERSION", "v1_preguntas_frecuentes")
+
+import numpy as np
+import pandas as pd
+
+from src.chat.conversation import USER_STATES, ConversationEngine, SessionState
+from src.chat.resources import RAGResources
+from src.db.database import DATABASE_URL
+from src.embeddings.query_batcher import BatchingEmbeddings
+from src.eval.db_benchmark import seed_database
+from src.eval.synthetic import build_synthetic_vectordb, synthetic_documents, synthetic_queries
+from src.utils.stubs import StubChatModel
+
+logger = logging.getLogger(__name__)
+
+RESULTS_DIR = Path("data/processed/load_test")
+NOMBRES = ("Ana Gómez", "Luis Pérez", "María López", "José Díaz", "Camila Ramírez", "Andrés Muñoz")
+
+
+class SessionScripts:
+    """
+    Guiones de conversación como los de un comprador en `app.py`: clientes nuevos (registro completo,
+    con algún dato inválido) o frecuentes (identificación existente), seguidos de `qa_turns` preguntas.
+    """
+
+    def __init__(self, customer_ids: list[str], questions: list[str], qa_turns: int,
+                 new_ratio: float, invalid_ratio: float, seed: int = 0):
+        self.customer_ids = customer_ids
+        self.questions = questions
+        self.qa_turns = qa_turns
+        self.new_ratio = new_ratio
+        self.invalid_ratio = invalid_ratio
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._next_id = 90_000_000
+
+    def next(self) -> list[str]:
+        with self._lock:
+            rng = self._rng
+            if rng.random() < self.new_ratio:
+                self._next_id += 1
+                n = self._next_id
+                messages = ["hola", "soy nuevo"]
+                if rng.random() < self.invalid_ratio:
+                    messages.append("12ab")
+                messages += [str(n), rng.choice(NOMBRES)]
+                if rng.random() < self.invalid_ratio:
+                    messages.append("12345")
+                messages += [f"3{n:09d}"[:10], f"cliente{n}@correo.com"]
+            else:
+                messages = ["soy cliente frecuente", rng.choice(self.customer_ids)]
+            return messages + [rng.choice(self.questions) for _ in range(self.qa_turns)]
+
+
+class Recorder:
+    """
+    Latencias por estado de la conversación (el estado en que estaba la sesión al recibir el mensaje).
+    Solo cuentan los turnos que empiezan después de `measure_from`: al inicio de cada nivel todas las
+    sesiones están en los primeros pasos del registro, que son mucho más baratos que las preguntas.
+    """
+
+    def __init__(self, measure_from: float):
+        self.measure_from = measure_from
+        self._lock = threading.Lock()
+        self.latency: dict[str, list[float]] = defaultdict(list)
+        self.ttft: list[float] = []
+        self.sessions = 0
+        self.failures = 0
+
+    def turn(self, state: str, started: float, seconds: float, ttft: float | None) -> None:
+        if started < self.measure_from:
+            return
+        with self._lock:
+            self.latency[state].append(seconds * 1000)
+            if ttft is not None:
+                self.ttft.append(ttft * 1000)
+
+    def session(self, ok: bool) -> None:
+        if time.perf_counter() < self.measure_from:
+            return
+        with self._lock:
+            self.sessions += 1
+            self.failures += 0 if ok else 1
+
+
+def percentiles(values: list[float]) -> dict:
+    if not values:
+        return {"n": 0, "p50_ms": None, "p95_ms": None, "p99_ms": None}
+    arr = np.asarray(values)
+    return {"n": len(values), "p50_ms": float(np.percentile(arr, 50)),
+            "p95_ms": float(np.percentile(arr, 95)), "p99_ms": float(np.percentile(arr, 99))}
+
+
+def run_session_sync(engine: ConversationEngine, messages: list[str], recorder: Recorder,
+                     think_s: float, deadline: float) -> None:
+    state = SessionState()
+    for message in messages:
+        if time.perf_counter() >= deadline:
+            return
+        before = state.user_state
+        t0 = time.perf_counter()
+        ttft = None
+        for chunk in engine.stream(state, message):
+            if ttft is None and chunk:
+                ttft = time.perf_counter() - t0
+        recorder.turn(before, t0, time.perf_counter() - t0, ttft if before == "qa" else None)
+        if think_s:
+            time.sleep(think_s)
+    recorder.session(state.user_state == "qa")
+
+
+async def run_session_async(engine: ConversationEngine, messages: list[str], recorder: Recorder,
+                            think_s: float, deadline: float) -> None:
+    state = SessionState()
+    for message in messages:
+        if time.perf_counter() >= deadline:
+            return
+        before = state.user_state
+        t0 = time.perf_counter()
+        ttft = None
+        async for chunk in engine.astream(state, message):
+            if ttft is None and chunk:
+                ttft = time.perf_counter() - t0
+        recorder.turn(before, t0, time.perf_counter() - t0, ttft if before == "qa" else None)
+        if think_s:
+            await asyncio.sleep(think_s)
+    recorder.session(state.user_state == "qa")
+
+
+def run_level_threads(engine: ConversationEngine, scripts: SessionScripts, users: int,
+                      duration: float, warmup: float, think_s: float) -> tuple[Recorder, float]:
+    """`users` compradores simultáneos en hilos (como las sesiones de Streamlit), en lazo cerrado."""
+    start = time.perf_counter()
+    recorder = Recorder(start + warmup)
+    deadline = start + warmup + duration
+
+    def user() -> None:
+        while time.perf_counter() < deadline:
+            try:
+                run_session_sync(engine, scripts.next(), recorder, think_s, deadline)
+            except Exception as e:
+                logger.error(f"Sesión fallida: {e}")
+                recorder.session(False)
+
+    threads = [threading.Thread(target=user, daemon=True) for _ in range(users)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return recorder, duration
+
+
+async def run_level_async(engine: ConversationEngine, scripts: SessionScripts, users: int,
+                          duration: float, warmup: float, think_s: float) -> tuple[Recorder, float]:
+    """`users` compradores simultáneos como tareas de un event loop (como la API ASGI)."""
+    start = time.perf_counter()
+    recorder = Recorder(start + warmup)
+    deadline = start + warmup + duration
+
+    async def user() -> None:
+        while time.perf_counter() < deadline:
+            try:
+                await run_session_async(engine, scripts.next(), recorder, think_s, deadline)
+            except Exception as e:
+                logger.error(f"Sesión fallida: {e}")
+                recorder.session(False)
+
+    await asyncio.gather(*(user() for _ in range(users)))
+    return recorder, duration
+
+
+def summarize_level(users: int, recorder: Recorder, seconds: float) -> dict:
+    turns = sum(len(v) for v in recorder.latency.values())
+    all_turns = [x for v in recorder.latency.values() for x in v]
+    return {
+        "users": users,
+        "seconds": seconds,
+        "turns": turns,
+        "turns_per_second": turns / seconds,
+        "qa_per_second": len(recorder.latency["qa"]) / seconds,
+        "sessions_completed": recorder.sessions,
+        "session_failures": recorder.failures,
+        "all": percentiles(all_turns),
+        "qa_ttft": percentiles(recorder.ttft),
+        "states": {state: percentiles(recorder.latency[state]) for state in USER_STATES if recorder.latency[state]}
+    }
+
+
+def find_saturation(levels: list[dict], min_gain: float) -> dict:
+    """
+    Punto de saturación: el último nivel a partir del cual agregar sesiones ya no aumenta las
+    preguntas respondidas por segundo al menos `min_gain` (relativo), solo alarga la cola y la latencia.
+    """
+    for prev, cur in zip(levels, levels[1:]):
+        if cur["qa_per_second"] < prev["qa_per_second"] * (1 + min_gain):
+            return {"users": prev["users"], "qa_per_second": prev["qa_per_second"], "reached": True}
+    last = levels[-1]
+    return {"users": last["users"], "qa_per_second": last["qa_per_second"], "reached": False}
+
+
+def build_engine(docs: int, llm: StubChatModel, embedding_ms: float, embedding_jitter: float) -> ConversationEngine:
+    folder = SCRATCH_DIR / "vectordb"
+    corpus = synthetic_documents(docs)
+    build_synthetic_vectordb(folder, corpus)
+    resources = RAGResources(str(folder), llm=llm)
+    # La latencia de la API de embeddings se aplica a la instancia que usan el retriever y las rutas rápidas
+    embeddings = resources.index.vectorstore.embeddings
+    if isinstance(embeddings, BatchingEmbeddings):
+        embeddings = embeddings.embeddings
+    embeddings.latency_ms, embeddings.jitter = embedding_ms, embedding_jitter
+    resources.warm_up()
+    return ConversationEngine(resources)
+
+
+def run_load_test(args: argparse.Namespace) -> dict:
+    llm = StubChatModel(first_token_ms=args.llm_first_token_ms, token_ms=args.llm_token_ms,
+                        answer_tokens=args.answer_tokens, jitter=args.llm_jitter)
+    engine = build_engine(args.docs, llm, args.embedding_ms, args.embedding_jitter)
+    customer_ids = seed_database(DATABASE_URL, args.customers)
+    questions = synthetic_queries(synthetic_documents(args.docs), 200) + [
+        "¿Cuál es el horario de la sucursal norte?", "hola", "gracias"
+    ]
+    scripts = SessionScripts(customer_ids, questions, args.qa_turns, args.new_ratio, args.invalid_ratio, args.seed)
+    think_s = args.think_ms / 1000
+
+    levels = []
+
+    def report(users: int, recorder: Recorder, seconds: float) -> None:
+        level = summarize_level(users, recorder, seconds)
+        levels.append(level)
+        qa = level["states"].get("qa", {})
+        print(
+            f" {users:>4} sesiones: {level['turns_per_second']:>7.1f} turnos/s ({level['qa_per_second']:.1f} preguntas/s), "
+            f"{level['sessions_completed']} sesiones completas ({level['session_failures']} fallidas), "
+            f"p50/p95/p99 {level['all']['p50_ms']:.0f}/{level['all']['p95_ms']:.0f}/{level['all']['p99_ms']:.0f} ms, "
+            f"qa p95 {qa.get('p95_ms') or 0:.0f} ms, TTFT p95 {level['qa_ttft']['p95_ms'] or 0:.0f} ms"
+        )
+
+    if args.mode == "threads":
+        for users in args.users:
+            report(users, *run_level_threads(engine, scripts, users, args.duration, args.warmup, think_s))
+    else:
+        async def main() -> None:
+            from src.db.async_database import async_engine
+            try:
+                for users in args.users:
+                    report(users, *(await run_level_async(engine, scripts, users, args.duration, args.warmup, think_s)))
+            finally:
+                await async_engine.dispose()
+
+        asyncio.run(main())
+
+    # Agrupamiento de embeddings de consultas entre sesiones (acumulado de todos los niveles)
+    embeddings = engine.resources.index.vectorstore.embeddings
+    batching = embeddings.stats() if isinstance(embeddings, BatchingEmbeddings) else None
+    if batching and batching["batches"]:
+        print(
+            f" Embeddings de consultas: {batching['queries']} consultas en {batching['batches']} llamadas "
+            f"(lote medio {batching['mean_batch_size']:.1f}), espera p95 {batching['wait_p95_ms']:.1f} ms"
+        )
+
+    saturation = find_saturation(levels, args.min_gain)
+    within_slo = [lvl["users"] for lvl in levels if lvl["all"]["p95_ms"] is not None
+                  and lvl["all"]["p95_ms"] <= args.slo_p95_ms]
+    return {
+        "mode": args.mode,
+        "config": {k: (str(v) if isinstance(v, Path) else v) for k, v in vars(args).items()},
+        "levels": levels,
+        "saturation": saturation,
+        "query_embedding_batching": batching,
+        "max_users_within_slo": max(within_slo) if within_slo else 0
+    }
+
+
+def write_results(results: dict, output: Path) -> None:
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(results, ensure_ascii=False, indent=2), encoding="utf-8")
+    rows = [
+        {"users": lvl["users"], "state": state, "turns_per_second": lvl["turns_per_second"],
+         "qa_per_second": lvl["qa_per_second"], **stats}
+        for lvl in results["levels"]
+        for state, stats in [("all", lvl["all"]), ("qa_ttft", lvl["qa_ttft"]), *lvl["states"].items()]
+    ]
+    pd.DataFrame(rows).to_csv(output.with_suffix(".csv"), index=False, encoding="utf-8")
+    print(f"Resultados guardados en {output} y {output.with_suffix('.csv')}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Prueba de carga del flujo completo de conversación con LLM y embeddings falsos (sin red)"
+    )
+    parser.add_argument("--users", nargs="+", type=int, default=[1, 5, 10, 25, 50], help="Sesiones simultáneas por nivel")
+    parser.add_argument("--duration", type=float, default=15.0, help="Segundos medidos por nivel")
+    parser.add_argument("--warmup", type=float, default=5.0, help="Segundos iniciales de cada nivel que no se miden")
+    parser.add_argument("--mode", choices=["threads", "async"], default="threads",
+                        help="threads = sesiones de Streamlit; async = API ASGI")
+    parser.add_argument("--qa-turns", type=int, default=3, help="Preguntas por sesión tras el registro")
+    parser.add_argument("--new-ratio", type=float, default=0.5, help="Fracción de clientes nuevos")
+    parser.add_argument("--invalid-ratio", type=float, default=0.2, help="Probabilidad de un dato inválido en el registro")
+    parser.add_argument("--think-ms", type=float, default=0.0, help="Pausa del usuario entre mensajes")
+    parser.add_argument("--customers", type=int, default=1_000, help="Clientes frecuentes precargados")
+    parser.add_argument("--docs", type=int, default=2_000, help="Documentos del vectorstore sintético")
+    parser.add_argument("--llm-first-token-ms", type=float, default=300.0)
+    parser.add_argument("--llm-token-ms", type=float, default=20.0)
+    parser.add_argument("--llm-jitter", type=float, default=0.3, help="Sigma log-normal de la latencia del LLM")
+    parser.add_argument("--answer-tokens", type=int, default=40)
+    parser.add_argument("--embedding-ms", type=float, default=80.0)
+    parser.add_argument("--embedding-jitter", type=float, default=0.3)
+    parser.add_argument("--min-gain", type=float, default=0.1, help="Aumento mínimo de throughput entre niveles")
+    parser.add_argument("--slo-p95-ms", type=float, default=2_000.0, help="p95 por turno aceptable")
+    parser.add_argument("--min-users", type=int, default=0,
+                        help="Falla (exit 1) si el SLO no se cumple con al menos estas sesiones (CI)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", type=Path, default=RESULTS_DIR / "results.json")
+    args = parser.parse_args()
+
+    logging.getLogger("src").setLevel(logging.WARNING)
+    try:
+        results = run_load_test(args)
+    finally:
+        shutil.rmtree(SCRATCH_DIR, ignore_errors=True)
+    write_results(results, args.output)
+
+    saturation = results["saturation"]
+    if saturation["reached"]:
+        print(f"Saturación con {saturation['users']} sesiones ({saturation['qa_per_second']:.1f} preguntas/s)")
+    else:
+        print(f"Sin saturación hasta {saturation['users']} sesiones ({saturation['qa_per_second']:.1f} preguntas/s)")
+    print(f"Máximo de sesiones con p95 <= {args.slo_p95_ms:.0f} ms: {results['max_users_within_slo']}")
+    if results["max_users_within_slo"] < args.min_users:
+        print(f"El SLO no se cumple con {args.min_users} sesiones")
+        sys.exit(1)
@@ -0,0 +1,183 @@
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+import logging
+
+# Suite sin red: embeddings locales y memoria del proceso (no toca la base de sesiones real)
+os.environ["EMBEDDING_BACKEND"] = "hashing"
+os.environ["MEMORY_BACKEND"] = "memory"
+os.environ.setdefault("PROMPT_VERSION", "v1_preguntas_frecuentes")
+
+import numpy as np
+import pandas as pd
+
+from src.chat.context_packer import ContextPacker
+from src.chat.memory import ConversationMemoryStore, StoredMessage, format_history
+from src.chat.rag_pipeline import build_rag_chain
+from src.chat.resources import RAGResources
+from src.eval.synthetic import VOCAB, build_synthetic_vectordb, synthetic_documents, synthetic_queries
+from src.utils.stubs import StubChatModel
+from src.utils.tokens import count_tokens
+
+RESULTS_DIR = Path("data/processed/perf_benchmark")
+STAGES = ("embed", "search", "retrieve", "format", "history", "prompt", "chain_ttft", "chain_total")
+
+
+def history_store(turns: int) -> ConversationMemoryStore:
+    """Memoria en proceso con una sesión de `turns` turnos (ventana + resumen)."""
+    store = ConversationMemoryStore()
+    for i in range(turns):
+        question = f"Pregunta de seguimiento {i} sobre horarios y puntos"
+        answer = f"Respuesta {i}: " + " ".join(VOCAB[(i + j) % len(VOCAB)] for j in range(30))
+        store.append("bench", [StoredMessage("human", question, count_tokens(question)),
+                               StoredMessage("ai", answer, count_tokens(answer))])
+    return store
+
+
+def _timed(timings: dict[str, list[float]], stage: str, fn, *args):
+    t0 = time.perf_counter()
+    out = fn(*args)
+    timings[stage].append((time.perf_counter() - t0) * 1000)
+    return out
+
+
+def benchmark_size(n: int, n_queries: int, history_turns: int, llm: StubChatModel) -> dict[str, list[float]]:
+    """Tiempos (ms) de cada etapa del RAG para un corpus sintético de `n` documentos."""
+    timings: dict[str, list[float]] = {stage: [] for stage in STAGES}
+    with tempfile.TemporaryDirectory() as tmp:
+        docs = synthetic_documents(n)
+        t0 = time.perf_counter()
+        build_synthetic_vectordb(Path(tmp), docs)
+        print(f" Corpus sintético de {n} documentos indexado en {time.perf_counter() - t0:.1f}s")
+
+        resources = RAGResources(tmp, llm=llm)
+        index = resources.index
+        embeddings = index.vectorstore.embeddings
+        prompt = resources.rag_prompt
+        packer = ContextPacker()
+        store = history_store(history_turns)
+        chain = build_rag_chain(resources, use_cache=False, use_faq=False, use_schedules=False)
+        queries = synthetic_queries(docs, n_queries + 1)
+
+        for i, q in enumerate(queries):
+            run: dict[str, list[float]] = {stage: [] for stage in STAGES}
+            embedding = _timed(run, "embed", embeddings.embed_query, q)
+            _timed(run, "search", index.vectorstore.similarity_search_by_vector, embedding, index.retriever.k)
+            retrieved = _timed(run, "retrieve", index.retriever.retrieve, q, embedding)
+            context = _timed(run, "format", packer.pack, retrieved)
+            history = _timed(run, "history", lambda: format_history(store.get_history("bench").messages))
+            _timed(run, "prompt", lambda: prompt.format(context=context, question=q, chat_history=history))
+
+            # Chain completo con el LLM falso: primer fragmento y respuesta completa
+            t0 = time.perf_counter()
+            for j, _ in enumerate(chain.stream({"question": q}, config={"configurable": {"session_id": f"bench-{i}"}})):
+                if j == 0:
+                    run["chain_ttft"].append((time.perf_counter() - t0) * 1000)
+            run["chain_total"].append((time.perf_counter() - t0) * 1000)
+
+            # La primera consulta solo calienta cachés y no se cuenta
+            if i > 0:
+                for stage, values in run.items():
+                    timings[stage].extend(values)
+    return timings
+
+
+def summarize(n: int, timings: dict[str, list[float]]) -> list[dict]:
+    rows = []
+    for stage, values in timings.items():
+        arr = np.asarray(values)
+        rows.append({
+            "n_docs": n,
+            "stage": stage,
+            "samples": len(arr),
+            "mean_ms": float(arr.mean()),
+            "p50_ms": float(np.percentile(arr, 50)),
+            "p95_ms": float(np.percentile(arr, 95))
+        })
+    return rows
+
+
+def find_regressions(results: list[dict], baseline: list[dict], max_regression: float,
+                     min_delta_ms: float) -> list[str]:
+    """Etapas cuyo p50 empeoró más de `max_regression` (relativo) y `min_delta_ms` (absoluto)."""
+    previous = {(r["n_docs"], r["stage"]): r["p50_ms"] for r in baseline}
+    regressions = []
+    for r in results:
+        before = previous.get((r["n_docs"], r["stage"]))
+        if before is None:
+            continue
+        delta = r["p50_ms"] - before
+        if delta > min_delta_ms and r["p50_ms"] > before * (1 + max_regression):
+            regressions.append(
+                f"{r['stage']} (n={r['n_docs']}): p50 {before:.3f} -> {r['p50_ms']:.3f} ms (+{delta / before:.0%})"
+            )
+    return regressions
+
+
+def get_git_commit() -> str:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "HEAD"], stderr=subprocess.DEVNULL).decode().strip()
+    except Exception:
+        return "unknown"
+
+
+def run_perf_benchmark(sizes: list[int], n_queries: int, history_turns: int, llm_first_token_ms: float,
+                       llm_token_ms: float, output: Path) -> list[dict]:
+    llm = StubChatModel(first_token_ms=llm_first_token_ms, token_ms=llm_token_ms)
+    results = []
+    for n in sizes:
+        results.extend(summarize(n, benchmark_size(n, n_queries, history_turns, llm)))
+
+    df = pd.DataFrame(results)
+    print(df.to_string(index=False, float_format=lambda v: f"{v:.3f}"))
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps({
+        "meta": {
+            "git_commit": get_git_commit(),
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "created_at": time.time(),
+            "sizes": sizes,
+            "queries": n_queries,
+            "history_turns": history_turns,
+            "llm_first_token_ms": llm_first_token_ms,
+            "llm_token_ms": llm_token_ms
+        },
+        "results": results
+    }, indent=2), encoding="utf-8")
+    df.to_csv(output.with_suffix(".csv"), index=False, encoding="utf-8")
+    print(f"Resultados guardados en {output} y {output.with_suffix('.csv')}")
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark offline de latencia por etapa del RAG (sin OpenAI)")
+    parser.add_argument("--sizes", nargs="+", type=int, default=[1_000, 10_000])
+    parser.add_argument("--queries", type=int, default=50)
+    parser.add_argument("--history-turns", type=int, default=10)
+    parser.add_argument("--llm-first-token-ms", type=float, default=0.0, help="Latencia simulada del LLM")
+    parser.add_argument("--llm-token-ms", type=float, default=0.0)
+    parser.add_argument("--output", type=Path, default=RESULTS_DIR / "results.json")
+    parser.add_argument("--baseline", type=Path, help="JSON de una corrida anterior para detectar regresiones")
+    parser.add_argument("--max-regression", type=float, default=0.25, help="Aumento relativo tolerado del p50")
+    parser.add_argument("--min-delta-ms", type=float, default=0.2, help="Diferencias menores se consideran ruido")
+    args = parser.parse_args()
+
+    logging.getLogger("src").setLevel(logging.WARNING)
+    results = run_perf_benchmark(args.sizes, args.queries, args.history_turns,
+                                 args.llm_first_token_ms, args.llm_token_ms, args.output)
+    if args.baseline:
+        baseline = json.loads(args.baseline.read_text(encoding="utf-8"))["results"]
+        regressions = find_regressions(results, baseline, args.max_regression, args.min_delta_ms)
+        if regressions:
+            print("Regresiones respecto a la línea base:")
+            for line in regressions:
+                print(f" - {line}")
+            sys.exit(1)
+        print(f"Sin regresiones respecto a {args.baseline}")
@@ -1,68 +1,224 @@
-import time
+import argparse
+import hashlib
 import json
-import mlflow
-import pandas as pd
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
-from tqdm import tqdm
-from src.chat.rag_pipeline import build_rag_chain
-from langchain_openai import OpenAIEmbeddings
+from typing import Optional
+import logging
+
+# Las sesiones de evaluación viven en memoria del proceso: no se escriben en chat_memory.sqlite
+os.environ["MEMORY_BACKEND"] = "memory"
+
+import mlflow
 import numpy as np
+import pandas as pd
 from dotenv import load_dotenv
-import os
+from mlflow.entities import Metric
+from mlflow.tracking import MlflowClient
+from tqdm import tqdm
+
+from src.chat.memory import get_memory_store
+from src.chat.rag_pipeline import OPENAI_MODEL, PROMPT_VERSION
+from src.embeddings.backends import get_embeddings
+from src.embeddings.batch_embedder import BatchEmbedder
+from src.embeddings.embedding_store import EmbeddingStore, embed_with_store, embedding_model_name
 
 # Cargar variables de entorno
 load_dotenv()
 
-# 1) Carga dataset de prueba
+logger = logging.getLogger(__name__)
+
 DATASET = Path("data/processed/preguntas_frecuentes.json")
-with DATASET.open(encoding="utf-8") as f:
-    qa_list = json.load(f)
-
-# 2) Inicializa chain y embeddings
-chain = build_rag_chain()
-embeddings = OpenAIEmbeddings(api_key=(os.getenv("OPENAI_API_KEY")))
-
-def calculate_cosine_similarity(text1: str, text2: str) -> float:
-    """Calcula la similitud coseno entre dos textos."""
-    emb1 = embeddings.embed_query(text1)
-    emb2 = embeddings.embed_query(text2)
-    return np.dot(emb1, emb2) / (np.linalg.norm(emb1) * np.linalg.norm(emb2))
-
-# 3) Inicia experimento MLflow
-mlflow.set_experiment("rag_evaluation_similarity")
-with mlflow.start_run(run_name="eval_faq_similarity"):
-    mlflow.log_param("n_samples", len(qa_list))
-    results = []
-
-    for qa in tqdm(qa_list, desc="Evaluando preguntas"):
-        q = qa["pregunta"]
-        expected = qa["respuesta"] if isinstance(qa["respuesta"], str) else qa["respuesta"].get("texto", "")
-        t0 = time.time()
-        out = chain.invoke(
-            {"question": q},
-            config={"configurable": {"session_id": "eval_session"}}
-        )
-        latency = time.time() - t0
-        answer = out["answer"]  # Usar out["answer"] por la corrección en rag_pipeline.py
-        # Evaluación: similitud coseno
-        similarity = calculate_cosine_similarity(expected, answer)
-        match = int(similarity >= 0.8)  # Umbral de similitud (ajustable)
-        results.append({
-            "pregunta": q,
-            "esperada": expected,
-            "obtenida": answer,
-            "latency": latency,
-            "similarity": similarity,
-            "match": match
-        })
-        # Registra métricas
-        mlflow.log_metric("latency_ms", latency * 1000)
-        mlflow.log_metric("similarity", similarity)
-        mlflow.log_metric("match", match)
-
-    # 4) Guarda resultados a CSV y lo sube como artifact
-    df = pd.DataFrame(results)
-    csv_path = "data/processed/rag_eval_results_similarity.csv"
-    df.to_csv(csv_path, index=False, encoding="utf-8")
-    mlflow.log_artifact(csv_path, artifact_path="evaluation")
-    print(f"Evaluación guardada en {csv_path}")
\ No newline at end of file
+RESULTS_PATH = Path("data/processed/rag_eval_results_similarity.csv")
+CHECKPOINT_PATH = Path("data/processed/rag_eval_checkpoint.jsonl")
+# MLflow acepta hasta 1000 métricas por llamada a log_batch
+MLFLOW_BATCH_SIZE = 1000
+
+
+def expected_text(respuesta) -> str:
+    return respuesta if isinstance(respuesta, str) else (respuesta or {}).get("texto", "")
+
+
+def load_dataset(path: Path = DATASET) -> list[dict]:
+    """Preguntas y respuestas esperadas desde JSON (lista) o JSONL (un objeto por línea)."""
+    text = path.read_text(encoding="utf-8")
+    records = json.loads(text) if path.suffix == ".json" else [json.loads(line) for line in text.splitlines() if line.strip()]
+    samples = []
+    for rec in records:
+        q, expected = rec["pregunta"], expected_text(rec.get("respuesta"))
+        sample_id = hashlib.sha1(f"{q}\x00{expected}".encode("utf-8")).hexdigest()[:16]
+        samples.append({"id": sample_id, "pregunta": q, "esperada": expected})
+    return samples
+
+
+def run_signature(samples: list[dict], fast_paths: bool = False) -> str:
+    """Identifica la corrida (dataset, prompt, modelo y rutas rápidas): un checkpoint de otra configuración no se reutiliza."""
+    h = hashlib.sha1(f"{PROMPT_VERSION}:{OPENAI_MODEL}:{'fast' if fast_paths else 'rag'}".encode())
+    for s in samples:
+        h.update(s["id"].encode())
+    return h.hexdigest()[:16]
+
+
+class Checkpoint:
+    """Respuestas ya obtenidas, en JSONL: una corrida interrumpida continúa desde aquí."""
+
+    def __init__(self, path: Path, signature: str, resume: bool = True):
+        self.path = path
+        self._lock = threading.Lock()
+        self.done: dict[str, dict] = {}
+        if resume and path.exists():
+            lines = path.read_text(encoding="utf-8").splitlines()
+            header = json.loads(lines[0]) if lines else {}
+            if header.get("signature") == signature:
+                for line in lines[1:]:
+                    try:
+                        rec = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue  # Última línea incompleta si el proceso se cortó al escribir
+                    self.done[rec["id"]] = rec
+            else:
+                logger.warning(f"El checkpoint {path} es de otra configuración, se empieza de cero")
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self._file = path.open("w", encoding="utf-8")
+        self._file.write(json.dumps({"signature": signature}) + "\n")
+        for rec in self.done.values():
+            self._file.write(json.dumps(rec, ensure_ascii=False) + "\n")
+        self._file.flush()
+
+    def add(self, rec: dict) -> None:
+        with self._lock:
+            self.done[rec["id"]] = rec
+            self._file.write(json.dumps(rec, ensure_ascii=False) + "\n")
+            self._file.flush()
+
+    def close(self, remove: bool = False) -> None:
+        self._file.close()
+        if remove:
+            self.path.unlink(missing_ok=True)
+
+
+def answer_questions(chain, samples: list[dict], checkpoint: Checkpoint, max_workers: int) -> int:
+    """Ejecuta el chain en paralelo (pool acotado) sobre las preguntas pendientes; devuelve cuántas fallaron."""
+    pending = [s for s in samples if s["id"] not in checkpoint.done]
+    if len(pending) < len(samples):
+        print(f" Reanudando: {len(samples) - len(pending)} respuestas en el checkpoint, {len(pending)} pendientes")
+
+    def ask(sample: dict) -> dict:
+        t0 = time.perf_counter()
+        # Una sesión por pregunta: el historial de una no contamina la respuesta de otra
+        session_id = f"eval-{sample['id']}"
+        try:
+            out = chain.invoke({"question": sample["pregunta"]}, config={"configurable": {"session_id": session_id}})
+        finally:
+            get_memory_store().clear(session_id)
+        return {**sample, "obtenida": out["answer"], "latency": time.perf_counter() - t0}
+
+    failures = 0
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        futures = {pool.submit(ask, s): s for s in pending}
+        for future in tqdm(as_completed(futures), total=len(futures), desc="Evaluando preguntas"):
+            try:
+                checkpoint.add(future.result())
+            except Exception as e:
+                failures += 1
+                logger.error(f"Falló la pregunta {futures[future]['pregunta']!r}: {e}")
+    return failures
+
+
+def score_similarity(df: pd.DataFrame, embeddings, store: EmbeddingStore, threshold: float) -> pd.DataFrame:
+    """Similitud coseno esperada/obtenida con embeddings por lotes; los vectores se guardan en el almacén."""
+    vectors, stats = embed_with_store(df["esperada"].tolist() + df["obtenida"].tolist(), embeddings, store)
+    print(f" Embeddings de evaluación: {stats['n_reused']} reutilizados, {stats['n_embedded']} nuevos")
+    matrix = np.vstack(vectors)
+    matrix /= np.maximum(np.linalg.norm(matrix, axis=1, keepdims=True), 1e-12)
+    expected, obtained = matrix[:len(df)], matrix[len(df):]
+    df = df.copy()
+    df["similarity"] = np.einsum("ij,ij->i", expected, obtained)
+    df["match"] = (df["similarity"] >= threshold).astype(int)
+    return df
+
+
+def log_to_mlflow(df: pd.DataFrame, summary: dict, params: dict) -> None:
+    """Métricas por pregunta en lotes (log_batch) en lugar de una llamada por valor."""
+    mlflow.set_experiment("rag_evaluation_similarity")
+    with mlflow.start_run(run_name="eval_faq_similarity") as run:
+        mlflow.log_params(params)
+        now = int(time.time() * 1000)
+        metrics = [
+            Metric(key, float(value), now, step)
+            for step, row in enumerate(df.itertuples(index=False))
+            for key, value in (("latency_ms", row.latency * 1000), ("similarity", row.similarity), ("match", row.match))
+        ]
+        metrics += [Metric(key, float(value), now, 0) for key, value in summary.items()]
+        client = MlflowClient()
+        for i in range(0, len(metrics), MLFLOW_BATCH_SIZE):
+            client.log_batch(run.info.run_id, metrics=metrics[i:i + MLFLOW_BATCH_SIZE])
+        mlflow.log_artifact(str(RESULTS_PATH), artifact_path="evaluation")
+
+
+def run_rag_evaluation(dataset: Path = DATASET, max_workers: int = 8, threshold: float = 0.8,
+                       resume: bool = True, limit: Optional[int] = None, chain=None,
+                       use_mlflow: bool = True, fast_paths: bool = False) -> pd.DataFrame:
+    """
+    Evalúa el chain RAG sobre `dataset`; devuelve los resultados por pregunta.
+    Sin `fast_paths` se desactivan la FAQ directa, la caché semántica y los horarios: las preguntas
+    de preguntas_frecuentes.json se responderían literalmente desde faq_answers.json y se mediría la ruta rápida.
+    """
+    samples = load_dataset(dataset)[:limit]
+    if chain is None:
+        from src.chat.rag_pipeline import build_rag_chain
+        chain = build_rag_chain(use_cache=fast_paths, use_faq=fast_paths, use_schedules=fast_paths)
+
+    t0 = time.perf_counter()
+    checkpoint = Checkpoint(CHECKPOINT_PATH, run_signature(samples, fast_paths), resume=resume)
+    failures = answer_questions(chain, samples, checkpoint, max_workers)
+    answered = [checkpoint.done[s["id"]] for s in samples if s["id"] in checkpoint.done]
+    # Se conserva el checkpoint si hubo fallos: la próxima corrida solo repite esas preguntas
+    checkpoint.close(remove=failures == 0)
+    elapsed = time.perf_counter() - t0
+    if not answered:
+        raise RuntimeError(f"Ninguna de las {len(samples)} preguntas obtuvo respuesta")
+
+    embeddings = get_embeddings()
+    store = EmbeddingStore(model=embedding_model_name(embeddings))
+    try:
+        df = score_similarity(pd.DataFrame(answered), BatchEmbedder(embeddings), store, threshold)
+    finally:
+        store.close()
+    df = df[["pregunta", "esperada", "obtenida", "latency", "similarity", "match"]]
+    RESULTS_PATH.parent.mkdir(parents=True, exist_ok=True)
+    df.to_csv(RESULTS_PATH, index=False, encoding="utf-8")
+
+    summary = {
+        "effectiveness": float(df["match"].mean()),
+        "similarity_mean": float(df["similarity"].mean()),
+        "latency_p50_ms": float(df["latency"].median() * 1000),
+        "latency_p95_ms": float(np.percentile(df["latency"], 95) * 1000),
+        "questions_per_second": len(answered) / elapsed if elapsed > 0 else 0.0,
+        "n_failures": failures
+    }
+    print(f" {len(df)} preguntas evaluadas ({failures} fallidas) en {elapsed:.1f}s")
+    print(f" Efectividad: {summary['effectiveness']:.2%}, latencia p50 {summary['latency_p50_ms']:.0f} ms")
+    if use_mlflow:
+        log_to_mlflow(df, summary, {"n_samples": len(samples), "max_workers": max_workers, "threshold": threshold,
+                                    "fast_paths": fast_paths})
+    print(f"Evaluación guardada en {RESULTS_PATH}")
+    return df
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Evaluación del RAG por similitud con la respuesta esperada")
+    parser.add_argument("--dataset", type=Path, default=DATASET, help="JSON o JSONL con 'pregunta' y 'respuesta'")
+    parser.add_argument("--workers", type=int, default=8, help="Preguntas en paralelo")
+    parser.add_argument("--threshold", type=float, default=0.8, help="Similitud mínima para contar un acierto")
+    parser.add_argument("--limit", type=int, help="Evaluar solo las primeras N preguntas")
+    parser.add_argument("--fresh", action="store_true", help="Ignorar el checkpoint de una corrida anterior")
+    parser.add_argument("--no-mlflow", action="store_true")
+    parser.add_argument("--fast-paths", action="store_true",
+                        help="Evaluar con FAQ directa, caché semántica y horarios (como responde la aplicación)")
+    args = parser.parse_args()
+    run_rag_evaluation(args.dataset, args.workers, args.threshold, resume=not args.fresh,
+                       limit=args.limit, use_mlflow=not args.no_mlflow, fast_paths=args.fast_paths)
@@ -0,0 +1,148 @@
+import argparse
+import json
+import time
+from pathlib import Path
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+from dotenv import load_dotenv
+
+from src.chat.hybrid_retriever import HybridRetriever
+from src.embeddings.chunk import PARENT_CHUNKS_FILE
+from src.embeddings.lexical_index import BM25Index, LEXICAL_INDEX_FILE
+
+# Cargar variables de entorno
+load_dotenv()
+
+DATASET = Path("data/processed/preguntas_frecuentes.json")
+CHUNKS_PATH = Path("data/processed/chunks.jsonl")
+VECTOR_DIR = Path("data/processed/vectordb")
+RESULTS_PATH = Path("data/processed/retrieval_eval_results.csv")
+SUMMARY_PATH = Path("data/processed/retrieval_eval_summary.csv")
+
+
+def load_queries(path: Optional[Path] = None) -> tuple[list[str], list[str]]:
+    """
+    Preguntas y el id del chunk que las contiene (gold). Por defecto, las preguntas de las FAQs
+    (chunk `preguntas_frecuentes-{idx}`); con `path`, un JSONL con `pregunta` y `gold`
+    (p. ej. paráfrasis). Se descartan las preguntas cuyo gold no está en chunks.jsonl.
+    """
+    if path is None:
+        qa_list = json.loads(DATASET.read_text(encoding="utf-8"))
+        questions = [qa["pregunta"] for qa in qa_list]
+        gold = [f"preguntas_frecuentes-{idx}" for idx in range(len(qa_list))]
+    else:
+        records = [json.loads(line) for line in path.read_text(encoding="utf-8").splitlines() if line.strip()]
+        questions = [r["pregunta"] for r in records]
+        gold = [r["gold"] for r in records]
+
+    with CHUNKS_PATH.open(encoding="utf-8") as f:
+        chunk_ids = {json.loads(line)["id"] for line in f}
+    keep = [i for i, g in enumerate(gold) if g in chunk_ids]
+    if len(keep) < len(gold):
+        print(f" {len(gold) - len(keep)} preguntas sin chunk gold en {CHUNKS_PATH} se omiten")
+    return [questions[i] for i in keep], [gold[i] for i in keep]
+
+
+def ranked_ids(retriever: HybridRetriever, questions: list[str],
+               embeddings: Optional[np.ndarray]) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Ids recuperados por pregunta (matriz n x k, rellenada con "") y latencia de recuperación.
+    Con embeddings precalculados la latencia no incluye la llamada a la API de embeddings.
+    Si el retriever devuelve chunks padre se usa el id del hijo que lo trajo.
+    """
+    ids = np.full((len(questions), retriever.k), "", dtype=object)
+    latency = np.empty(len(questions))
+    for i, q in enumerate(questions):
+        embedding = embeddings[i] if embeddings is not None else None
+        t0 = time.perf_counter()
+        docs = retriever.retrieve(q, embedding)
+        latency[i] = (time.perf_counter() - t0) * 1000
+        for j, doc in enumerate(docs[:retriever.k]):
+            ids[i, j] = doc.metadata.get("child_id") or doc.metadata.get("id")
+    return ids, latency
+
+
+def rank_metrics(ids: np.ndarray, gold: list[str], ks: list[int]) -> dict[int, dict[str, np.ndarray]]:
+    """recall@k, MRR@k y nDCG@k por pregunta (un único chunk relevante), vectorizados sobre todas las preguntas."""
+    hits = ids == np.asarray(gold, dtype=object)[:, None]
+    found = hits.any(axis=1)
+    # Rango 1-based del gold; infinito si no se recuperó
+    rank = np.where(found, hits.argmax(axis=1) + 1, np.inf)
+    out = {}
+    for k in ks:
+        in_k = rank <= k
+        out[k] = {
+            "recall": in_k.astype(float),
+            "mrr": np.where(in_k, 1.0 / rank, 0.0),
+            # Con un solo relevante el DCG ideal es 1
+            "ndcg": np.where(in_k, 1.0 / np.log2(rank + 1), 0.0)
+        }
+    return out
+
+
+def run_retrieval_eval(modes: list[str], ks: list[int], queries_path: Optional[Path] = None) -> pd.DataFrame:
+    questions, gold = load_queries(queries_path)
+    k_max = max(ks)
+    lexical = BM25Index.load(VECTOR_DIR / LEXICAL_INDEX_FILE)
+    parents_file = VECTOR_DIR / PARENT_CHUNKS_FILE
+    parents = json.loads(parents_file.read_text(encoding="utf-8")) if parents_file.exists() else None
+
+    vectorstore, embeddings = None, None
+    if any(m != "lexical" for m in modes):
+        from src.chat.rag_pipeline import load_vectorstore
+        vectorstore = load_vectorstore(str(VECTOR_DIR))
+        # Todas las preguntas en un solo lote de embeddings
+        t0 = time.perf_counter()
+        embeddings = np.asarray(vectorstore.embeddings.embed_documents(questions), dtype=np.float32)
+        print(f" {len(questions)} preguntas embebidas en {time.perf_counter() - t0:.2f}s")
+
+    rows, summary = [], []
+    for mode in modes:
+        # Se recupera una vez con k máximo; cada k se evalúa sobre el prefijo del ranking
+        retriever = HybridRetriever(vectorstore, lexical, k=k_max, parents=parents, mode=mode)
+        ids, latency = ranked_ids(retriever, questions, embeddings if mode != "lexical" else None)
+        metrics = rank_metrics(ids, gold, ks)
+        for k, values in metrics.items():
+            summary.append({
+                "mode": mode,
+                "k": k,
+                "recall_at_k": values["recall"].mean(),
+                "mrr_at_k": values["mrr"].mean(),
+                "ndcg_at_k": values["ndcg"].mean(),
+                "latency_p50_ms": float(np.percentile(latency, 50)),
+                "latency_p95_ms": float(np.percentile(latency, 95))
+            })
+        for i, (q, g) in enumerate(zip(questions, gold)):
+            rows.append({
+                "mode": mode,
+                "pregunta": q,
+                "gold": g,
+                "retrieved": "|".join(x for x in ids[i] if x),
+                "hit": int(metrics[k_max]["recall"][i]),
+                "reciprocal_rank": metrics[k_max]["mrr"][i],
+                "latency_ms": latency[i]
+            })
+
+    summary_df = pd.DataFrame(summary)
+    print(f"Recuperación sin LLM ({len(questions)} preguntas):")
+    print(summary_df.to_string(index=False, float_format=lambda v: f"{v:.3f}"))
+
+    pd.DataFrame(rows).to_csv(RESULTS_PATH, index=False, encoding="utf-8")
+    summary_df.to_csv(SUMMARY_PATH, index=False, encoding="utf-8")
+    print(f"Resultados guardados en {RESULTS_PATH} y {SUMMARY_PATH}")
+    return summary_df
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Evaluación de recuperación sin LLM (recall@k, MRR, nDCG y latencia)")
+    parser.add_argument(
+        "--modes", nargs="+", default=["lexical", "vector", "hybrid"],
+        choices=["lexical", "vector", "hybrid"],
+        help="Modos de recuperación a comparar (vector/hybrid requieren OPENAI_API_KEY)"
+    )
+    parser.add_argument("--k", nargs="+", type=int, default=[1, 3, 5, 10], help="Valores de k a evaluar")
+    parser.add_argument("--queries", type=Path, help="JSONL con 'pregunta' y 'gold' (id del chunk esperado)")
+    args = parser.parse_args()
+    run_retrieval_eval(args.modes, args.k, args.queries)
@@ -0,0 +1,62 @@
+import json
+from pathlib import Path
+
+import numpy as np
+from langchain.docstore.document import Document
+
+from src.embeddings.backends import MANIFEST_FILE, embeddings_signature, get_embeddings
+from src.embeddings.docstore import save_mmap_vectorstore
+from src.embeddings.faiss_index import build_index
+from src.embeddings.lexical_index import BM25Index, LEXICAL_INDEX_FILE
+
+# Corpus sintético compartido por los benchmarks (perf_benchmark, load_test)
+VOCAB = (
+    "horario sucursal tienda puntos suma gana compra cliente domicilio pedido devolución producto "
+    "precio oferta descuento tarjeta pago efectivo factura garantía cambio reembolso envío entrega "
+    "registro cuenta correo teléfono cédula festivo domingo sábado apertura cierre atención servicio "
+    "mercado fruta verdura lácteos carne panadería bebidas aseo hogar mascotas farmacia redención bono"
+).split()
+_FILLER = "el la de en para con los las del por que se un una es al".split()
+
+
+def synthetic_documents(n: int, seed: int = 0) -> list[Document]:
+    """Corpus determinista con vocabulario del dominio (secciones de ~60 palabras)."""
+    rng = np.random.default_rng(seed)
+    words = rng.integers(0, len(VOCAB), (n, 40))
+    fillers = rng.integers(0, len(_FILLER), (n, 20))
+    docs = []
+    for i in range(n):
+        tokens = [VOCAB[w] for w in words[i]] + [_FILLER[f] for f in fillers[i]]
+        rng.shuffle(tokens)
+        docs.append(Document(
+            id=f"sintetico-{i}",
+            page_content=" ".join(tokens).capitalize() + ".",
+            metadata={"id": f"sintetico-{i}", "source": "sintetico", "section": f"seccion-{i % 200}"}
+        ))
+    return docs
+
+
+def synthetic_queries(docs: list[Document], n: int, seed: int = 1) -> list[str]:
+    """Preguntas formadas con palabras de documentos del corpus."""
+    rng = np.random.default_rng(seed)
+    queries = []
+    for i in rng.integers(0, len(docs), n):
+        words = [w for w in docs[i].page_content.rstrip(".").lower().split() if w in VOCAB]
+        queries.append("¿" + " ".join(words[:5]) + "?")
+    return queries
+
+
+def build_synthetic_vectordb(folder: Path, docs: list[Document]) -> None:
+    """Vectorstore completo (FAISS + docstore + BM25 + manifiesto) como lo deja embed_and_index."""
+    embeddings = get_embeddings()
+    vectors = np.asarray(embeddings.embed_documents([d.page_content for d in docs]), dtype=np.float32)
+    index, faiss_info = build_index(vectors, "flat")
+    save_mmap_vectorstore(folder, index, [d.id for d in docs], docs)
+    BM25Index.build([{"text": d.page_content, **d.metadata} for d in docs]).save(folder / LEXICAL_INDEX_FILE)
+    (folder / MANIFEST_FILE).write_text(json.dumps({
+        **embeddings_signature(embeddings),
+        "dimension": int(index.d),
+        "format": "mmap",
+        "faiss": faiss_info,
+        "n_docs": len(docs)
+    }, indent=2), encoding="utf-8")
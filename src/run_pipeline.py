@@ -22,7 +22,7 @@ def setup_logging(level: str):
     logging.getLogger("faiss").setLevel(logging.WARNING)
 
 
-def main(api_key: str):
+def main(api_key: str | None):
     logging.info("Iniciando pipeline de RAG")
     try:
         logging.info("1) Chunking de documentos...")
@@ -60,7 +60,8 @@ if __name__ == "__main__":
     args = parser.parse_args()
     setup_logging(args.log)
     key = args.api_key or os.environ.get("OPENAI_API_KEY")
-    if not key:
+    # Con EMBEDDING_BACKEND=hashing la indexación es local y no necesita API key
+    if not key and os.environ.get("EMBEDDING_BACKEND", "openai") == "openai":
         logging.error("No se encontró OPENAI_API_KEY. Define la var de entorno o pásala con --api_key.")
         sys.exit(1)
 
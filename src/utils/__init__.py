@@ -0,0 +1,7 @@
+from .text import normalize_text
+from .tokens import count_tokens
+
+__all__ = [
+    "normalize_text",
+    "count_tokens"
+]
@@ -0,0 +1,110 @@
+import asyncio
+import hashlib
+import math
+import os
+import random
+import time
+from typing import Any, AsyncIterator, Iterator, List, Optional
+
+from langchain_core.callbacks import AsyncCallbackManagerForLLMRun, CallbackManagerForLLMRun
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+from src.embeddings.backends import HashingEmbeddings
+
+# Latencia simulada del LLM falso (LLM_BACKEND=stub)
+STUB_LLM_FIRST_TOKEN_MS = float(os.getenv("STUB_LLM_FIRST_TOKEN_MS", "300"))
+STUB_LLM_TOKEN_MS = float(os.getenv("STUB_LLM_TOKEN_MS", "20"))
+STUB_LLM_ANSWER_TOKENS = int(os.getenv("STUB_LLM_ANSWER_TOKENS", "40"))
+STUB_LLM_JITTER = float(os.getenv("STUB_LLM_JITTER", "0"))  # sigma de la log-normal (0 = latencia fija)
+
+# Latencia simulada de la API de embeddings (EMBEDDING_BACKEND=stub)
+STUB_EMBEDDING_MS = float(os.getenv("STUB_EMBEDDING_MS", "80"))
+STUB_EMBEDDING_JITTER = float(os.getenv("STUB_EMBEDDING_JITTER", "0"))
+
+_WORDS = (
+    "el", "horario", "de", "la", "sucursal", "es", "puntos", "suma", "y", "gana", "para",
+    "clientes", "compras", "tienda", "pedido", "domicilio", "consulta", "nuestra", "página"
+)
+
+
+def sample_latency_ms(mean_ms: float, jitter: float = 0.0) -> float:
+    """
+    Latencia con media `mean_ms`: fija si `jitter` es 0, si no log-normal con sigma `jitter`
+    (cola larga, como la de una API remota: con 0.5 el p99 es ~3x la media).
+    """
+    if mean_ms <= 0 or jitter <= 0:
+        return max(0.0, mean_ms)
+    return random.lognormvariate(math.log(mean_ms) - jitter ** 2 / 2, jitter)
+
+
+class StubChatModel(BaseChatModel):
+    """
+    Modelo de chat falso para benchmarks y pruebas sin red: responde un texto determinista
+    (derivado del prompt) con la latencia configurada hasta el primer token y entre tokens.
+    """
+
+    first_token_ms: float = STUB_LLM_FIRST_TOKEN_MS
+    token_ms: float = STUB_LLM_TOKEN_MS
+    answer_tokens: int = STUB_LLM_ANSWER_TOKENS
+    jitter: float = STUB_LLM_JITTER
+
+    def _delay(self, i: int) -> float:
+        return sample_latency_ms(self.token_ms if i else self.first_token_ms, self.jitter) / 1000
+
+    @property
+    def _llm_type(self) -> str:
+        return "stub-chat"
+
+    def _tokens(self, messages: List[BaseMessage]) -> List[str]:
+        prompt = "".join(str(m.content) for m in messages)
+        seed = hashlib.sha1(prompt.encode("utf-8")).digest()
+        return [
+            (" " if i else "") + _WORDS[seed[i % len(seed)] % len(_WORDS)]
+            for i in range(self.answer_tokens)
+        ]
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                  run_manager: Optional[CallbackManagerForLLMRun] = None, **kwargs: Any) -> ChatResult:
+        time.sleep(sum(self._delay(i) for i in range(self.answer_tokens)))
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content="".join(self._tokens(messages))))])
+
+    def _stream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                run_manager: Optional[CallbackManagerForLLMRun] = None, **kwargs: Any) -> Iterator[ChatGenerationChunk]:
+        for i, token in enumerate(self._tokens(messages)):
+            time.sleep(self._delay(i))
+            chunk = ChatGenerationChunk(message=AIMessageChunk(content=token))
+            if run_manager:
+                run_manager.on_llm_new_token(token, chunk=chunk)
+            yield chunk
+
+    async def _astream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                       run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+                       **kwargs: Any) -> AsyncIterator[ChatGenerationChunk]:
+        for i, token in enumerate(self._tokens(messages)):
+            await asyncio.sleep(self._delay(i))
+            chunk = ChatGenerationChunk(message=AIMessageChunk(content=token))
+            if run_manager:
+                await run_manager.on_llm_new_token(token, chunk=chunk)
+            yield chunk
+
+
+class StubEmbeddings(HashingEmbeddings):
+    """
+    Embeddings locales (los mismos vectores que `HashingEmbeddings`, compatibles con su índice)
+    que además esperan la latencia de una llamada a la API por cada petición.
+    """
+
+    def __init__(self, latency_ms: float = STUB_EMBEDDING_MS, jitter: float = STUB_EMBEDDING_JITTER, **kwargs):
+        super().__init__(**kwargs)
+        self.latency_ms = latency_ms
+        self.jitter = jitter
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        time.sleep(sample_latency_ms(self.latency_ms, self.jitter) / 1000)
+        return super().embed_documents(texts)
+
+    def embed_query(self, text: str) -> List[float]:
+        time.sleep(sample_latency_ms(self.latency_ms, self.jitter) / 1000)
+        return super().embed_query(text)
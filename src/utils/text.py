@@ -0,0 +1,10 @@
+import re
+import unicodedata
+
+
+def normalize_text(text: str) -> str:
+    """Normaliza un texto: minúsculas, sin tildes, sin signos de puntuación y con espacios simples."""
+    text = unicodedata.normalize("NFKD", text.lower())
+    text = "".join(c for c in text if not unicodedata.combining(c))
+    text = re.sub(r"[^\w\s]", " ", text)
+    return re.sub(r"\s+", " ", text).strip()
@@ -0,0 +1,26 @@
+import logging
+
+logger = logging.getLogger(__name__)
+
+_encoding = None
+_encoding_loaded = False
+
+
+def _get_encoding():
+    global _encoding, _encoding_loaded
+    if not _encoding_loaded:
+        _encoding_loaded = True
+        try:
+            import tiktoken
+            _encoding = tiktoken.get_encoding("cl100k_base")
+        except Exception as e:
+            logger.warning(f"tiktoken no disponible, se estimarán los tokens por longitud: {e}")
+    return _encoding
+
+
+def count_tokens(text: str) -> int:
+    """Cuenta tokens con tiktoken (cl100k_base) o los estima como ~4 caracteres por token."""
+    encoding = _get_encoding()
+    if encoding is not None:
+        return len(encoding.encode(text, disallowed_special=()))
+    return max(1, len(text) // 4)
@@ -0,0 +1,285 @@
+import contextvars
+import os
+import random
+import threading
+import time
+import uuid
+from collections import defaultdict
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Iterator, Optional
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Parámetros de entorno
+TRACING_ENABLED = os.getenv("TRACING_ENABLED", "true").lower() == "true"
+TRACE_SAMPLE_RATE = float(os.getenv("TRACE_SAMPLE_RATE", "1.0"))  # fracción de mensajes con detalle por etapa
+TRACE_METRICS_PATH = Path(os.getenv("TRACE_METRICS_PATH", "data/metrics/chat_metrics.prom"))
+TRACE_EXPORT_EVERY = int(os.getenv("TRACE_EXPORT_EVERY", "20"))
+TRACE_METRICS_PORT = int(os.getenv("TRACE_METRICS_PORT", "0"))  # 0 = sin endpoint HTTP
+TRACE_MLFLOW_ENABLED = os.getenv("TRACE_MLFLOW_ENABLED", "false").lower() == "true"
+
+# Límites (segundos) de los histogramas de etapas
+BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class Trace:
+    """Tiempos por etapa, tokens y eventos (aciertos de caché, ruta) de un mensaje."""
+
+    def __init__(self, kind: str):
+        self.id = uuid.uuid4().hex[:12]
+        self.kind = kind
+        self.path = "-"
+        self.stages: dict[str, float] = defaultdict(float)
+        self.tokens: dict[str, int] = defaultdict(int)
+        self.events: dict[str, int] = defaultdict(int)
+        self.marks: dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def add_stage(self, stage: str, seconds: float) -> None:
+        # Las ramas paralelas del chain corren en otros hilos con el mismo contexto
+        with self._lock:
+            self.stages[stage] += seconds
+
+
+_current: contextvars.ContextVar[Optional[Trace]] = contextvars.ContextVar("chat_trace", default=None)
+
+
+def current_trace() -> Optional[Trace]:
+    return _current.get()
+
+
+@contextmanager
+def span(stage: str) -> Iterator[None]:
+    """Mide una etapa del mensaje en curso; sin traza activa (no muestreado) no hace nada."""
+    trace = _current.get()
+    if trace is None:
+        yield
+        return
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        trace.add_stage(stage, time.perf_counter() - t0)
+
+
+def add_tokens(kind: str, n: int) -> None:
+    trace = _current.get()
+    if trace is not None:
+        with trace._lock:
+            trace.tokens[kind] += n
+
+
+def add_event(name: str) -> None:
+    trace = _current.get()
+    if trace is not None:
+        with trace._lock:
+            trace.events[name] += 1
+
+
+def set_path(path: str) -> None:
+    """Ruta que respondió el mensaje (schedule, faq, cache, smalltalk, rag...)."""
+    trace = _current.get()
+    if trace is not None:
+        trace.path = path
+
+
+class Histogram:
+    def __init__(self):
+        self.counts = [0] * len(BUCKETS)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, seconds: float) -> None:
+        self.count += 1
+        self.sum += seconds
+        for i, bound in enumerate(BUCKETS):
+            if seconds <= bound:
+                self.counts[i] += 1
+                break
+
+
+class TraceCollector:
+    """
+    Agrega las trazas del proceso en contadores e histogramas con formato de texto de Prometheus.
+    Se exportan a archivo cada `export_every` trazas y, si está activo, a MLflow.
+    """
+
+    def __init__(self, path: Path = TRACE_METRICS_PATH, export_every: int = TRACE_EXPORT_EVERY,
+                 use_mlflow: bool = TRACE_MLFLOW_ENABLED):
+        self.path = Path(path)
+        self.export_every = export_every
+        self.use_mlflow = use_mlflow
+        self._lock = threading.Lock()
+        self._requests: dict[tuple[str, str], int] = defaultdict(int)
+        self._stages: dict[str, Histogram] = defaultdict(Histogram)
+        self._tokens: dict[str, int] = defaultdict(int)
+        self._events: dict[str, int] = defaultdict(int)
+        self._traced = 0
+        self._mlflow_run_id: Optional[str] = None
+
+    def count_request(self, kind: str, path: str) -> None:
+        with self._lock:
+            self._requests[(kind, path)] += 1
+
+    def increment(self, event: str, n: int = 1) -> None:
+        """Contador de un evento fuera de un mensaje (p. ej. lotes de embeddings de consultas)."""
+        with self._lock:
+            self._events[event] += n
+
+    def observe(self, stage: str, seconds: float) -> None:
+        """Tiempo de una etapa fuera de un mensaje (p. ej. carga del vectorstore)."""
+        with self._lock:
+            self._stages[stage].observe(seconds)
+
+    def record(self, trace: Trace, seconds: float) -> None:
+        with self._lock:
+            self._stages["total"].observe(seconds)
+            for stage, value in trace.stages.items():
+                self._stages[stage].observe(value)
+            for kind, n in trace.tokens.items():
+                self._tokens[kind] += n
+            for name, n in trace.events.items():
+                self._events[name] += n
+            self._traced += 1
+            export = self.export_every > 0 and self._traced % self.export_every == 0
+        logger.debug(
+            f"Traza {trace.id} ({trace.kind}/{trace.path}): {seconds * 1000:.0f} ms, "
+            + ", ".join(f"{k} {v * 1000:.1f} ms" for k, v in trace.stages.items())
+        )
+        if export:
+            self.export()
+
+    def render(self) -> str:
+        """Métricas en formato de texto de Prometheus."""
+        with self._lock:
+            lines = [
+                "# HELP chat_requests_total Mensajes atendidos por tipo y ruta de respuesta.",
+                "# TYPE chat_requests_total counter"
+            ]
+            for (kind, path), n in sorted(self._requests.items()):
+                lines.append(f'chat_requests_total{{kind="{kind}",path="{path}"}} {n}')
+            lines += [
+                "# HELP chat_stage_seconds Duración por etapa (solo mensajes muestreados).",
+                "# TYPE chat_stage_seconds histogram"
+            ]
+            for stage, hist in sorted(self._stages.items()):
+                cumulative = 0
+                for bound, n in zip(BUCKETS, hist.counts):
+                    cumulative += n
+                    lines.append(f'chat_stage_seconds_bucket{{stage="{stage}",le="{bound}"}} {cumulative}')
+                lines.append(f'chat_stage_seconds_bucket{{stage="{stage}",le="+Inf"}} {hist.count}')
+                lines.append(f'chat_stage_seconds_sum{{stage="{stage}"}} {hist.sum:.6f}')
+                lines.append(f'chat_stage_seconds_count{{stage="{stage}"}} {hist.count}')
+            lines += ["# HELP chat_tokens_total Tokens de prompt y de respuesta.", "# TYPE chat_tokens_total counter"]
+            for kind, n in sorted(self._tokens.items()):
+                lines.append(f'chat_tokens_total{{kind="{kind}"}} {n}')
+            lines += ["# HELP chat_events_total Aciertos de caché y rutas rápidas.", "# TYPE chat_events_total counter"]
+            for name, n in sorted(self._events.items()):
+                lines.append(f'chat_events_total{{event="{name}"}} {n}')
+            lines += [
+                "# HELP chat_trace_sample_rate Fracción de mensajes con detalle por etapa.",
+                "# TYPE chat_trace_sample_rate gauge",
+                f"chat_trace_sample_rate {TRACE_SAMPLE_RATE}"
+            ]
+        return "\n".join(lines) + "\n"
+
+    def export(self) -> None:
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = self.path.with_suffix(".tmp")
+            tmp.write_text(self.render(), encoding="utf-8")
+            tmp.replace(self.path)
+        except Exception as e:
+            logger.warning(f"No se pudieron exportar las métricas de trazas: {e}")
+        if self.use_mlflow:
+            self._export_mlflow()
+
+    def _export_mlflow(self) -> None:
+        """Promedios por etapa y contadores en una corrida de MLflow por proceso (un log_batch por exportación)."""
+        try:
+            from mlflow.entities import Metric
+            from mlflow.tracking import MlflowClient
+
+            client = MlflowClient()
+            if self._mlflow_run_id is None:
+                experiment = client.get_experiment_by_name("chat_tracing")
+                experiment_id = experiment.experiment_id if experiment else client.create_experiment("chat_tracing")
+                self._mlflow_run_id = client.create_run(experiment_id, run_name="chat_tracing").info.run_id
+            now = int(time.time() * 1000)
+            with self._lock:
+                step = self._traced
+                metrics = [Metric(f"{stage}_mean_ms", hist.sum / hist.count * 1000, now, step)
+                           for stage, hist in self._stages.items() if hist.count]
+                metrics += [Metric(f"{kind}_total", float(n), now, step) for kind, n in self._tokens.items()]
+                metrics += [Metric(f"{name}_total", float(n), now, step) for name, n in self._events.items()]
+            client.log_batch(self._mlflow_run_id, metrics=metrics)
+        except Exception as e:
+            logger.warning(f"No se pudieron registrar las trazas en MLflow: {e}")
+
+
+_collector = TraceCollector()
+
+
+def get_collector() -> TraceCollector:
+    return _collector
+
+
+@contextmanager
+def start_trace(kind: str, sample_rate: float = TRACE_SAMPLE_RATE) -> Iterator[Optional[Trace]]:
+    """
+    Traza de un mensaje. Todos los mensajes se cuentan; solo la fracción `sample_rate`
+    registra tiempos por etapa, tokens y eventos (el resto solo paga un número aleatorio).
+    """
+    if not TRACING_ENABLED:
+        yield None
+        return
+    trace = Trace(kind) if random.random() < sample_rate else None
+    token = _current.set(trace)
+    t0 = time.perf_counter()
+    try:
+        yield trace
+    finally:
+        _current.reset(token)
+        if trace is not None:
+            _collector.record(trace, time.perf_counter() - t0)
+        _collector.count_request(kind, trace.path if trace is not None else "unsampled")
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path != "/metrics":
+            self.send_error(404)
+            return
+        body = _collector.render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+_server: Optional[ThreadingHTTPServer] = None
+_server_lock = threading.Lock()
+
+
+def start_metrics_server(port: int = TRACE_METRICS_PORT) -> Optional[ThreadingHTTPServer]:
+    """Expone /metrics en `port` (una sola vez por proceso); con puerto 0 no hace nada."""
+    global _server
+    if port <= 0:
+        return None
+    with _server_lock:
+        if _server is None:
+            try:
+                _server = ThreadingHTTPServer(("0.0.0.0", port), _MetricsHandler)
+            except OSError as e:
+                logger.warning(f"No se pudo abrir el endpoint de métricas en el puerto {port}: {e}")
+                return None
+            threading.Thread(target=_server.serve_forever, name="metrics-server", daemon=True).start()
+            logger.info(f"Métricas en http://localhost:{port}/metrics")
+    return _server